@@ -1,4 +1,19 @@
-import argparse, os, struct, sys
+import argparse, concurrent.futures, hashlib, json, os, struct, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+try:
+    import tomllib
+except ImportError:
+    tomllib = None  # Python < 3.11; TOML manifests not supported
+
+# manifest keys for each output and their defaults (see the help text)
+MANIFEST_KEYS = {
+    "output": None,
+    "prg_rom": None,
+    "chr_rom": None,
+    "mapper": 0,
+    "mirroring": "h",
+    "extra_ram": False,
+}
 
 def parse_arguments():
     parser = argparse.ArgumentParser(
@@ -6,9 +21,9 @@ def parse_arguments():
     )
 
     parser.add_argument(
-        "-p", "--prg-rom", required=True,
-        help="PRG ROM data file to read. Required. Size: 16-4096 KiB and a "
-        "multiple of 16 KiB."
+        "-p", "--prg-rom",
+        help="PRG ROM data file to read. Required without --manifest. Size: "
+        "16-4096 KiB and a multiple of 16 KiB."
     )
     parser.add_argument(
         "-c", "--chr-rom",
@@ -28,10 +43,34 @@ def parse_arguments():
         "-x", "--extra-ram", action="store_true",
         help="The game contains extra RAM at $6000-$7fff."
     )
-    parser.add_argument("outputFile", help="iNES ROM file (.nes) to write.")
+    parser.add_argument(
+        "-f", "--manifest", metavar="FILE",
+        help="Create many iNES ROM files as listed in this JSON file (or TOML "
+        "file if the name ends with .toml; requires Python 3.11+). It has an "
+        "optional object 'defaults' and an array of objects 'outputs' with "
+        "the keys 'output', 'prg_rom', 'chr_rom', 'mapper', 'mirroring' and "
+        "'extra_ram' (like the options); paths are relative to the manifest. "
+        "Each input file is read only once and the output files are written "
+        "concurrently. The hashes of what each output file was created from "
+        "are saved in FILE.state; output files whose inputs and header "
+        "haven't changed are skipped. Existing files are only overwritten if "
+        "they were created from this manifest (they are in FILE.state); "
+        "others are skipped. The other options are ignored."
+    )
+    parser.add_argument(
+        "outputFile", nargs="?",
+        help="iNES ROM file (.nes) to write. Required without --manifest."
+    )
 
     args = parser.parse_args()
 
+    if args.manifest is not None:
+        if not os.path.isfile(args.manifest):
+            sys.exit("Manifest file not found.")
+        return args
+    if args.prg_rom is None or args.outputFile is None:
+        sys.exit("Specify --prg-rom and outputFile, or --manifest.")
+
     if not os.path.isfile(args.prg_rom):
         sys.exit("PRG ROM file not found.")
     if args.chr_rom is not None and not os.path.isfile(args.chr_rom):
@@ -43,19 +82,25 @@ def parse_arguments():
 
     return args
 
+def get_size_error(prgSize, chrSize):
+    # return: error message if PRG/CHR ROM size can't be stored in an iNES
+    # header, otherwise None
+    if prgSize % (16 * 1024) or not 1 <= prgSize // (16 * 1024) <= 256:
+        return "Invalid PRG ROM size."
+    if chrSize % (8 * 1024) or chrSize // (8 * 1024) > 255:
+        return "Invalid CHR ROM size."
+    return None
+
 def encode_ines_header(prgSize, chrSize, mapper, mirroring, extraRam):
     # create an iNES header
     # does not support VS System or PlayChoice-10 flags or NES 2.0 header
     # see https://www.nesdev.org/wiki/INES
 
-    (prgSize, remainder) = divmod(prgSize, 16 * 1024)
-    if remainder or not 1 <= prgSize <= 256:
-        sys.exit("Invalid PRG ROM size.")
-    prgSize %= 256  # 256 = 0
-
-    (chrSize, remainder) = divmod(chrSize, 8 * 1024)
-    if remainder or chrSize > 255:
-        sys.exit("Invalid CHR ROM size.")
+    error = get_size_error(prgSize, chrSize)
+    if error is not None:
+        sys.exit(error)
+    prgSize = prgSize // (16 * 1024) % 256  # 256 = 0
+    chrSize //= 8 * 1024
 
     flags6 = (mapper & 0b1111) << 4
     flags6 |= {"h": 0b0, "v": 0b1, "f": 0b1000}[mirroring]
@@ -67,9 +112,176 @@ def encode_ines_header(prgSize, chrSize, mapper, mirroring, extraRam):
         "4s4B8s", b"NES\x1a", prgSize, chrSize, flags6, flags7, 8 * b"\x00"
     )
 
+def read_manifest(path):
+    # return: [{key: value, ...} for each output]; see MANIFEST_KEYS
+
+    try:
+        with open(path, "rb") as handle:
+            handle.seek(0)
+            if path.lower().endswith(".toml"):
+                if tomllib is None:
+                    sys.exit("TOML manifests require Python 3.11 or later.")
+                manifest = tomllib.load(handle)
+            else:
+                manifest = json.load(handle)
+    except OSError:
+        sys.exit("Error reading manifest file.")
+    except ValueError:
+        sys.exit("Manifest file is not valid JSON/TOML.")
+
+    if not isinstance(manifest, dict) \
+    or not isinstance(manifest.get("outputs"), list) \
+    or not isinstance(manifest.get("defaults", {}), dict) \
+    or not all(isinstance(o, dict) for o in manifest["outputs"]):
+        sys.exit("Manifest must have an array of objects 'outputs'.")
+
+    baseDir = os.path.dirname(path)
+    outputs = []
+    for (index, output) in enumerate(manifest["outputs"]):
+        output = {**MANIFEST_KEYS, **manifest.get("defaults", {}), **output}
+        if set(output) != set(MANIFEST_KEYS):
+            sys.exit(
+                f"Output {index}: unknown keys: "
+                + ", ".join(sorted(set(output) - set(MANIFEST_KEYS)))
+            )
+        if not isinstance(output["output"], str):
+            sys.exit(f"Output {index}: 'output' missing.")
+        if not isinstance(output["prg_rom"], str):
+            sys.exit(f"Output {index}: 'prg_rom' missing.")
+        if output["chr_rom"] is not None \
+        and not isinstance(output["chr_rom"], str):
+            sys.exit(f"Output {index}: invalid 'chr_rom'.")
+        # (bool is a subclass of int but true/false aren't mapper numbers)
+        if not isinstance(output["mapper"], int) \
+        or isinstance(output["mapper"], bool) \
+        or not 0 <= output["mapper"] <= 255:
+            sys.exit(f"Output {index}: invalid mapper number.")
+        if output["mirroring"] not in ("h", "v", "f"):
+            sys.exit(f"Output {index}: invalid mirroring.")
+        if not isinstance(output["extra_ram"], bool):
+            sys.exit(f"Output {index}: invalid 'extra_ram'.")
+        for key in ("output", "prg_rom", "chr_rom"):
+            if output[key] is not None:
+                output[key] = os.path.join(baseDir, output[key])
+        outputs.append(output)
+
+    if len(set(o["output"] for o in outputs)) < len(outputs):
+        sys.exit("Manifest has the same output file more than once.")
+    return outputs
+
+def write_output(path, header, prgData, chrData):
+    # run in a worker thread; the file is written under a temporary name and
+    # renamed when complete, so an error never leaves a truncated file (or
+    # destroys the previous version); return: status
+
+    tempPath = path + ".part"
+    try:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tempPath, "wb") as target:
+            target.seek(0)
+            target.write(header)
+            target.write(prgData)
+            target.write(chrData)
+        os.replace(tempPath, path)
+    except OSError:
+        try:
+            os.remove(tempPath)
+        except OSError:
+            pass
+        return "error writing"
+    return "written"
+
+def build_manifest(manifestPath):
+    outputs = read_manifest(manifestPath)
+
+    # read each distinct input file once
+    inputData = {"": b""}  # path -> data
+    inputHashes = {"": hashlib.sha256().hexdigest()}
+    for path in sorted(set(
+        o[k] for o in outputs for k in ("prg_rom", "chr_rom")
+        if o[k] is not None
+    )):
+        try:
+            with open(path, "rb") as handle:
+                handle.seek(0)
+                inputData[path] = handle.read()
+        except OSError:
+            sys.exit(f"Error reading {path}")
+        inputHashes[path] = hashlib.sha256(inputData[path]).hexdigest()
+
+    # create all headers (and validate the sizes) before writing anything;
+    # an output is up to date if its header and inputs haven't changed
+    jobs = []  # [(output_file, header, prg_file, chr_file, hash), ...]
+    for (index, output) in enumerate(outputs):
+        (prgFile, chrFile) = (output["prg_rom"], output["chr_rom"] or "")
+        error = get_size_error(
+            len(inputData[prgFile]), len(inputData[chrFile])
+        )
+        if error is not None:
+            sys.exit(f"Output {index} ({output['output']}): {error}")
+        header = encode_ines_header(
+            prgSize=len(inputData[prgFile]),
+            chrSize=len(inputData[chrFile]),
+            mapper=output["mapper"],
+            mirroring=output["mirroring"],
+            extraRam=output["extra_ram"]
+        )
+        hash_ = hashlib.sha256((
+            header.hex() + inputHashes[prgFile] + inputHashes[chrFile]
+        ).encode("ascii")).hexdigest()
+        jobs.append((output["output"], header, prgFile, chrFile, hash_))
+
+    # the state has the output files relative to the manifest, so it's valid
+    # regardless of the current directory; only files in it may be
+    # overwritten
+    statePath = manifestPath + ".state"
+    baseDir = os.path.dirname(os.path.abspath(manifestPath))
+    oldState = qneslib.state_read(statePath)
+    newState = {}
+    statusCounts = {}
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        futures = []
+        for (outputFile, header, prgFile, chrFile, hash_) in jobs:
+            key = os.path.relpath(outputFile, baseDir)
+            if key not in oldState and os.path.exists(outputFile):
+                futures.append("skipped (output file already exists)")
+            elif oldState.get(key) == hash_ and os.path.isfile(outputFile):
+                futures.append("up to date")
+            else:
+                futures.append(executor.submit(
+                    write_output, outputFile, header, inputData[prgFile],
+                    inputData[chrFile]
+                ))
+        for ((outputFile, header, prgFile, chrFile, hash_), future) \
+        in zip(jobs, futures):
+            key = os.path.relpath(outputFile, baseDir)
+            status = future if isinstance(future, str) else future.result()
+            print(f"{outputFile}: {status}")
+            if status in ("written", "up to date"):
+                newState[key] = hash_
+            elif key in oldState:
+                # still ours (and out of date)
+                newState[key] = oldState[key]
+            if status.startswith("skipped"):
+                status = "skipped"
+            elif status not in ("written", "up to date"):
+                status = "failed"
+            statusCounts[status] = statusCounts.get(status, 0) + 1
+
+    print(", ".join(f"{c} {s}" for (s, c) in sorted(statusCounts.items())))
+
+    if not qneslib.state_write(statePath, newState):
+        sys.exit("Error writing state file.")
+
 def main():
     args = parse_arguments()
 
+    if args.manifest is not None:
+        build_manifest(args.manifest)
+        return
+
     # read PRG ROM file
     try:
         with open(args.prg_rom, "rb") as handle:
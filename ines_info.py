@@ -1,4 +1,53 @@
-import os, struct, sys
+import argparse, concurrent.futures, csv, json, os, struct, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+
+# fields of each file in --format csv/jsonl
+FIELDS = (
+    "path", "fileSize", "valid", "trainerSize", "prgSize", "chrSize",
+    "mapper", "mapperName", "mirroring", "extraRam", "prgBankswitched",
+    "anomaly",
+)
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Print information of an iNES ROM file (.nes), or of "
+        "all .nes files in a directory and its subdirectories."
+    )
+    parser.add_argument(
+        "-f", "--format", choices=("text", "jsonl", "csv"),
+        help="Output format: text (default for a file; not available for a "
+        "directory), jsonl (JSON Lines; default for a directory) or csv. "
+        "jsonl and csv have these fields for each file: " + ", ".join(FIELDS)
+        + ". anomaly describes a file size that doesn't match the header."
+    )
+    parser.add_argument(
+        "-c", "--cache", metavar="FILE",
+        help="With jsonl/csv: cache the information in this JSON file "
+        "(created if needed); "
+        "files whose size and modification time haven't changed since the "
+        "previous run aren't read again."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=16,
+        help="Number of files to read concurrently (1 or greater, "
+        "default=16)."
+    )
+    parser.add_argument("input", help="iNES ROM file or directory to read.")
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        sys.exit("--jobs must be 1 or greater.")
+    if os.path.isdir(args.input):
+        if args.format == "text":
+            sys.exit("--format text is only available for a file.")
+    elif not os.path.isfile(args.input):
+        sys.exit("File not found.")
+    elif args.format in (None, "text") and args.cache is not None:
+        sys.exit("--cache is only available with --format jsonl/csv.")
+
+    return args
 
 def decode_ines_header(handle):
     # parse iNES ROM header
@@ -47,13 +96,121 @@ def decode_ines_header(handle):
         "extraRam":    bool(flags6 & 0b10),
     }
 
+def get_file_record(path):
+    # return: {field: value, ...}; see FIELDS
+
+    record = dict.fromkeys(FIELDS)
+    record["path"] = path
+    with open(path, "rb") as handle:
+        fileInfo = decode_ines_header(handle)
+        record["fileSize"] = handle.seek(0, 2)
+        handle.seek(0)
+        id_ = handle.read(4)
+
+    record["valid"] = fileInfo is not None
+    if fileInfo is None:
+        record["anomaly"] = "truncated" if id_ == b"NES\x1a" \
+        else "not an iNES ROM file"
+        return record
+
+    record.update(fileInfo)
+    record["mapperName"] = qneslib.mapper_name(fileInfo["mapper"])
+    record["prgBankswitched"] = qneslib.is_prg_bankswitched(
+        fileInfo["prgSize"], fileInfo["mapper"]
+    )
+    extraSize = record["fileSize"] - 16 - fileInfo["trainerSize"] \
+    - fileInfo["prgSize"] - fileInfo["chrSize"]
+    if extraSize:
+        record["anomaly"] = f"{extraSize} extra bytes at end"
+    return record
+
+def scan_file(path, cache):
+    # run in a worker thread; cache: {path: [size, mtime_ns, record], ...}
+    # (anything else, e.g. from a damaged cache file, is a cache miss);
+    # return: (record, cache_entry)
+    try:
+        stat = os.stat(path)
+        cached = cache.get(path)
+        if isinstance(cached, list) and len(cached) == 3 \
+        and cached[:2] == [stat.st_size, stat.st_mtime_ns] \
+        and isinstance(cached[2], dict) and cached[2].keys() == set(FIELDS):
+            return (cached[2], cached)
+        record = get_file_record(path)
+    except OSError:
+        record = dict.fromkeys(FIELDS)
+        record.update(path=path, valid=False, anomaly="error reading")
+        return (record, None)
+    return (record, [stat.st_size, stat.st_mtime_ns, record])
+
+def read_cache(path):
+    try:
+        with open(path, "rt", encoding="utf-8") as handle:
+            handle.seek(0)
+            cache = json.load(handle)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        print("Warning: ignoring unreadable cache file.", file=sys.stderr)
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+def write_cache(cache, path):
+    try:
+        with open(path, "wt", encoding="utf-8") as handle:
+            handle.seek(0)
+            # (dumps() uses the C encoder, dump() doesn't)
+            handle.write(json.dumps(cache, separators=(",", ":")))
+    except OSError:
+        sys.exit("Error writing cache file.")
+
+def get_files(dir_):
+    # generate: paths of .nes files in a directory and its subdirectories
+    for (parent, dirs, files) in os.walk(dir_):
+        dirs.sort()
+        for file_ in sorted(files):
+            if file_.lower().endswith(".nes"):
+                yield os.path.join(parent, file_)
+
+def scan(args):
+    # print the information of each file as JSON Lines or CSV; the files are
+    # read by a thread pool because most of the time is spent waiting for
+    # the file system (e.g. over a network)
+
+    if os.path.isdir(args.input):
+        paths = list(get_files(args.input))
+    else:
+        paths = [args.input]
+    oldCache = {} if args.cache is None else read_cache(args.cache)
+    newCache = {}
+
+    if args.format == "csv":
+        writer = csv.DictWriter(sys.stdout, FIELDS, lineterminator="\n")
+        writer.writeheader()
+
+    with concurrent.futures.ThreadPoolExecutor(args.jobs) as executor:
+        for (path, (record, cacheEntry)) in zip(paths, executor.map(
+            lambda p: scan_file(p, oldCache), paths
+        )):
+            if args.format == "csv":
+                writer.writerow(record)
+            else:
+                print(json.dumps(record))
+            if cacheEntry is not None:
+                newCache[path] = cacheEntry
+
+    # (only the files that still exist)
+    if args.cache is not None:
+        write_cache(newCache, args.cache)
+
 def main():
-    # parse command line arguments
-    if len(sys.argv) != 2:
-        sys.exit("Print information of an iNES ROM file (.nes).")
-    inputFile = sys.argv[1]
-    if not os.path.isfile(inputFile):
-        sys.exit("File not found.")
+    args = parse_arguments()
+
+    if os.path.isdir(args.input) and args.format is None:
+        args.format = "jsonl"
+    if args.format is not None and args.format != "text":
+        scan(args)
+        return
+    inputFile = args.input
 
     # get info
     try:
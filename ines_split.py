@@ -1,4 +1,15 @@
-import argparse, os, struct, sys
+import argparse, concurrent.futures, os, struct, sys
+
+# size of each read in the fallback copy method
+CHUNK_SIZE = 256 * 1024
+
+# added to the names of output files while they are being written
+TEMP_SUFFIX = ".part"
+
+class ReadError(Exception):
+    # reading the input file failed while copying (an OSError from copying
+    # means writing failed)
+    pass
 
 def parse_arguments():
     parser = argparse.ArgumentParser(
@@ -10,17 +21,50 @@ def parse_arguments():
         "-c", "--chr",
         help="File to write CHR ROM data to. Not written if there is no data."
     )
-    parser.add_argument("input_file", help="iNES ROM file (.nes) to read.")
+    parser.add_argument(
+        "-o", "--output-dir", metavar="DIR",
+        help="Batch mode: input_file is a directory to search for .nes files "
+        "(recursively), and --prg and --chr are name templates for files to "
+        "write under this directory (subdirectories are created). In the "
+        "templates, {path} is the path of the .nes file relative to "
+        "input_file and {name} its name, both without the extension; e.g. "
+        "'{path}.prg' or 'chr/{name}.chr'. Output files that already exist "
+        "are skipped (not overwritten)."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=8,
+        help="Batch mode: number of files to split concurrently (1 or "
+        "greater, default=8)."
+    )
+    parser.add_argument(
+        "input_file", help="iNES ROM file (.nes) to read (or a directory)."
+    )
     args = parser.parse_args()
 
+    if args.prg is None and args.chr is None:
+        sys.exit("Specify at least one of --prg and --chr.")
+    if args.jobs < 1:
+        sys.exit("--jobs must be 1 or greater.")
+
+    if args.output_dir is not None:
+        if not os.path.isdir(args.input_file):
+            sys.exit("Input directory not found.")
+        if not os.path.isdir(args.output_dir):
+            sys.exit("Output directory not found.")
+        for template in (args.prg, args.chr):
+            if template is not None:
+                try:
+                    template.format(path="", name="")
+                except (KeyError, IndexError, ValueError):
+                    sys.exit(f"Invalid name template: {template}")
+        return args
+
     if not os.path.isfile(args.input_file):
         sys.exit("Input file not found.")
     if args.prg is not None and os.path.exists(args.prg):
         sys.exit("PRG ROM file already exists.")
     if args.chr is not None and os.path.exists(args.chr):
         sys.exit("CHR ROM file already exists.")
-    if args.prg is None and args.chr is None:
-        sys.exit("Specify at least one of --prg and --chr.")
 
     return args
 
@@ -51,40 +95,167 @@ def decode_ines_header(handle):
         "chrSize":  chrSize,
     }
 
-def main():
-    args = parse_arguments()
+def copy_file_range(inFd, outFd, offset, size):
+    return os.copy_file_range(inFd, outFd, size, offset)
+
+def sendfile(inFd, outFd, offset, size):
+    return os.sendfile(outFd, inFd, offset, size)
+
+def copy_chunk(inFd, outFd, offset, size):
+    # os.write() may write less than it was given; the rest is read again
+    try:
+        data = os.pread(inFd, min(size, CHUNK_SIZE), offset)
+    except OSError:
+        raise ReadError
+    if not data:
+        raise ReadError  # the file was truncated after the header was read
+    return os.write(outFd, data)
+
+def copy_data(inFd, outFd, offset, size):
+    # copy part of a file to the current position of another file; if the
+    # OS supports it, the data is copied in the kernel without passing
+    # through Python (copy_file_range() may even share the blocks on a
+    # copy-on-write file system); otherwise in chunks; a kernel method can't
+    # tell which file failed, so its errors are left for copy_chunk() to
+    # find; raises ReadError or OSError (writing)
+
+    methods = [copy_chunk]
+    if hasattr(os, "sendfile"):
+        methods.insert(0, sendfile)
+    if hasattr(os, "copy_file_range"):
+        methods.insert(0, copy_file_range)
+
+    copied = 0
+    for method in methods:
+        try:
+            while copied < size:
+                count = method(inFd, outFd, offset + copied, size - copied)
+                if count == 0:
+                    raise OSError("unexpected end of file")
+                copied += count
+            return
+        except OSError:
+            # e.g. not supported between these file systems; continue from
+            # where this method left off
+            if method is copy_chunk:
+                raise
+
+def split_file(inputFile, prgFile, chrFile):
+    # write PRG and/or CHR ROM of an iNES ROM file (None = don't write);
+    # each file is written under a temporary name and renamed only after all
+    # files have been copied, so an error never leaves partial files behind;
+    # return: number of files written (CHR ROM may be empty)
 
-    # read input file
     try:
-        with open(args.input_file, "rb") as handle:
-            # header
-            inesInfo = decode_ines_header(handle)
+        with open(inputFile, "rb") as source:
+            inesInfo = decode_ines_header(source)
             if inesInfo is None:
                 sys.exit("Invalid iNES ROM file.")
-            # PRG ROM
-            if args.prg is not None:
-                handle.seek(inesInfo["prgStart"])
-                prgData = handle.read(inesInfo["prgSize"])
-            # CHR ROM
-            if args.chr is not None and inesInfo["chrSize"]:
-                handle.seek(inesInfo["chrStart"])
-                chrData = handle.read(inesInfo["chrSize"])
+            written = []  # [(temporary_path, path), ...]
+            renamed = 0   # how many of them have been renamed
+            try:
+                for (path, start, size) in (
+                    (prgFile, inesInfo["prgStart"], inesInfo["prgSize"]),
+                    (chrFile, inesInfo["chrStart"], inesInfo["chrSize"]),
+                ):
+                    if path is not None and size:
+                        written.append((path + TEMP_SUFFIX, path))
+                        with open(path + TEMP_SUFFIX, "wb") as target:
+                            target.seek(0)
+                            copy_data(
+                                source.fileno(), target.fileno(), start, size
+                            )
+                renamed = 0
+                for (tempPath, path) in written:
+                    os.replace(tempPath, path)
+                    renamed += 1
+            except (OSError, ReadError) as error:
+                # remove what this call created (files renamed already and
+                # the remaining temporary files)
+                for (i, (tempPath, path)) in enumerate(written):
+                    try:
+                        os.remove(path if i < renamed else tempPath)
+                    except OSError:
+                        pass
+                if isinstance(error, ReadError):
+                    sys.exit("Error reading input file.")
+                sys.exit("Error writing output file(s).")
     except OSError:
         sys.exit("Error reading input file.")
+    return len(written)
+
+def get_batch_files(args):
+    # return: [(input_file, PRG_file_or_None, CHR_file_or_None), ...]
+
+    files = []
+    for (dir_, dirs, names) in os.walk(args.input_file):
+        dirs.sort()
+        for name in sorted(names):
+            if name.lower().endswith(".nes"):
+                inputFile = os.path.join(dir_, name)
+                fields = {
+                    "path": os.path.splitext(
+                        os.path.relpath(inputFile, args.input_file)
+                    )[0],
+                    "name": os.path.splitext(name)[0],
+                }
+                files.append((inputFile,) + tuple(
+                    None if t is None
+                    else os.path.join(args.output_dir, t.format(**fields))
+                    for t in (args.prg, args.chr)
+                ))
+
+    outputFiles = [f for file_ in files for f in file_[1:] if f is not None]
+    if len(set(outputFiles)) < len(outputFiles):
+        sys.exit("Some input files would have the same output file.")
+    return files
+
+def split_batch_file(inputFile, prgFile, chrFile):
+    # split one file in batch mode (run in a worker thread); only write the
+    # output files that don't exist yet; return: status
 
-    # write output files
+    (prgFile, chrFile) = (
+        None if f is None or os.path.exists(f) else f
+        for f in (prgFile, chrFile)
+    )
+    if prgFile is None and chrFile is None:
+        return "skipped (output files already exist)"
     try:
-        # PRG ROM
-        if args.prg is not None:
-            with open(args.prg, "wb") as handle:
-                handle.seek(0)
-                handle.write(prgData)
-        # CHR ROM
-        if args.chr is not None and inesInfo["chrSize"]:
-            with open(args.chr, "wb") as handle:
-                handle.seek(0)
-                handle.write(chrData)
+        for path in (prgFile, chrFile):
+            if path is not None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        if split_file(inputFile, prgFile, chrFile) == 0:
+            return "skipped (no CHR ROM)"
+    except SystemExit as error:
+        return str(error)
     except OSError:
-        sys.exit("Error writing output file(s).")
+        return "Error creating output directory."
+    return "written"
+
+def split_batch(args):
+    # the work is mostly waiting for I/O, so threads are enough
+
+    files = get_batch_files(args)
+    statusCounts = {}
+
+    with concurrent.futures.ThreadPoolExecutor(args.jobs) as executor:
+        results = executor.map(lambda f: split_batch_file(*f), files)
+        for ((inputFile, prgFile, chrFile), status) in zip(files, results):
+            print(f"{inputFile}: {status}")
+            if status.startswith("skipped"):
+                status = "skipped"
+            elif status != "written":
+                status = "failed"
+            statusCounts[status] = statusCounts.get(status, 0) + 1
+
+    print(", ".join(f"{c} {s}" for (s, c) in sorted(statusCounts.items())))
+
+def main():
+    args = parse_arguments()
+
+    if args.output_dir is not None:
+        split_batch(args)
+    else:
+        split_file(args.input_file, args.prg, args.chr)
 
 main()
@@ -1,6 +1,7 @@
 # convert NES CHR data into an image
 
-import itertools, os, struct, sys
+import argparse, concurrent.futures, itertools, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
 try:
     from PIL import Image
 except ImportError:
@@ -15,16 +16,17 @@ BYTES_PER_TILE = TILE_WIDTH * TILE_HEIGHT * 2 // BITS_PER_BYTE  # 2 bits/pixel
 
 DEFAULT_PALETTE = "000000,555555,aaaaaa,ffffff"
 
-HELP_TEXT = f"""\
-Convert NES CHR (graphics) data into a PNG file.
-Arguments: inputFile outputFile palette
-    inputFile: File to read. An iNES ROM (.nes) or raw CHR data. Size of raw
-        CHR data must be a multiple of {TILES_PER_ROW*BYTES_PER_TILE} bytes.
-    outputFile: PNG file to write. {TILES_PER_ROW} tiles wide.
-    palette: Optional. Output palette or which colors will correspond to CHR
-        colors 0-3. Four hexadecimal RRGGBB codes (000000-ffffff) separated by
-        commas. Default: {DEFAULT_PALETTE}\
-"""
+# CHR bank sizes for --bank, in KiB
+BANK_SIZES = (1, 2, 4, 8)
+
+# --contact-sheet: width in thumbnails; size of each thumbnail in tiles (the
+# start of the image of each ROM)
+SHEET_COLUMNS = 16
+THUMBNAIL_TILES = (16, 16)
+
+# --batch: file in the output directory that records what each PNG file was
+# created from
+STATE_FILE = ".nes_chr_decode-state.json"
 
 def decode_color(colorStr):
     # decode a hexadecimal RRGGBB color code into (red, green, blue)
@@ -37,123 +39,352 @@ def decode_color(colorStr):
         sys.exit("Unrecognized color code: " + colorStr)
     return tuple((color >> s) & 0xff for s in (16, 8, 0))
 
-def parse_arguments():
-    # return (inputFile, outputFile, palette)
-
-    if not 3 <= len(sys.argv) <= 4:
-        sys.exit(HELP_TEXT)
-
-    (inputFile, outputFile) = sys.argv[1:3]
+def decode_bank_argument(bankStr):
+    # decode "SIZE:INDEX" into (size_in_bytes, index_or_None_for_all)
+    try:
+        (size, index) = bankStr.split(":")
+        size = int(size, 10)
+        if size not in BANK_SIZES:
+            raise ValueError
+        index = None if index == "all" else int(index, 10)
+        if index is not None and index < 0:
+            raise ValueError
+    except ValueError:
+        sys.exit("Invalid --bank.")
+    return (size * 1024, index)
 
-    palette = sys.argv[3] if len(sys.argv) == 4 else DEFAULT_PALETTE
-    palette = tuple(decode_color(c) for c in palette.split(","))
-    if len(palette) != 4:
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Convert NES CHR (graphics) data into a PNG file. Only "
+        "the part of the file that is converted is read."
+    )
+    parser.add_argument(
+        "-b", "--bank", metavar="SIZE:INDEX",
+        help="Only convert one bank of CHR data: SIZE = bank size in KiB ("
+        + "/".join(str(s) for s in BANK_SIZES) + "), INDEX = bank number "
+        "(0 or greater). INDEX 'all' = convert each bank into its own file "
+        "(output_file with a hyphen and the bank number added before the "
+        "extension, e.g. chr-3.png)."
+    )
+    parser.add_argument(
+        "-f", "--first-tile", type=int, default=0,
+        help="First tile to convert, counting from the start of CHR data or "
+        "of each bank (0 or greater, default=0)."
+    )
+    parser.add_argument(
+        "-c", "--tile-count", type=int,
+        help="Number of tiles to convert (1 or greater, default=all from "
+        "--first-tile to the end of CHR data or of each bank)."
+    )
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Convert many files: input_file is a directory to search for "
+        ".nes files (recursively) or a text file with one path per line; "
+        "output_file is an existing directory to write one PNG file per "
+        "input file to (with the same relative path). Input files that "
+        "haven't changed since they were converted with the same options "
+        f"are skipped (this is recorded in {STATE_FILE} in the output "
+        "directory)."
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="With --batch: convert all input files, even the unchanged ones."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="With --batch: number of files to convert in parallel (1 or "
+        "greater, default=the number of CPUs)."
+    )
+    parser.add_argument(
+        "-s", "--contact-sheet", metavar="FILE",
+        help="With --batch: also write a PNG file with the first "
+        f"{THUMBNAIL_TILES[0]*THUMBNAIL_TILES[1]} tiles of each file, "
+        f"{SHEET_COLUMNS} files per row."
+    )
+    parser.add_argument(
+        "input_file",
+        help="File to read. An iNES ROM (.nes) or raw CHR data. Size of raw "
+        f"CHR data must be a multiple of {TILES_PER_ROW*BYTES_PER_TILE} bytes."
+    )
+    parser.add_argument(
+        "output_file", help=f"PNG file to write. {TILES_PER_ROW} tiles wide."
+    )
+    parser.add_argument(
+        "palette", nargs="?", default=DEFAULT_PALETTE,
+        help="Output palette or which colors will correspond to CHR colors "
+        "0-3. Four hexadecimal RRGGBB codes (000000-ffffff) separated by "
+        f"commas. Default: {DEFAULT_PALETTE}"
+    )
+    args = parser.parse_args()
+
+    args.palette = tuple(decode_color(c) for c in args.palette.split(","))
+    if len(args.palette) != 4:
         sys.exit("Incorrect number of colors in palette argument.")
-
-    if not os.path.isfile(inputFile):
+    if args.bank is not None:
+        args.bank = decode_bank_argument(args.bank)
+    if args.first_tile < 0:
+        sys.exit("--first-tile must be 0 or greater.")
+    if args.tile_count is not None and args.tile_count < 1:
+        sys.exit("--tile-count must be 1 or greater.")
+
+    if args.batch:
+        if args.bank is not None and args.bank[1] is None:
+            sys.exit("--bank SIZE:all can't be used with --batch.")
+        if args.jobs < 1:
+            sys.exit("--jobs must be 1 or greater.")
+        if not os.path.exists(args.input_file):
+            sys.exit("Input file or directory not found.")
+        if not os.path.isdir(args.output_file):
+            sys.exit("Output directory not found.")
+        if args.contact_sheet is not None \
+        and os.path.exists(args.contact_sheet):
+            sys.exit("Contact sheet file already exists.")
+        return args
+    if args.contact_sheet is not None:
+        sys.exit("--contact-sheet requires --batch.")
+
+    if not os.path.isfile(args.input_file):
         sys.exit("Input file not found.")
-    if os.path.exists(outputFile):
+    # (with --bank SIZE:all, the output files are checked later)
+    if (args.bank is None or args.bank[1] is not None) \
+    and os.path.exists(args.output_file):
         sys.exit("Output file already exists.")
 
-    return (inputFile, outputFile, palette)
-
-def decode_ines_header(handle):
-    # parse iNES ROM header
-    # (doesn't support VS System or PlayChoice-10 flags or NES 2.0 header)
-    # return: None on error, otherwise (CHR ROM start address, CHR ROM size)
-    # see https://www.nesdev.org/wiki/INES
-
-    fileSize = handle.seek(0, 2)
-    if fileSize < 16:
-        return None
-
-    handle.seek(0)
-    (id_, prgSize, chrSize, flags6) = struct.unpack("4s3B", handle.read(7))
-
-    prgSize *= 16 * 1024
-    chrSize *= 8 * 1024
-    trainerSize = bool(flags6 & 0b0000_0100) * 512
-
-    if id_ != b"NES\x1a" or fileSize < 16 + trainerSize + prgSize + chrSize:
-        return None
-
-    return (16 + trainerSize + prgSize, chrSize)
+    return args
 
 def get_chr_info(handle):
     # detect file type and get (address, size) of CHR ROM data
 
-    # try as iNES ROM
-    chrInfo = decode_ines_header(handle)
-    if chrInfo is not None:
-        if chrInfo[1] == 0:
-            sys.exit("iNES ROM file has no CHR ROM.")
-        return chrInfo
-
-    # try as raw CHR data
-    fileSize = handle.seek(0, 2)
-    if fileSize == 0 or fileSize % (TILES_PER_ROW * BYTES_PER_TILE):
+    chrInfo = qneslib.chr_info(handle)
+    if chrInfo is None:
         sys.exit("Unrecognized input file format.")
-    return (0, fileSize)
-
-def generate_tiles(handle):
-    # read NES CHR data, generate tiles (tuples of 64 2-bit ints);
-    # CHR data format:
-    #     - tile = 16 bytes = 2 bitplanes (first low, then high)
-    #     - bitplane = 8 bytes (first = topmost)
-    #     - byte = 8*1 pixels of 1 bitplane (MSB = leftmost pixel)
-
-    bytesPerBitplane = TILE_WIDTH * TILE_HEIGHT // BITS_PER_BYTE
-    (chrAddr, chrSize) = get_chr_info(handle)
-    tileCount = chrSize // BYTES_PER_TILE
-    handle.seek(chrAddr)
-
-    decodedTile = []
-    for i in range(tileCount):
-        tile = handle.read(BYTES_PER_TILE)
-        decodedTile.clear()
-        for y in range(TILE_HEIGHT):
-            lowBits = tile[y]
-            highBits = tile[bytesPerBitplane+y] << 1
-            decodedTile.extend(
-                ((lowBits >> s) & 1) | ((highBits >> s) & 2)
-                for s in range(TILE_WIDTH - 1, -1, -1)
+    if chrInfo[1] == 0:
+        sys.exit("iNES ROM file has no CHR ROM.")
+    return chrInfo
+
+def get_regions(chrSize, args):
+    # get the part(s) of CHR data to convert;
+    # return: list of (address_in_CHR_data, size, bank_number_or_None)
+
+    if args.bank is None:
+        banks = [(0, chrSize, None)]
+    else:
+        (bankSize, index) = args.bank
+        if chrSize % bankSize:
+            sys.exit(
+                f"CHR data size ({chrSize} bytes) is not a multiple of bank "
+                "size."
             )
-        yield tuple(decodedTile)
+        if index is not None and index >= chrSize // bankSize:
+            sys.exit(
+                f"Bank number out of range (CHR data has {chrSize//bankSize} "
+                f"bank(s) of {bankSize//1024} KiB)."
+            )
+        banks = [
+            (i * bankSize, bankSize, i) for i in range(chrSize // bankSize)
+            if index in (None, i)
+        ]
+
+    # only some tiles of each bank
+    regionTiles = banks[0][1] // BYTES_PER_TILE
+    tileCount = regionTiles - args.first_tile if args.tile_count is None \
+    else args.tile_count
+    if args.first_tile + tileCount > regionTiles or tileCount < 1:
+        sys.exit(
+            f"Tiles beyond the end of CHR data or bank ({regionTiles} tiles)."
+        )
+    return [
+        (addr + args.first_tile * BYTES_PER_TILE, tileCount * BYTES_PER_TILE,
+        bank)
+        for (addr, size, bank) in banks
+    ]
+
+def get_output_file(path, bank):
+    # output file name for a bank (None = not --bank SIZE:all)
+    if bank is None:
+        return path
+    (root, ext) = os.path.splitext(path)
+    return f"{root}-{bank}{ext}"
+
+def create_image(chrData, palette):
+    # decode all tiles at once (see qneslib.chr_decode()); return image
+
+    imageHeight = -(-len(chrData) // (TILES_PER_ROW * BYTES_PER_TILE)) \
+    * TILE_HEIGHT
+    image = Image.frombytes(
+        "P", (TILES_PER_ROW * TILE_WIDTH, imageHeight),
+        qneslib.chr_decode(chrData, TILES_PER_ROW)
+    )
+    image.putpalette(itertools.chain.from_iterable(palette))
 
-def create_image(handle, palette):
-    # read CHR data from file, return image
+    return image
 
-    # get height of output image
-    (chrAddr, chrSize) = get_chr_info(handle)
-    imageHeight = chrSize // (TILES_PER_ROW * BYTES_PER_TILE) * TILE_HEIGHT
+def save_image(image, path):
+    try:
+        with open(path, "wb") as handle:
+            handle.seek(0)
+            image.save(handle, "png")
+    except OSError:
+        sys.exit("Error writing output file.")
 
-    # create image
-    image = Image.new("P", (TILES_PER_ROW * TILE_WIDTH, imageHeight))
-    image.putpalette(itertools.chain.from_iterable(palette))
+def get_batch_files(args):
+    # return: [(input_file, output_file), ...]
 
-    # decode CHR data and copy it to the image, one tile at a time
-    tileImage = Image.new("P", (TILE_WIDTH, TILE_HEIGHT))
-    for (i, tile) in enumerate(generate_tiles(handle)):
-        tileImage.putdata(tile)
-        (y, x) = divmod(i, TILES_PER_ROW)
-        image.paste(tileImage, (x * TILE_WIDTH, y * TILE_HEIGHT))
+    if os.path.isdir(args.input_file):
+        inputFiles = []
+        for (dir_, dirs, files) in os.walk(args.input_file):
+            dirs.sort()
+            inputFiles.extend(
+                os.path.join(dir_, f) for f in sorted(files)
+                if f.lower().endswith(".nes")
+            )
+        relPaths = [os.path.relpath(f, args.input_file) for f in inputFiles]
+    else:
+        try:
+            with open(args.input_file, "rt", encoding="utf-8") as handle:
+                inputFiles = [
+                    l.strip() for l in handle
+                    if l.strip() and not l.startswith("#")
+                ]
+        except OSError:
+            sys.exit("Error reading the file list.")
+        except UnicodeDecodeError:
+            sys.exit("The file list is not UTF-8.")
+        relPaths = [os.path.basename(f) for f in inputFiles]
+
+    outputFiles = [
+        os.path.join(args.output_file, os.path.splitext(p)[0] + ".png")
+        for p in relPaths
+    ]
+    if len(set(outputFiles)) < len(outputFiles):
+        sys.exit("Some input files would have the same output file.")
+    return list(zip(inputFiles, outputFiles))
+
+def convert_file(inputFile, outputFile, upToDate, args):
+    # convert one file in batch mode (run in a worker process; each worker
+    # only holds the CHR data and image of one file at a time);
+    # return: (status, thumbnail_pixels_or_None)
 
-    return image
+    try:
+        if upToDate:
+            status = "up to date"
+            if args.contact_sheet is not None:
+                image = Image.open(outputFile)
+        else:
+            with open(inputFile, "rb") as handle:
+                (chrAddr, chrSize) = get_chr_info(handle)
+                (addr, size, bank) = get_regions(chrSize, args)[0]
+                handle.seek(chrAddr + addr)
+                image = create_image(handle.read(size), args.palette)
+            os.makedirs(os.path.dirname(outputFile), exist_ok=True)
+            save_image(image, outputFile)
+            status = "written"
+        if args.contact_sheet is None:
+            return (status, None)
+        # the top left corner (padded with color 0 if needed)
+        return (status, image.crop((
+            0, 0,
+            THUMBNAIL_TILES[0] * TILE_WIDTH, THUMBNAIL_TILES[1] * TILE_HEIGHT
+        )).tobytes())
+    except SystemExit as error:
+        return (str(error), None)
+    except OSError:
+        return ("error reading or writing", None)
+
+def convert_batch(args):
+    # convert many files in parallel, write contact sheet
+
+    files = get_batch_files(args)
+    thumbnails = []
+    statusCounts = {}
+
+    # an output file is up to date if it exists and was created from the same
+    # input file (size and modification time) with the same options
+    statePath = os.path.join(args.output_file, STATE_FILE)
+    state = qneslib.state_read(statePath)
+    keys = [os.path.relpath(o, args.output_file) for (i, o) in files]
+    signatures = [
+        qneslib.file_signature(
+            i, args.bank, args.first_tile, args.tile_count, args.palette
+        ) for (i, o) in files
+    ]
+    upToDate = [
+        not args.force and s is not None and state.get(k) == s
+        and os.path.isfile(o)
+        for ((i, o), k, s) in zip(files, keys, signatures)
+    ]
+
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as executor:
+        results = executor.map(
+            convert_file, *zip(*files), upToDate, itertools.repeat(args)
+        ) if files else ()
+        for ((inputFile, outputFile), key, signature, (status, thumbnail)) \
+        in zip(files, keys, signatures, results):
+            print(f"{inputFile}: {status}")
+            if thumbnail is not None:
+                thumbnails.append(thumbnail)
+            if status in ("written", "up to date"):
+                state[key] = signature
+            else:
+                state.pop(key, None)
+                status = "failed"
+            statusCounts[status] = statusCounts.get(status, 0) + 1
+
+    print(", ".join(f"{c} {s}" for (s, c) in sorted(statusCounts.items())))
+
+    if not qneslib.state_write(statePath, state):
+        sys.exit("Error writing state file.")
+
+    if args.contact_sheet is not None and thumbnails:
+        size = (
+            THUMBNAIL_TILES[0] * TILE_WIDTH, THUMBNAIL_TILES[1] * TILE_HEIGHT
+        )
+        sheet = Image.new("P", (
+            min(len(thumbnails), SHEET_COLUMNS) * size[0],
+            -(-len(thumbnails) // SHEET_COLUMNS) * size[1]
+        ))
+        sheet.putpalette(itertools.chain.from_iterable(args.palette))
+        for (i, thumbnail) in enumerate(thumbnails):
+            sheet.paste(
+                Image.frombytes("P", size, thumbnail),
+                ((i % SHEET_COLUMNS) * size[0], (i // SHEET_COLUMNS) * size[1])
+            )
+        save_image(sheet, args.contact_sheet)
 
 def main():
-    (inputFile, outputFile, palette) = parse_arguments()
+    args = parse_arguments()
 
-    try:
-        with open(inputFile, "rb") as handle:
-            image = create_image(handle, palette)
-    except OSError:
-        sys.exit("Error reading input file.")
+    if args.batch:
+        convert_batch(args)
+        return
 
     try:
-        with open(outputFile, "wb") as handle:
-            handle.seek(0)
-            image.save(handle, "png")
+        with open(args.input_file, "rb") as handle:
+            (chrAddr, chrSize) = get_chr_info(handle)
+            regions = get_regions(chrSize, args)
+            allBanks = args.bank is not None and args.bank[1] is None
+            if allBanks:
+                for (addr, size, bank) in regions:
+                    if os.path.exists(get_output_file(args.output_file, bank)):
+                        sys.exit(
+                            "Output file already exists: "
+                            + get_output_file(args.output_file, bank)
+                        )
+
+            # read each region right before converting it
+            for (addr, size, bank) in regions:
+                handle.seek(chrAddr + addr)
+                image = create_image(handle.read(size), args.palette)
+                save_image(image, get_output_file(
+                    args.output_file, bank if allBanks else None
+                ))
     except OSError:
-        sys.exit("Error writing output file.")
+        sys.exit("Error reading input file.")
 
-main()
+# in batch mode, convert_file() runs in worker processes that import this
+# file on platforms that spawn them (Windows, macOS); they must not run
+# main() again
+if __name__ == "__main__":
+    main()
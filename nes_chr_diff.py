@@ -0,0 +1,212 @@
+import argparse, itertools, json, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+try:
+    from PIL import Image
+except ImportError:
+    sys.exit("Pillow module required. See https://python-pillow.org")
+
+TILES_PER_ROW = 16  # image width in tiles (per file)
+TILE_WIDTH    = 8   # in pixels
+TILE_HEIGHT   = 8   # in pixels
+GAP_WIDTH     = 8   # between the files in the image, in pixels
+
+BYTES_PER_TILE = TILE_WIDTH * TILE_HEIGHT * 2 // 8  # 2 bits/pixel
+
+# image palette: CHR colors 0-3 for unchanged, changed and moved tiles, then
+# the gap
+PALETTE = (
+    (0x00, 0x00, 0x00), (0x55, 0x55, 0x55), (0xaa, 0xaa, 0xaa),
+    (0xff, 0xff, 0xff),
+    (0x40, 0x00, 0x00), (0x80, 0x2a, 0x2a), (0xc0, 0x55, 0x55),
+    (0xff, 0x80, 0x80),
+    (0x00, 0x00, 0x40), (0x2a, 0x2a, 0x80), (0x55, 0x55, 0xc0),
+    (0x80, 0x80, 0xff),
+    (0x80, 0x80, 0x00),
+)
+COLOR_OFFSETS = {"changed": 4, "moved": 8}  # ORed to CHR colors
+GAP_COLOR = 12
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Compare the CHR data of two files tile by tile (e.g. "
+        "two versions of a game) and print the tiles that differ. A tile that "
+        "is found elsewhere in the first file is reported as moved, otherwise "
+        "as changed."
+    )
+    parser.add_argument(
+        "-i", "--image", metavar="FILE",
+        help="Also save the CHR data of both files side by side as a PNG "
+        "image, with changed tiles in red and moved tiles in blue."
+    )
+    parser.add_argument(
+        "-j", "--json", metavar="FILE",
+        help="Also save the differences as JSON."
+    )
+    parser.add_argument(
+        "input_file1", help="iNES ROM file (.nes) or raw CHR data file."
+    )
+    parser.add_argument(
+        "input_file2", help="iNES ROM file (.nes) or raw CHR data file."
+    )
+    args = parser.parse_args()
+
+    for path in (args.input_file1, args.input_file2):
+        if not os.path.isfile(path):
+            sys.exit(f"Input file not found: {path}")
+    for path in (args.image, args.json):
+        if path is not None and os.path.exists(path):
+            sys.exit(f"Output file already exists: {path}")
+
+    return args
+
+def read_chr_data(path):
+    try:
+        with open(path, "rb") as handle:
+            chrInfo = qneslib.chr_info(handle)
+            if chrInfo is None:
+                sys.exit("Unrecognized input file format.")
+            if chrInfo[1] == 0:
+                sys.exit("iNES ROM file has no CHR ROM.")
+            (chrAddr, chrSize) = chrInfo
+            handle.seek(chrAddr)
+            return handle.read(chrSize)
+    except OSError:
+        sys.exit(f"Error reading {path}")
+
+def get_tiles(chrData):
+    return [
+        chrData[pos:pos+BYTES_PER_TILE]
+        for pos in range(0, len(chrData), BYTES_PER_TILE)
+    ]
+
+def compare_tiles(tiles1, tiles2):
+    # generate: (tile_index, type, tile_index_in_first_file_or_None) for each
+    # tile that differs; type: "changed", "moved", "added" or "removed"
+
+    # tile -> first index in the first file (one pass over each file)
+    firstIndexes = {}
+    for (index, tile) in enumerate(tiles1):
+        firstIndexes.setdefault(tile, index)
+
+    for (index, tile) in enumerate(tiles2):
+        if index >= len(tiles1):
+            yield (index, "added", None)
+        elif tile != tiles1[index]:
+            if tile in firstIndexes:
+                yield (index, "moved", firstIndexes[tile])
+            else:
+                yield (index, "changed", None)
+    for index in range(len(tiles2), len(tiles1)):
+        yield (index, "removed", None)
+
+def create_image(chrData, differences):
+    # decode CHR data and tint the tiles that differ;
+    # differences: {tile_index: "changed"/"moved", ...}
+
+    pixels = qneslib.chr_decode(chrData, TILES_PER_ROW)
+    (width, height) = (
+        TILES_PER_ROW * TILE_WIDTH, len(pixels) // (TILES_PER_ROW * TILE_WIDTH)
+    )
+
+    # one color offset per tile, scaled to one per pixel, then ORed to the
+    # pixels (CHR colors only use the two lowest bits)
+    tints = bytearray(len(pixels) // (TILE_WIDTH * TILE_HEIGHT))
+    for (tile, type_) in differences.items():
+        tints[tile] = COLOR_OFFSETS[type_]
+    tints = Image.frombytes(
+        "L", (TILES_PER_ROW, height // TILE_HEIGHT), bytes(tints)
+    ).resize((width, height), Image.Resampling.NEAREST).tobytes()
+    pixels = (
+        int.from_bytes(pixels, "big") | int.from_bytes(tints, "big")
+    ).to_bytes(len(pixels), "big")
+
+    return Image.frombytes("P", (width, height), pixels)
+
+def save_image(chrData1, chrData2, differences, path):
+    # save the CHR data of both files side by side
+
+    # the tile that replaced a tile in the first file has the same type
+    types = dict(
+        (index, "changed" if type_ in ("added", "removed") else type_)
+        for (index, type_, origIndex) in differences
+    )
+    images = [
+        create_image(
+            chrData, dict((i, t) for (i, t) in types.items() if i < tileCount)
+        )
+        for (chrData, tileCount) in (
+            (chrData1, len(chrData1) // BYTES_PER_TILE),
+            (chrData2, len(chrData2) // BYTES_PER_TILE),
+        )
+    ]
+
+    image = Image.new(
+        "P",
+        (images[0].width * 2 + GAP_WIDTH, max(i.height for i in images)),
+        GAP_COLOR
+    )
+    image.putpalette(itertools.chain.from_iterable(PALETTE))
+    image.paste(images[0], (0, 0))
+    image.paste(images[1], (images[0].width + GAP_WIDTH, 0))
+
+    try:
+        with open(path, "wb") as handle:
+            handle.seek(0)
+            image.save(handle, "png")
+    except OSError:
+        sys.exit("Error writing the image file.")
+
+def save_json(args, tileCounts, differences, path):
+    report = {
+        "file1": args.input_file1,
+        "file2": args.input_file2,
+        "tiles1": tileCounts[0],
+        "tiles2": tileCounts[1],
+        "differences": [
+            dict(
+                [("tile", index), ("type", type_)]
+                + ([("from", origIndex)] if origIndex is not None else [])
+            )
+            for (index, type_, origIndex) in differences
+        ],
+    }
+    try:
+        with open(path, "wt", encoding="ascii") as handle:
+            handle.seek(0)
+            json.dump(report, handle, indent=1)
+            handle.write("\n")
+    except OSError:
+        sys.exit("Error writing the JSON file.")
+
+def main():
+    args = parse_arguments()
+
+    chrData1 = read_chr_data(args.input_file1)
+    chrData2 = read_chr_data(args.input_file2)
+    (tiles1, tiles2) = (get_tiles(chrData1), get_tiles(chrData2))
+    differences = list(compare_tiles(tiles1, tiles2))
+
+    for (index, type_, origIndex) in differences:
+        print(
+            f"Tile 0x{index:04x}: {type_}"
+            + (f" (from 0x{origIndex:04x})" if origIndex is not None else "")
+        )
+    typeCounts = dict(
+        (t, sum(1 for d in differences if d[1] == t))
+        for t in ("changed", "moved", "added", "removed")
+    )
+    unchanged = min(len(tiles1), len(tiles2)) - typeCounts["changed"] \
+    - typeCounts["moved"]
+    print(
+        f"Tiles: {len(tiles1)} and {len(tiles2)}; unchanged: {unchanged}, "
+        + ", ".join(f"{t}: {c}" for (t, c) in typeCounts.items())
+    )
+
+    if args.image is not None:
+        save_image(chrData1, chrData2, differences, args.image)
+    if args.json is not None:
+        save_json(args, (len(tiles1), len(tiles2)), differences, args.json)
+
+main()
@@ -0,0 +1,218 @@
+import argparse, collections, concurrent.futures, os, sqlite3, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+
+BYTES_PER_TILE = 16
+
+# the tiles of each ROM are stored as such (a tile is smaller than a hash of
+# it); each distinct tile of a ROM is stored once with its count
+DATABASE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rom (
+        id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL,
+        size INTEGER NOT NULL, mtime INTEGER NOT NULL,
+        tiles INTEGER NOT NULL, unique_tiles INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS tile (
+        rom INTEGER NOT NULL, data BLOB NOT NULL, count INTEGER NOT NULL,
+        PRIMARY KEY (rom, data)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS tile_data ON tile (data);
+"""
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Find duplicate CHR ROM tiles within and between iNES ROM "
+        "files (.nes). The tiles are stored in an SQLite database; ROMs that "
+        "are already in it and haven't changed (same size and modification "
+        "time) are not read again. Prints the share of duplicate tiles in "
+        "each ROM and the tiles that occur in the most ROMs."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="Number of ROMs to read in parallel (1 or greater, default=the "
+        "number of CPUs)."
+    )
+    parser.add_argument(
+        "-t", "--top", type=int, default=10,
+        help="Number of most shared tiles to print (0 or greater, "
+        "default=10)."
+    )
+    parser.add_argument(
+        "database", help="SQLite database file to create or update."
+    )
+    parser.add_argument(
+        "input", nargs="*",
+        help="iNES ROM files to add, or directories to search for .nes files "
+        "(recursively). ROMs that no longer exist are removed from the "
+        "database. If none are specified, only the report is printed."
+    )
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        sys.exit("--jobs must be 1 or greater.")
+    if args.top < 0:
+        sys.exit("--top must be 0 or greater.")
+    for path in args.input:
+        if not os.path.exists(path):
+            sys.exit(f"Not found: {path}")
+
+    return args
+
+def get_rom_paths(inputs):
+    # generate: absolute paths of iNES ROM files
+    for path in inputs:
+        if os.path.isdir(path):
+            for (dir_, dirs, files) in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".nes"):
+                        yield os.path.abspath(os.path.join(dir_, name))
+        else:
+            yield os.path.abspath(path)
+
+def get_file_state(path):
+    # return: (size, modification_time)
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+def read_tiles(path):
+    # read the CHR ROM of a ROM file and count its distinct tiles (run in a
+    # worker process); return: {tile: count, ...} or an error message
+    try:
+        with open(path, "rb") as handle:
+            fileInfo = qneslib.ines_header_decode(handle)
+            if fileInfo is None:
+                return "not a valid iNES ROM file"
+            handle.seek(fileInfo["chrStart"])
+            chrData = handle.read(fileInfo["chrSize"])
+    except OSError:
+        return "error reading the file"
+    return collections.Counter(
+        chrData[pos:pos+BYTES_PER_TILE]
+        for pos in range(0, len(chrData), BYTES_PER_TILE)
+    )
+
+def update_database(connection, paths, jobs):
+    # add new and changed ROMs to the database, remove missing ones;
+    # return: (number_of_ROMs_read, number_of_ROMs_removed)
+
+    knownStates = dict(
+        (path, (size, mtime)) for (path, size, mtime)
+        in connection.execute("SELECT path, size, mtime FROM rom")
+    )
+    states = {}
+    for path in paths:
+        try:
+            states[path] = get_file_state(path)
+        except OSError:
+            print(f"Warning: skipping {path}: can't stat", file=sys.stderr)
+    toRead = [p for p in states if knownStates.get(p) != states[p]]
+
+    # read in parallel, write to the database in this process
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        results = executor.map(read_tiles, toRead, chunksize=16)
+        for (path, tiles) in zip(toRead, results):
+            connection.execute(
+                "DELETE FROM tile WHERE rom = "
+                "(SELECT id FROM rom WHERE path = ?)", (path,)
+            )
+            connection.execute("DELETE FROM rom WHERE path = ?", (path,))
+            if isinstance(tiles, str):
+                print(f"Warning: skipping {path}: {tiles}", file=sys.stderr)
+                continue
+            romId = connection.execute(
+                "INSERT INTO rom (path, size, mtime, tiles, unique_tiles) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path,) + states[path] + (sum(tiles.values()), len(tiles))
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO tile (rom, data, count) VALUES (?, ?, ?)",
+                ((romId, tile, count) for (tile, count) in tiles.items())
+            )
+
+    missing = [p for p in knownStates if not os.path.isfile(p)]
+    for path in missing:
+        connection.execute(
+            "DELETE FROM tile WHERE rom = (SELECT id FROM rom WHERE path = ?)",
+            (path,)
+        )
+        connection.execute("DELETE FROM rom WHERE path = ?", (path,))
+
+    connection.commit()
+    return (len(toRead), len(missing))
+
+def print_report(connection, top):
+    # print duplicate statistics of each ROM and the whole library
+
+    # the number of distinct tiles of each ROM that occur in other ROMs too
+    sharedCounts = dict(connection.execute(
+        "SELECT rom, COUNT(*) FROM tile AS t WHERE EXISTS "
+        "(SELECT 1 FROM tile AS u WHERE u.data = t.data AND u.rom != t.rom) "
+        "GROUP BY rom"
+    ))
+
+    print("dup%   tiles  unique  shared  file")
+    for (romId, path, tiles, uniqueTiles) in connection.execute(
+        "SELECT id, path, tiles, unique_tiles FROM rom ORDER BY path"
+    ):
+        dupRatio = (tiles - uniqueTiles) / tiles if tiles else 0
+        print(
+            f"{dupRatio*100:5.1f} {tiles:7} {uniqueTiles:7} "
+            f"{sharedCounts.get(romId, 0):7}  {path}"
+        )
+    print()
+
+    (romCount, tileCount) = connection.execute(
+        "SELECT COUNT(*), IFNULL(SUM(tiles), 0) FROM rom"
+    ).fetchone()
+    (distinctCount,) = connection.execute(
+        "SELECT COUNT(DISTINCT data) FROM tile"
+    ).fetchone()
+    (sharedCount,) = connection.execute(
+        "SELECT COUNT(*) FROM "
+        "(SELECT data FROM tile GROUP BY data HAVING COUNT(*) > 1)"
+    ).fetchone()
+    print(f"ROMs: {romCount}")
+    print(f"Tiles: {tileCount}")
+    print(f"Distinct tiles in all ROMs: {distinctCount}")
+    print(
+        f"Duplicate tiles: {tileCount-distinctCount} "
+        f"({(tileCount-distinctCount)*BYTES_PER_TILE} bytes)"
+    )
+    print(f"Distinct tiles in more than one ROM: {sharedCount}")
+
+    if top == 0 or sharedCount == 0:
+        return
+    print()
+    print("Most shared tiles:")
+    for (tile, roms) in connection.execute(
+        "SELECT data, COUNT(*) AS roms FROM tile GROUP BY data "
+        "HAVING roms > 1 ORDER BY roms DESC, data LIMIT ?", (top,)
+    ).fetchall():
+        print(f"  {tile.hex()}: {roms} ROMs")
+
+def main():
+    args = parse_arguments()
+
+    try:
+        connection = sqlite3.connect(args.database)
+        connection.executescript(DATABASE_SCHEMA)
+        (readCount, removedCount) = update_database(
+            connection, list(get_rom_paths(args.input)), args.jobs
+        )
+        print(
+            f"{readCount} ROM(s) read, {removedCount} removed from the "
+            "database."
+        )
+        print()
+        print_report(connection, args.top)
+        connection.close()
+    except sqlite3.Error as error:
+        sys.exit(f"Database error: {error}")
+
+# read_tiles() runs in worker processes that import this file when they
+# are spawned (Windows, macOS); only the main process may open the
+# database
+if __name__ == "__main__":
+    main()
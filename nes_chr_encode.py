@@ -1,6 +1,7 @@
 # convert an image into NES CHR data
 
-import os, sys
+import argparse, os, sys, time
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
 try:
     from PIL import Image
 except ImportError:
@@ -14,22 +15,16 @@ BYTES_PER_TILE = TILE_WIDTH * TILE_HEIGHT * 2 // 8  # 2 bits/pixel
 
 DEFAULT_PALETTE = "000000,555555,aaaaaa,ffffff"
 
-HELP_TEXT = f"""\
-Convert an image file into an NES CHR (graphics) data file.
-Arguments: inputFile outputFile palette
-    inputFile: Image file to read (e.g. PNG). Width must be
-        {TILES_PER_ROW*TILE_WIDTH} pixels ({TILES_PER_ROW} tiles). Height must
-        be a multiple of {TILE_HEIGHT} pixels (1 tile). No more than 4 unique
-        colors.
-    outputFile: NES CHR data file to write. The size will be a multiple of
-        {TILES_PER_ROW*BYTES_PER_TILE} bytes ({TILES_PER_ROW} tiles).
-    palette: Optional. Input palette (which image colors correspond to CHR
-        colors 0-3). Four hexadecimal RRGGBB color codes (000000-ffffff)
-        separated by commas. All colors must be distinct. Palette must include
-        every unique color in input file. Palette may contain colors not
-        present in input file.
-        Default: {DEFAULT_PALETTE}\
-"""
+# --watch: how often to check the input file and how long it must stay
+# unchanged before it is read (in seconds)
+POLL_INTERVAL = 0.2
+DEBOUNCE_TIME = 0.5
+
+# --name-table: a name table byte refers to one of this many tiles
+MAX_UNIQUE_TILES = 256
+# --flip-flags: bits as in sprite attributes
+HORIZONTAL_FLIP = 0x40
+VERTICAL_FLIP   = 0x80
 
 def decode_color_code(colorStr):
     # decode a hexadecimal RRGGBB color code into (red, green, blue)
@@ -42,29 +37,106 @@ def decode_color_code(colorStr):
     return tuple((color >> s) & 0xff for s in (16, 8, 0))
 
 def parse_arguments():
-    # return: (inputFile, outputFile, palette)
-
-    if not 3 <= len(sys.argv) <= 4:
-        sys.exit(HELP_TEXT)
+    # parse command line arguments using argparse
 
-    (inputFile, outputFile) = sys.argv[1:3]
+    parser = argparse.ArgumentParser(
+        description="Convert an image file into an NES CHR (graphics) data "
+        "file, or write the CHR data directly into the CHR ROM of an iNES ROM "
+        "file (.nes)."
+    )
+    parser.add_argument(
+        "-r", "--rom", action="store_true",
+        help="output_file is an existing iNES ROM file: overwrite part of its "
+        "CHR ROM (see --first-tile) instead of creating a new file. The rest "
+        "of the file is not touched."
+    )
+    parser.add_argument(
+        "-f", "--first-tile", type=int,
+        help="With --rom: first tile of CHR ROM to overwrite (0 or greater, "
+        "default=0). The CHR data must fit in the CHR ROM."
+    )
+    parser.add_argument(
+        "-w", "--watch", action="store_true",
+        help="After writing, keep watching input_file and whenever it "
+        "changes, rewrite only the tiles that changed. Press Ctrl+C to stop."
+    )
+    parser.add_argument(
+        "-n", "--name-table", metavar="FILE",
+        help="Write only the unique tiles to output_file and a name table to "
+        "FILE: the index of the tile in each 8*8-pixel cell of the image (1 "
+        "byte/cell, row by row). The image may then be any size (width and "
+        f"height multiples of {TILE_WIDTH} pixels) but it must have no more "
+        f"than {MAX_UNIQUE_TILES} unique tiles."
+    )
+    parser.add_argument(
+        "--flip-flags", metavar="FILE",
+        help="With --name-table: also treat horizontally and vertically "
+        "flipped tiles as duplicates and write how each cell is flipped to "
+        f"FILE (1 byte/cell: 0x{HORIZONTAL_FLIP:02x}=horizontally, "
+        f"0x{VERTICAL_FLIP:02x}=vertically, as in sprite attributes)."
+    )
+    parser.add_argument(
+        "input_file",
+        help=f"Image file to read (e.g. PNG). Width must be "
+        f"{TILES_PER_ROW*TILE_WIDTH} pixels ({TILES_PER_ROW} tiles). Height "
+        f"must be a multiple of {TILE_HEIGHT} pixels (1 tile). No more than 4 "
+        "unique colors."
+    )
+    parser.add_argument(
+        "output_file",
+        help="NES CHR data file to write. The size will be a multiple of "
+        f"{TILES_PER_ROW*BYTES_PER_TILE} bytes ({TILES_PER_ROW} tiles). (With "
+        "--rom: iNES ROM file to modify.)"
+    )
+    parser.add_argument(
+        "palette", nargs="?", default=DEFAULT_PALETTE,
+        help="Input palette (which image colors correspond to CHR colors "
+        "0-3). Four hexadecimal RRGGBB color codes (000000-ffffff) separated "
+        "by commas. All colors must be distinct. Palette must include every "
+        "unique color in input file. Palette may contain colors not present "
+        f"in input file. Default: {DEFAULT_PALETTE}"
+    )
+    args = parser.parse_args()
 
-    palette = sys.argv[3] if len(sys.argv) == 4 else DEFAULT_PALETTE
-    palette = tuple(decode_color_code(c) for c in palette.split(","))
-    if len(palette) != 4:
+    args.palette = tuple(decode_color_code(c) for c in args.palette.split(","))
+    if len(args.palette) != 4:
         sys.exit("Incorrect number of colors in palette argument.")
-    if len(set(palette)) < 4:
+    if len(set(args.palette)) < 4:
         sys.exit("All colors in palette argument must be distinct.")
 
-    if not os.path.isfile(inputFile):
+    if args.first_tile is not None:
+        if not args.rom:
+            sys.exit("--first-tile requires --rom.")
+        if args.first_tile < 0:
+            sys.exit("--first-tile must be 0 or greater.")
+    else:
+        args.first_tile = 0
+
+    if args.flip_flags is not None and args.name_table is None:
+        sys.exit("--flip-flags requires --name-table.")
+    if args.watch and args.name_table is not None:
+        sys.exit("--watch and --name-table can't be used together.")
+
+    if not os.path.isfile(args.input_file):
         sys.exit("Input file not found.")
-    if os.path.exists(outputFile):
+    if args.rom:
+        if not os.path.isfile(args.output_file):
+            sys.exit("Output file not found.")
+    elif os.path.exists(args.output_file):
         sys.exit("Output file already exists.")
+    if args.name_table is not None and os.path.exists(args.name_table):
+        sys.exit("Name table file already exists.")
+    if args.flip_flags is not None and os.path.exists(args.flip_flags):
+        sys.exit("Flip flags file already exists.")
 
-    return (inputFile, outputFile, palette)
+    return args
 
-def validate_and_prepare_image(image):
-    if image.width != TILES_PER_ROW * TILE_WIDTH:
+def validate_and_prepare_image(image, anyWidth=False):
+    # anyWidth: allow any multiple of TILE_WIDTH
+    if anyWidth:
+        if image.width == 0 or image.width % TILE_WIDTH:
+            sys.exit(f"Image width must be a multiple of {TILE_WIDTH} pixels.")
+    elif image.width != TILES_PER_ROW * TILE_WIDTH:
         sys.exit(f"Image width must be {TILES_PER_ROW*TILE_WIDTH} pixels.")
     if image.height == 0 or image.height % TILE_HEIGHT:
         sys.exit(f"Image height must be a multiple of {TILE_HEIGHT} pixels.")
@@ -99,50 +171,222 @@ def get_color_conv_table(image, targetPal):
 
     return tuple(targetPal.index(c) for c in origPal)
 
-def generate_tiles(image):
-    # generate tiles (64 2-bit integers each) from image
-    for y in range(0, image.height, TILE_HEIGHT):
-        for x in range(0, TILES_PER_ROW * TILE_WIDTH, TILE_WIDTH):
-            yield image.crop((x, y, x + TILE_WIDTH, y + TILE_HEIGHT)).getdata()
-
-def encode_image(image, palette):
-    # generate NES CHR data from image (1 byte per call);
-    # palette: a tuple of four (red, green, blue) tuples;
-    # CHR data format:
-    #     - tile = 16 bytes = 2 bitplanes (first low, then high)
-    #     - bitplane = 8 bytes (first = topmost)
-    #     - byte = 8*1 pixels of 1 bitplane (MSB = leftmost pixel)
-
-    image = validate_and_prepare_image(image)
-    colorConvTable = get_color_conv_table(image, palette)
+def encode_image(image, palette, anyWidth=False):
+    # convert image into color indexes 0-3 (one byte per pixel, all pixels at
+    # once); palette: a tuple of four (red, green, blue) tuples;
+    # return: (width_in_pixels, color_indexes)
 
-    for tile in generate_tiles(image):
-        tile = tuple(colorConvTable[c] for c in tile)
-        for bitplane in range(2):
-            for y in range(0, TILE_HEIGHT * TILE_WIDTH, TILE_WIDTH):
-                yield sum(
-                    ((tile[y+x] >> bitplane) & 1) << (7 - x)
-                    for x in range(TILE_WIDTH)
-                )
+    image = validate_and_prepare_image(image, anyWidth)
+    colorConvTable = get_color_conv_table(image, palette)
 
-def main():
-    (inputFile, outputFile, palette) = parse_arguments()
+    return (image.width, image.tobytes().translate(
+        bytes(colorConvTable) + bytes(256 - len(colorConvTable))
+    ))
 
-    # read and convert data
+def read_image(path, palette, anyWidth=False):
+    # read an image file; return: see encode_image()
     try:
-        with open(inputFile, "rb") as handle:
+        with open(path, "rb") as handle:
             handle.seek(0)
             image = Image.open(handle)
-            chrData = bytes(encode_image(image, palette))
+            return encode_image(image, palette, anyWidth)
     except OSError:
         sys.exit("Error reading input file.")
 
-    # write data
+def write_into_rom(handle, chrData, firstTile):
+    # overwrite part of the CHR ROM of an iNES ROM file;
+    # return: file offset of the first tile written
+
+    fileInfo = qneslib.ines_header_decode(handle)
+    if fileInfo is None:
+        sys.exit("Output file is not a valid iNES ROM file.")
+    if fileInfo["chrSize"] == 0:
+        sys.exit("Output file has no CHR ROM.")
+    if firstTile * BYTES_PER_TILE + len(chrData) > fileInfo["chrSize"]:
+        sys.exit(
+            f"CHR data ({len(chrData)//BYTES_PER_TILE} tiles starting from "
+            f"tile {firstTile}) doesn't fit in CHR ROM "
+            f"({fileInfo['chrSize']//BYTES_PER_TILE} tiles)."
+        )
+
+    offset = fileInfo["chrStart"] + firstTile * BYTES_PER_TILE
+    handle.seek(offset)
+    handle.write(chrData)
+    return offset
+
+def write_chr_data(chrData, args):
+    # write CHR data into a new file or into an iNES ROM file;
+    # return: file offset of the first tile written
     try:
-        with open(outputFile, "wb") as handle:
+        if args.rom:
+            with open(args.output_file, "r+b") as handle:
+                return write_into_rom(handle, chrData, args.first_tile)
+        with open(args.output_file, "wb") as handle:
             handle.seek(0)
             handle.write(chrData)
+        return 0
     except OSError:
         sys.exit("Error writing output file.")
 
+def get_tile_pixels(pixels, tile, tilesPerRow=TILES_PER_ROW):
+    # get the color indexes of one tile (TILE_HEIGHT rows of TILE_WIDTH bytes)
+    rowWidth = tilesPerRow * TILE_WIDTH
+    start = (tile // tilesPerRow) * rowWidth * TILE_HEIGHT \
+    + (tile % tilesPerRow) * TILE_WIDTH
+    return b"".join(
+        pixels[start+y*rowWidth:start+y*rowWidth+TILE_WIDTH]
+        for y in range(TILE_HEIGHT)
+    )
+
+def get_changed_tiles(oldPixels, newPixels):
+    # generate: indexes of tiles that differ between two images of the same
+    # size; a whole row of tiles is compared at once first, so an unchanged
+    # row costs one comparison
+    tileRowSize = TILES_PER_ROW * TILE_WIDTH * TILE_HEIGHT
+    for tileY in range(len(newPixels) // tileRowSize):
+        start = tileY * tileRowSize
+        if oldPixels[start:start+tileRowSize] \
+        != newPixels[start:start+tileRowSize]:
+            for tileX in range(TILES_PER_ROW):
+                tile = tileY * TILES_PER_ROW + tileX
+                if get_tile_pixels(oldPixels, tile) \
+                != get_tile_pixels(newPixels, tile):
+                    yield tile
+
+def update_chr_data(oldPixels, chrOffset, args):
+    # re-read the input file and rewrite the tiles that changed;
+    # return: (new_color_indexes, file_offset_of_first_tile)
+
+    pixels = read_image(args.input_file, args.palette)[1]
+    if len(pixels) != len(oldPixels):
+        print("Image size changed; rewriting all tiles.")
+        chrData = qneslib.chr_encode(pixels, TILES_PER_ROW)
+        return (pixels, write_chr_data(chrData, args))
+
+    tiles = list(get_changed_tiles(oldPixels, pixels))
+    if tiles:
+        # encode only the changed tiles (as an image one tile wide)
+        chrData = qneslib.chr_encode(
+            b"".join(get_tile_pixels(pixels, t) for t in tiles), 1
+        )
+        try:
+            with open(args.output_file, "r+b") as handle:
+                for (i, tile) in enumerate(tiles):
+                    handle.seek(chrOffset + tile * BYTES_PER_TILE)
+                    handle.write(
+                        chrData[i*BYTES_PER_TILE:(i+1)*BYTES_PER_TILE]
+                    )
+        except OSError:
+            sys.exit("Error writing output file.")
+    print(f"{len(tiles)} tile(s) updated.")
+    return (pixels, chrOffset)
+
+def get_file_state(path):
+    # return: (modification_time, size) or None if the file is missing (e.g.
+    # while an editor is replacing it)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def watch(pixels, chrOffset, args):
+    # update the output whenever the input file has changed and then stayed
+    # unchanged for DEBOUNCE_TIME (editors may save in several steps)
+
+    print(f"Watching {args.input_file} (press Ctrl+C to stop).")
+    state = get_file_state(args.input_file)
+    changeTime = None  # when the file last changed (None = handled)
+
+    try:
+        while True:
+            time.sleep(POLL_INTERVAL)
+            newState = get_file_state(args.input_file)
+            if newState != state:
+                state = newState
+                changeTime = time.monotonic()
+            elif changeTime is not None and state is not None \
+            and time.monotonic() - changeTime >= DEBOUNCE_TIME:
+                changeTime = None
+                try:
+                    (pixels, chrOffset) = update_chr_data(
+                        pixels, chrOffset, args
+                    )
+                except SystemExit as error:
+                    # e.g. an invalid image; keep the output and keep watching
+                    print(error, file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+
+def get_flipped_tiles(tilePixels):
+    # generate: (flip_flags, color_indexes) for each flipped version of a tile
+    rows = [
+        tilePixels[y*TILE_WIDTH:(y+1)*TILE_WIDTH] for y in range(TILE_HEIGHT)
+    ]
+    yield (HORIZONTAL_FLIP, b"".join(r[::-1] for r in rows))
+    yield (VERTICAL_FLIP, b"".join(rows[::-1]))
+    yield (HORIZONTAL_FLIP | VERTICAL_FLIP, b"".join(rows)[::-1])
+
+def deduplicate_tiles(pixels, tilesPerRow, flips):
+    # find the unique tiles of an image in one pass; flips: also match
+    # flipped versions of tiles;
+    # return: (unique_tiles, tile_index_of_each_cell, flip_flags_of_each_cell)
+
+    tiles = []
+    # color indexes of each unique tile (and of its flipped versions)
+    # -> (tile_index, flip_flags)
+    tileIndex = {}
+    tileIndexes = bytearray()
+    flipFlags = bytearray()
+
+    for cell in range(len(pixels) // (TILE_WIDTH * TILE_HEIGHT)):
+        tilePixels = get_tile_pixels(pixels, cell, tilesPerRow)
+        match = tileIndex.get(tilePixels)
+        if match is None:
+            if len(tiles) == MAX_UNIQUE_TILES:
+                sys.exit(
+                    f"More than {MAX_UNIQUE_TILES} unique tiles in image."
+                )
+            match = (len(tiles), 0x00)
+            tiles.append(tilePixels)
+            tileIndex[tilePixels] = match
+            if flips:
+                # if a flipped version equals an earlier tile, keep that one
+                for (flags, flipped) in get_flipped_tiles(tilePixels):
+                    tileIndex.setdefault(flipped, (match[0], flags))
+        tileIndexes.append(match[0])
+        flipFlags.append(match[1])
+
+    return (tiles, tileIndexes, flipFlags)
+
+def write_file(path, data, description):
+    try:
+        with open(path, "wb") as handle:
+            handle.seek(0)
+            handle.write(data)
+    except OSError:
+        sys.exit(f"Error writing {description} file.")
+
+def main():
+    args = parse_arguments()
+
+    if args.name_table is None:
+        pixels = read_image(args.input_file, args.palette)[1]
+        chrData = qneslib.chr_encode(pixels, TILES_PER_ROW)
+        chrOffset = write_chr_data(chrData, args)
+        if args.watch:
+            watch(pixels, chrOffset, args)
+        return
+
+    (width, pixels) = read_image(args.input_file, args.palette, True)
+    (tiles, tileIndexes, flipFlags) = deduplicate_tiles(
+        pixels, width // TILE_WIDTH, args.flip_flags is not None
+    )
+    # encode the unique tiles as an image one tile wide
+    write_chr_data(qneslib.chr_encode(b"".join(tiles), 1), args)
+    write_file(args.name_table, tileIndexes, "name table")
+    if args.flip_flags is not None:
+        write_file(args.flip_flags, flipFlags, "flip flags")
+    print(f"{len(tileIndexes)} cell(s), {len(tiles)} unique tile(s).")
+
 main()
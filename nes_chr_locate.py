@@ -0,0 +1,166 @@
+import argparse, itertools, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+try:
+    from PIL import Image
+except ImportError:
+    sys.exit("Pillow module required. See https://python-pillow.org")
+
+TILES_PER_ROW = 16  # output image width in tiles
+TILE_WIDTH    = 8   # in pixels
+TILE_HEIGHT   = 8   # in pixels
+
+BYTES_PER_TILE = TILE_WIDTH * TILE_HEIGHT * 2 // 8  # 2 bits/pixel
+
+# output palette
+PALETTE = (
+    (0x00, 0x00, 0x00), (0x55, 0x55, 0x55), (0xaa, 0xaa, 0xaa),
+    (0xff, 0xff, 0xff),
+)
+
+# heuristics; a tile that meets at least MIN_SCORE of these looks like
+# graphics (in code and data tables, at most one is usually met)
+MAX_DISTINCT_BYTES = 10  # at most this many distinct bytes
+MIN_REPEATED_ROWS  = 3   # at least this many rows same as the row above
+MIN_SAME_BITS      = 44  # the bitplanes have at least this many bits in
+MAX_SAME_BITS      = 20  # common or at most this many (inverted planes)
+MIN_SCORE          = 2
+
+# a run of tiles may have this many consecutive tiles that don't look like
+# graphics
+MAX_GAP = 4
+
+# tile classes
+OTHER    = 0
+BLANK    = 1  # only one distinct byte (e.g. unused space or an empty tile)
+GRAPHICS = 2
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Find uncompressed tile graphics in the PRG ROM of an "
+        "iNES ROM file (.nes), e.g. of a game with CHR RAM. Every 16-byte "
+        "(tile-aligned) part of PRG ROM is scored by how much it looks like "
+        "a tile, and runs of such tiles are printed and optionally saved as "
+        "PNG images."
+    )
+    parser.add_argument(
+        "-m", "--min-tiles", type=int, default=16,
+        help="Minimum number of tiles that look like graphics in a run (1 or "
+        "greater, default=16)."
+    )
+    parser.add_argument(
+        "-d", "--directory",
+        help="Save each run as a PNG image in this existing directory "
+        "(e.g. prg-01230.png for a run at PRG ROM address 0x01230; "
+        f"{TILES_PER_ROW} tiles per row)."
+    )
+    parser.add_argument("input_file", help="iNES ROM file (.nes) to read.")
+    args = parser.parse_args()
+
+    if args.min_tiles < 1:
+        sys.exit("--min-tiles must be 1 or greater.")
+    if not os.path.isfile(args.input_file):
+        sys.exit("Input file not found.")
+    if args.directory is not None and not os.path.isdir(args.directory):
+        sys.exit("Output directory not found.")
+
+    return args
+
+def classify_tile(tile):
+    # tile: 16 bytes; return: OTHER/BLANK/GRAPHICS
+
+    distinct = len(set(tile))
+    if distinct == 1:
+        return BLANK
+
+    loPlane = int.from_bytes(tile[:8], "big")
+    hiPlane = int.from_bytes(tile[8:], "big")
+    # rows same as the row above: zero bytes in (plane XOR plane shifted by a
+    # row), excluding the topmost row
+    repeatedRows = (loPlane ^ (loPlane >> 8)).to_bytes(8, "big")[1:].count(0) \
+    + (hiPlane ^ (hiPlane >> 8)).to_bytes(8, "big")[1:].count(0)
+    sameBits = 64 - (loPlane ^ hiPlane).bit_count()
+
+    score = (distinct <= MAX_DISTINCT_BYTES) \
+    + (repeatedRows >= MIN_REPEATED_ROWS) \
+    + (sameBits >= MIN_SAME_BITS or sameBits <= MAX_SAME_BITS)
+    return GRAPHICS if score >= MIN_SCORE else OTHER
+
+def find_runs(classes, minTiles):
+    # generate: (first_tile, end_tile, graphics_tile_count) for each run of
+    # tiles that look like graphics; gaps of up to MAX_GAP tiles and any
+    # number of blank tiles are allowed inside a run, not at its ends
+
+    start = None  # first tile of current run
+    for (tile, class_) in enumerate(classes + [OTHER] * (MAX_GAP + 1)):
+        if class_ == GRAPHICS:
+            if start is None:
+                (start, count) = (tile, 0)
+            (lastGraphics, count) = (tile, count + 1)
+        elif class_ == OTHER and start is not None \
+        and tile - lastGraphics > MAX_GAP:
+            if count >= minTiles:
+                yield (start, lastGraphics + 1, count)
+            start = None
+
+def save_image(chrData, path):
+    # decode CHR data like nes_chr_decode.py and save it as a PNG image
+
+    # pad to whole rows of tiles
+    rowSize = TILES_PER_ROW * BYTES_PER_TILE
+    chrData += bytes(-len(chrData) % rowSize)
+
+    image = Image.frombytes(
+        "P",
+        (TILES_PER_ROW * TILE_WIDTH, len(chrData) // rowSize * TILE_HEIGHT),
+        qneslib.chr_decode(chrData, TILES_PER_ROW)
+    )
+    image.putpalette(itertools.chain.from_iterable(PALETTE))
+    try:
+        with open(path, "wb") as handle:
+            handle.seek(0)
+            image.save(handle, "png")
+    except OSError:
+        sys.exit(f"Error writing {path}")
+
+def main():
+    args = parse_arguments()
+
+    try:
+        with open(args.input_file, "rb") as handle:
+            fileInfo = qneslib.ines_header_decode(handle)
+            if fileInfo is None:
+                sys.exit("Invalid iNES ROM file.")
+            handle.seek(fileInfo["prgStart"])
+            prgData = handle.read(fileInfo["prgSize"])
+    except OSError:
+        sys.exit("Error reading input file.")
+
+    if fileInfo["chrSize"]:
+        print(
+            "Warning: the game has CHR ROM; there may be no graphics in PRG "
+            "ROM.", file=sys.stderr
+        )
+
+    classes = [
+        classify_tile(prgData[pos:pos+BYTES_PER_TILE])
+        for pos in range(0, len(prgData), BYTES_PER_TILE)
+    ]
+
+    runCount = 0
+    for (start, end, count) in find_runs(classes, args.min_tiles):
+        (startAddr, endAddr) = (start * BYTES_PER_TILE, end * BYTES_PER_TILE)
+        print(
+            f"PRG 0x{startAddr:05x}-0x{endAddr-1:05x}: {end-start} tiles, "
+            f"{count*100//(end-start)}% look like graphics"
+        )
+        if args.directory is not None:
+            save_image(
+                prgData[startAddr:endAddr],
+                os.path.join(args.directory, f"prg-{startAddr:05x}.png")
+            )
+        runCount += 1
+    print(f"{runCount} run(s) of tiles found.")
+
+main()
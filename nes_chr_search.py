@@ -0,0 +1,159 @@
+import argparse, itertools, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+try:
+    from PIL import Image
+except ImportError:
+    sys.exit("Pillow module required. See https://python-pillow.org")
+
+TILE_WIDTH  = 8   # in pixels
+TILE_HEIGHT = 8   # in pixels
+BYTES_PER_TILE = TILE_WIDTH * TILE_HEIGHT * 2 // 8  # 2 bits/pixel
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Find where some tiles are stored in an iNES ROM file "
+        "(.nes): in CHR ROM or, e.g. for games with CHR RAM, in PRG ROM. "
+        "Matches at any byte offset (not only at tile boundaries) are found, "
+        "with the colors in any order."
+    )
+    parser.add_argument(
+        "-c", "--chr", action="store_true",
+        help="query_file is NES CHR data instead of an image."
+    )
+    parser.add_argument(
+        "-m", "--max-matches", type=int, default=100,
+        help="Maximum number of matches to print (1 or greater, "
+        "default=100)."
+    )
+    parser.add_argument("input_file", help="iNES ROM file (.nes) to search.")
+    parser.add_argument(
+        "query_file",
+        help="Image file with the tiles to look for (e.g. PNG): width and "
+        f"height multiples of {TILE_WIDTH} pixels, no more than 4 unique "
+        "colors, tiles are read row by row. (With --chr: NES CHR data file.)"
+    )
+    args = parser.parse_args()
+
+    if args.max_matches < 1:
+        sys.exit("--max-matches must be 1 or greater.")
+    if not os.path.isfile(args.input_file):
+        sys.exit("Input file not found.")
+    if not os.path.isfile(args.query_file):
+        sys.exit("Query file not found.")
+
+    return args
+
+def read_query_image(handle):
+    # read an image and encode it into CHR data (like nes_chr_encode.py but
+    # with any colors, as they will be permuted anyway)
+
+    image = Image.open(handle)
+    if image.width == 0 or image.width % TILE_WIDTH:
+        sys.exit(f"Query image width must be a multiple of {TILE_WIDTH}.")
+    if image.height == 0 or image.height % TILE_HEIGHT:
+        sys.exit(f"Query image height must be a multiple of {TILE_HEIGHT}.")
+    if image.getcolors(4) is None:
+        sys.exit("Too many colors in query image.")
+    if image.mode != "P":
+        image = image.convert("RGB").convert(
+            "P", dither=Image.Dither.NONE, palette=Image.Palette.ADAPTIVE
+        )
+
+    # renumber the used colors as 0-3
+    pixels = image.tobytes()
+    colorConvTable = bytearray(256)
+    for (newColor, oldColor) in enumerate(sorted(set(pixels))):
+        colorConvTable[oldColor] = newColor
+    return qneslib.chr_encode(
+        pixels.translate(colorConvTable), image.width // TILE_WIDTH
+    )
+
+def read_query(args):
+    # return: query as CHR data
+    try:
+        with open(args.query_file, "rb") as handle:
+            handle.seek(0)
+            if not args.chr:
+                return read_query_image(handle)
+            query = handle.read()
+    except OSError:
+        sys.exit("Error reading query file.")
+    if len(query) == 0 or len(query) % BYTES_PER_TILE:
+        sys.exit(
+            f"Query file size must be a multiple of {BYTES_PER_TILE} bytes."
+        )
+    return query
+
+def get_color_variants(query):
+    # the query with each of the 24 orders of colors, without duplicates
+    # (e.g. a tile with two colors has only 12 variants);
+    # return: {chr_data: colors, ...}; colors: the color in the ROM for each
+    # color in the query
+    pixels = qneslib.chr_decode(query, 1)
+    variants = {}
+    for colors in itertools.permutations(range(4)):
+        variant = bytes(qneslib.chr_encode(pixels.translate(
+            bytes(colors) + bytes(256 - 4)
+        ), 1))
+        variants.setdefault(variant, colors)
+    return variants
+
+def find_all(data, substring):
+    # generate: each position of a substring (including overlapping ones)
+    pos = data.find(substring)
+    while pos != -1:
+        yield pos
+        pos = data.find(substring, pos + 1)
+
+def main():
+    args = parse_arguments()
+    query = read_query(args)
+
+    try:
+        with open(args.input_file, "rb") as handle:
+            fileInfo = qneslib.ines_header_decode(handle)
+            if fileInfo is None:
+                sys.exit("Invalid iNES ROM file.")
+            handle.seek(0)
+            romData = handle.read()
+    except OSError:
+        sys.exit("Error reading input file.")
+
+    variants = get_color_variants(query)
+
+    # find the matches (one C-speed search per variant and area; matches
+    # that span PRG and CHR ROM aren't searched)
+    matches = []  # [(file_offset, area, offset_in_area, colors), ...]
+    for (area, start, size) in (
+        ("PRG", fileInfo["prgStart"], fileInfo["prgSize"]),
+        ("CHR", fileInfo["chrStart"], fileInfo["chrSize"]),
+    ):
+        areaData = romData[start:start+size]
+        for (variant, colors) in variants.items():
+            for pos in itertools.islice(
+                find_all(areaData, variant), args.max_matches + 1
+            ):
+                matches.append((start + pos, area, pos, colors))
+    matches.sort()
+
+    print(
+        f"Searched for {len(query)//BYTES_PER_TILE} tile(s) with "
+        f"{len(variants)} color order(s)."
+    )
+    for (fileOffset, area, pos, colors) in matches[:args.max_matches]:
+        if pos % BYTES_PER_TILE == 0:
+            where = f"tile 0x{pos//BYTES_PER_TILE:x}"
+        else:
+            where = "not tile-aligned"
+        print(
+            f"{area} 0x{pos:06x} (file 0x{fileOffset:06x}, {where}): colors "
+            + " ".join(str(c) for c in colors)
+        )
+    if len(matches) > args.max_matches:
+        print(f"More than {args.max_matches} matches; the rest not printed.")
+    elif not matches:
+        print("No matches.")
+
+main()
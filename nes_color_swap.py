@@ -1,4 +1,8 @@
-import argparse, os, struct, sys
+import argparse, itertools, os, struct, sys
+
+DEFAULT_COLORS = (0, 2, 3, 1)
+# with --in-place, original bytes are saved to a file with this suffix
+JOURNAL_SUFFIX = ".journal"
 
 def parse_arguments():
     # parse command line arguments using argparse
@@ -9,35 +13,74 @@ def parse_arguments():
     )
     parser.add_argument(
         "-c", "--colors", nargs=4, type=int, choices=range(4),
-        default=(0, 2, 3, 1),
         help="Change original colors 0...3 to these colors. Four colors "
-        "(each 0...3) separated by spaces. Default: 0 2 3 1"
+        "(each 0...3) separated by spaces. Default: "
+        + " ".join(str(c) for c in DEFAULT_COLORS)
     )
     parser.add_argument(
-        "-f", "--first-tile", type=int, default=0,
+        "-f", "--first-tile", type=int,
         help="First tile to change (0 or greater, default=0)."
     )
     parser.add_argument(
-        "-n", "--tile-count", type=int, default=0,
+        "-n", "--tile-count", type=int,
         help="Number of tiles to change. 0 (default) = all starting from "
         "--first-tile."
     )
+    parser.add_argument(
+        "-r", "--rules", metavar="FILE",
+        help="Read rules from this text file instead of using --colors, "
+        "--first-tile and --tile-count. One rule per line: first tile, tile "
+        "count and four colors like the arguments, separated by spaces (e.g. "
+        "'0 256 0 2 3 1'). Empty lines and lines starting with '#' are "
+        "ignored. If rules overlap, the later one wins. All rules are applied "
+        "in one pass."
+    )
+    parser.add_argument(
+        "-i", "--in-place", action="store_true",
+        help="Modify input_file instead of writing output_file. Only the "
+        "changed tiles are rewritten. Their original bytes are saved to a "
+        f"journal file (input_file + '{JOURNAL_SUFFIX}') first and it is "
+        "deleted when done. If the journal already exists (an earlier run "
+        "was interrupted), the earlier changes are rolled back first."
+    )
     parser.add_argument(
         "input_file", help="iNES ROM file (.nes) to read."
     )
     parser.add_argument(
-        "output_file", help="iNES ROM file (.nes) to write."
+        "output_file", nargs="?",
+        help="iNES ROM file (.nes) to write (not with --in-place)."
     )
     args = parser.parse_args()
 
-    if args.first_tile < 0:
-        sys.exit("--first-tile must be 0 or greater.")
-    if args.tile_count < 0:
-        sys.exit("--tile-count must be 0 or greater.")
+    if args.rules is not None:
+        if (args.colors, args.first_tile, args.tile_count) \
+        != (None, None, None):
+            sys.exit(
+                "--rules can't be used with --colors, --first-tile or "
+                "--tile-count."
+            )
+        if not os.path.isfile(args.rules):
+            sys.exit("Rules file not found.")
+    else:
+        if args.colors is None:
+            args.colors = DEFAULT_COLORS
+        if args.first_tile is None:
+            args.first_tile = 0
+        if args.tile_count is None:
+            args.tile_count = 0
+        if args.first_tile < 0:
+            sys.exit("--first-tile must be 0 or greater.")
+        if args.tile_count < 0:
+            sys.exit("--tile-count must be 0 or greater.")
 
     if not os.path.isfile(args.input_file):
         sys.exit("Input file not found.")
-    if os.path.exists(args.output_file):
+    if args.in_place:
+        if args.output_file is not None:
+            sys.exit("--in-place and output_file can't be used together.")
+    elif args.output_file is None:
+        sys.exit("output_file is required without --in-place.")
+    elif os.path.exists(args.output_file):
         sys.exit("Output file already exists.")
 
     return args
@@ -75,6 +118,49 @@ def ines_header_decode(handle):
     chrStart = 16 + trainerSize + prgSize
     return (chrStart, chrSize)
 
+def read_rules_file(path):
+    # read color swap rules from a text file;
+    # return: list of (line_number, first_tile, tile_count, colors)
+
+    rules = []
+    try:
+        with open(path, "rt", encoding="ascii") as handle:
+            for (lineNum, line) in enumerate(handle, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    rule = tuple(int(n) for n in line.split())
+                    if len(rule) != 6 or min(rule) < 0 or max(rule[2:]) > 3:
+                        raise ValueError
+                except ValueError:
+                    sys.exit(f"Invalid rule on line {lineNum} of rules file.")
+                rules.append((lineNum, rule[0], rule[1], rule[2:]))
+    except OSError:
+        sys.exit("Error reading the rules file.")
+    except UnicodeDecodeError:
+        sys.exit("Rules file is not ASCII.")
+    return rules
+
+def get_chr_segments(rules, tileCount):
+    # split CHR ROM into ranges of tiles that have the same colors changed in
+    # the same way; later rules override earlier ones;
+    # rules: list of (first_tile, end_tile, colors);
+    # generate: (first_tile, end_tile, colors or None)
+
+    # colors for each tile (None = not changed)
+    tileColors = tileCount * [None]
+    for (firstTile, endTile, colors) in rules:
+        if colors == (0, 1, 2, 3):
+            colors = None
+        tileColors[firstTile:endTile] = (endTile - firstTile) * [colors]
+
+    firstTile = 0
+    for (colors, tiles) in itertools.groupby(tileColors):
+        endTile = firstTile + len(list(tiles))
+        yield (firstTile, endTile, colors)
+        firstTile = endTile
+
 def read_file_slice(handle, bytesLeft):
     # generate bytesLeft bytes from file
     while bytesLeft:
@@ -82,49 +168,177 @@ def read_file_slice(handle, bytesLeft):
         yield handle.read(chunkSize)
         bytesLeft -= chunkSize
 
-def tile_slice_decode(loByte, hiByte):
-    # decode 8*1 pixels of one tile of CHR data;
-    # loByte, hiByte: low/high bitplane (both 8-bit ints);
-    # return: eight 2-bit ints
-    pixels = []
-    for i in range(8):
-        pixels.append((loByte & 1) | ((hiByte & 1) << 1))
-        loByte >>= 1
-        hiByte >>= 1
-    return pixels[::-1]
-
-def tile_slice_encode(pixels):
-    # encode 8*1 pixels of one tile of CHR data;
-    # pixels: eight 2-bit ints
-    # return: (low_bitplane, high_bitplane); both 8-bit ints
-    loByte = hiByte = 0
-    for pixel in pixels:
-        loByte = (loByte << 1) | (pixel &  1)
-        hiByte = (hiByte << 1) | (pixel >> 1)
-    return (loByte, hiByte)
-
 def swap_colors(chunk, colors):
-    # replace colors 0-3 in CHR data chunk (16n bytes) with new colors (4 ints)
-
-    chunk = bytearray(chunk)
-
-    for charPos in range(0, len(chunk), 16):
-        for pixelY in range(8):
-            # process 8*1 pixels of one tile
-            # position of low/high bitplane (byte)
-            loPos = charPos + pixelY
-            hiPos = charPos + 8 + pixelY
-            # decode pixels, replace colors, reencode pixels
-            (chunk[loPos], chunk[hiPos]) = tile_slice_encode(
-                colors[color] for color
-                in tile_slice_decode(chunk[loPos], chunk[hiPos])
+    # replace colors 0-3 in CHR data chunk (16n bytes) with new colors (4
+    # ints); all pixels at once: treat the chunk as a big integer, line up the
+    # high bitplanes with the low ones and combine the pixels of each original
+    # color into the new bitplanes
+
+    data = int.from_bytes(chunk, "big")
+    # 1 bits where the low bitplanes are
+    loMask = int.from_bytes(
+        len(chunk) // 16 * (8 * b"\xff" + 8 * b"\x00"), "big"
+    )
+    loPlanes = data & loMask
+    hiPlanes = (data << 64) & loMask
+
+    # pixels of each original color
+    colorMasks = (
+        loMask & ~(loPlanes | hiPlanes),
+        loPlanes & ~hiPlanes,
+        hiPlanes & ~loPlanes,
+        loPlanes & hiPlanes,
+    )
+
+    newLoPlanes = newHiPlanes = 0
+    for (origColor, colorMask) in enumerate(colorMasks):
+        if colors[origColor] & 1:
+            newLoPlanes |= colorMask
+        if colors[origColor] & 2:
+            newHiPlanes |= colorMask
+
+    return (newLoPlanes | (newHiPlanes >> 64)).to_bytes(len(chunk), "big")
+
+def kernel_copy(source, target, offset, length):
+    # copy bytes from source file to the same position in target file
+    # without reading them into Python, if the OS supports it;
+    # return: number of bytes copied (0 = not supported)
+
+    target.flush()  # the kernel must not overtake buffered writes
+    if hasattr(os, "copy_file_range"):
+        try:
+            return os.copy_file_range(
+                source.fileno(), target.fileno(), length, offset, offset
+            )
+        except OSError:
+            pass  # e.g. not supported between these file systems
+    if hasattr(os, "sendfile"):
+        try:
+            target.seek(offset)
+            return os.sendfile(
+                target.fileno(), source.fileno(), offset, length
             )
+        except OSError:
+            pass
+    return 0
+
+def copy_range(source, target, offset, length):
+    # copy bytes from source file to the same position in target file
+
+    end = offset + length
+    while offset < end:
+        copied = kernel_copy(source, target, offset, end - offset)
+        if not copied:
+            break
+        offset += copied
+
+    # fall back to reading and writing
+    source.seek(offset)
+    target.seek(offset)
+    for chunk in read_file_slice(source, end - offset):
+        target.write(chunk)
+
+def roll_back(handle, journalPath):
+    # restore original bytes from the journal of an interrupted --in-place
+    # run and delete the journal; incomplete records (the journal itself was
+    # interrupted, so nothing was changed yet) are ignored
+
+    with open(journalPath, "rb") as journal:
+        while True:
+            header = journal.read(16)
+            if len(header) < 16:
+                break
+            (offset, length) = struct.unpack("<2Q", header)
+            data = journal.read(length)
+            if len(data) < length:
+                break
+            handle.seek(offset)
+            handle.write(data)
+    handle.flush()
+    os.fsync(handle.fileno())
+    os.remove(journalPath)
+
+def swap_colors_in_place(handle, journalPath, chrStart, segments):
+    # change colors of some tiles in an iNES ROM file, rewriting only them
+
+    # (offset, length, colors) for each range of changed tiles
+    changes = [
+        (chrStart + firstTile * 16, (endTile - firstTile) * 16, colors)
+        for (firstTile, endTile, colors) in segments if colors is not None
+    ]
 
-    return chunk
+    # save original bytes
+    with open(journalPath, "wb") as journal:
+        for (offset, length, colors) in changes:
+            journal.write(struct.pack("<2Q", offset, length))
+            handle.seek(offset)
+            for chunk in read_file_slice(handle, length):
+                journal.write(chunk)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+    # rewrite changed tiles only
+    for (offset, length, colors) in changes:
+        for chunkStart in range(offset, offset + length, 2 ** 20):
+            chunkLen = min(offset + length - chunkStart, 2 ** 20)
+            handle.seek(chunkStart)
+            chunk = swap_colors(handle.read(chunkLen), colors)
+            handle.seek(chunkStart)
+            handle.write(chunk)
+    handle.flush()
+    os.fsync(handle.fileno())
+
+    os.remove(journalPath)
+
+def get_rules(args, tileCount):
+    # get rules from command line arguments or rules file;
+    # return: list of (first_tile, end_tile, colors)
+
+    if args.rules is None:
+        if args.first_tile >= tileCount:
+            sys.exit("--first-tile is too large.")
+        if args.tile_count:
+            endTile = args.first_tile + args.tile_count
+            if endTile > tileCount:
+                sys.exit("Sum of --first-tile and --tile-count is too large.")
+        else:
+            endTile = tileCount
+        return [(args.first_tile, endTile, tuple(args.colors))]
+
+    rules = []
+    for (lineNum, firstTile, ruleTileCount, colors) in read_rules_file(
+        args.rules
+    ):
+        endTile = firstTile + ruleTileCount if ruleTileCount else tileCount
+        if firstTile >= tileCount or endTile > tileCount:
+            sys.exit(f"Rule on line {lineNum} exceeds CHR ROM.")
+        rules.append((firstTile, endTile, colors))
+    return rules
 
 def main():
     args = parse_arguments()
 
+    if args.in_place:
+        try:
+            with open(args.input_file, "r+b") as handle:
+                journalPath = args.input_file + JOURNAL_SUFFIX
+                if os.path.exists(journalPath):
+                    roll_back(handle, journalPath)
+                    print(
+                        "Warning: rolled back the changes of an interrupted "
+                        "run.", file=sys.stderr
+                    )
+                (chrStart, chrSize) = ines_header_decode(handle)
+                if chrSize == 0:
+                    sys.exit("Input file has no CHR ROM.")
+                segments = get_chr_segments(
+                    get_rules(args, chrSize // 16), chrSize // 16
+                )
+                swap_colors_in_place(handle, journalPath, chrStart, segments)
+        except OSError:
+            sys.exit("Error reading/writing files.")
+        return
+
     try:
         with open(args.input_file, "rb") as source:
             # get file info
@@ -132,36 +346,24 @@ def main():
             if chrSize == 0:
                 sys.exit("Input file has no CHR ROM.")
 
-            # length of CHR data before the tiles to modify
-            beforeLen = args.first_tile * 16
-            if beforeLen >= chrSize:
-                sys.exit("--first-tile is too large.")
-
-            # length of CHR data at/after the tiles to modify
-            if args.tile_count:
-                modifyLen = args.tile_count * 16
-                afterLen = chrSize - beforeLen - modifyLen
-                if afterLen < 0:
-                    sys.exit(
-                        "Sum of --first-tile and --tile-count is too large."
-                    )
-            else:
-                afterLen = 0
-                modifyLen = chrSize - beforeLen - afterLen
+            segments = get_chr_segments(
+                get_rules(args, chrSize // 16), chrSize // 16
+            )
 
-            # copy input file to output file
-            source.seek(0)
+            # copy input file to output file in one pass; copy unchanged
+            # data without reading it into Python if possible
             with open(args.output_file, "wb") as target:
-                target.seek(0)
-                # copy data before/at/after the tiles to be modified
-                for chunk in read_file_slice(
-                    source, chrStart + beforeLen
-                ):
-                    target.write(chunk)
-                for chunk in read_file_slice(source, modifyLen):
-                    target.write(swap_colors(chunk, args.colors))
-                for chunk in read_file_slice(source, afterLen):
-                    target.write(chunk)
+                copy_range(source, target, 0, chrStart)
+                for (firstTile, endTile, colors) in segments:
+                    offset = chrStart + firstTile * 16
+                    length = (endTile - firstTile) * 16
+                    if colors is None:
+                        copy_range(source, target, offset, length)
+                    else:
+                        source.seek(offset)
+                        target.seek(offset)
+                        for chunk in read_file_slice(source, length):
+                            target.write(swap_colors(chunk, colors))
     except OSError:
         sys.exit("Error reading/writing files.")
 
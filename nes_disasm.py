@@ -0,0 +1,184 @@
+import argparse, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Disassemble the PRG ROM of an iNES ROM file (.nes). Each "
+        "PRG ROM bank is disassembled separately at the CPU address it is "
+        "mapped to. Undocumented opcodes are printed as data ('hex')."
+    )
+    parser.add_argument(
+        "-b", "--bank", type=int,
+        help="Only disassemble this PRG ROM bank (0 or greater). Bank size is "
+        "the smallest one the mapper supports. Default: all banks."
+    )
+    parser.add_argument(
+        "-o", "--origin", metavar="ADDRESS",
+        help="With --bank: CPU address of the bank in hexadecimal (8000-e000, "
+        "a multiple of the bank size). Default: the last bank at the end of "
+        "the CPU address space, other banks at the start."
+    )
+    parser.add_argument(
+        "-a", "--around", metavar="ADDRESS",
+        help="Only print instructions around this CPU address (hexadecimal, "
+        "8000-ffff) in each PRG ROM bank that can be mapped there."
+    )
+    parser.add_argument(
+        "-g", "--genie", metavar="CODE",
+        help="Only print instructions around the address of this Game Genie "
+        "code in each PRG ROM bank it affects, both before and after the "
+        "code has been applied."
+    )
+    parser.add_argument(
+        "-n", "--lines", type=int, default=8,
+        help="With --around/--genie: how many instructions to print before "
+        "and after the address. 0 or greater, default=8."
+    )
+    parser.add_argument("input_file", help="iNES ROM file (.nes) to read.")
+    args = parser.parse_args()
+
+    if args.bank is not None and args.bank < 0:
+        sys.exit("--bank must be 0 or greater.")
+    if args.origin is not None:
+        if args.bank is None:
+            sys.exit("--origin requires --bank.")
+        args.origin = parse_cpu_address(args.origin, "--origin")
+    if args.around is not None:
+        args.around = parse_cpu_address(args.around, "--around")
+    if args.genie is not None \
+    and qneslib.game_genie_decode(args.genie) is None:
+        sys.exit("Invalid Game Genie code.")
+    if args.around is not None and args.genie is not None:
+        sys.exit("--around and --genie can't be used together.")
+    if args.lines < 0:
+        sys.exit("--lines must be 0 or greater.")
+
+    if not os.path.isfile(args.input_file):
+        sys.exit("Input file not found.")
+
+    return args
+
+def parse_cpu_address(addr, argName):
+    # parse a hexadecimal CPU ROM address
+    try:
+        addr = int(addr, 16)
+        if not 0x8000 <= addr <= 0xffff:
+            raise ValueError
+    except ValueError:
+        sys.exit(f"Invalid {argName}.")
+    return addr
+
+def format_lines(instructions, bankData, origin, marked=None):
+    # generate lines of disassembly (marker, CPU address, bytes,
+    # instruction); instructions: a slice of the result of
+    # qneslib.disassemble(bankData, origin); marked: CPU address of
+    # instruction to mark
+    hexData = bankData.hex(" ") + " "  # 3 characters per byte
+    for instruction in instructions:
+        addr = instruction[0]
+        pos = addr - origin
+        length = len(qneslib.instruction_to_bytes(instruction))
+        yield "%s %04x  %-8s  %s" % (
+            ">" if addr == marked else " ", addr,
+            hexData[pos*3:(pos+length)*3-1],
+            qneslib.format_instruction(instruction)
+        )
+
+def print_around(bankData, origin, cpuAddr, lines):
+    # print instructions around a CPU address; mark the one that contains it
+    instructions = qneslib.disassemble(bankData, origin)
+    for (i, instruction) in enumerate(instructions):
+        if i + 1 == len(instructions) or instructions[i+1][0] > cpuAddr:
+            break
+    print("\n".join(format_lines(
+        instructions[max(i-lines, 0):i+lines+1], bankData, origin,
+        instruction[0]
+    )))
+
+def print_bank_header(bank, prgBankSize, origin):
+    print(
+        f"; PRG ROM bank {bank} (PRG address 0x{bank*prgBankSize:x}) at CPU "
+        f"address ${origin:04x}"
+    )
+
+def main():
+    args = parse_arguments()
+
+    try:
+        with open(args.input_file, "rb") as handle:
+            fileInfo = qneslib.ines_header_decode(handle)
+            if fileInfo is None:
+                sys.exit("Invalid iNES ROM file.")
+            handle.seek(fileInfo["prgStart"])
+            prgData = handle.read(fileInfo["prgSize"])
+    except OSError:
+        sys.exit("Error reading the file.")
+
+    if not qneslib.is_mapper_known(fileInfo["mapper"]):
+        print(
+            f"Warning: unknown mapper {fileInfo['mapper']}; assuming 8-KiB "
+            "PRG ROM banks.", file=sys.stderr
+        )
+
+    prgBankSize = qneslib.min_prg_bank_size(
+        fileInfo["prgSize"], fileInfo["mapper"]
+    )
+    bankCount = fileInfo["prgSize"] // prgBankSize
+
+    if args.bank is None:
+        banks = range(bankCount)
+    elif args.bank < bankCount:
+        banks = (args.bank,)
+    else:
+        sys.exit(f"--bank must be less than {bankCount}.")
+    if args.origin is not None and (
+        args.origin & (prgBankSize - 1)
+        or args.origin + prgBankSize > 0x10000
+    ):
+        sys.exit(f"--origin must be a multiple of 0x{prgBankSize:x}.")
+
+    if args.genie is not None:
+        # like --around but only in banks affected by the code (see
+        # nesgenie_prgaddr.py)
+        (cpuAddr, repl, comp) = qneslib.game_genie_decode(args.genie)
+        origin = cpuAddr & ~(prgBankSize - 1)
+        for prgAddr in qneslib.address_cpu_to_prg(
+            cpuAddr, prgBankSize, fileInfo["prgSize"]
+        ):
+            bank = prgAddr // prgBankSize
+            if bank not in banks or comp is not None \
+            and prgData[prgAddr] != comp or prgData[prgAddr] == repl:
+                continue
+            bankData = prgData[bank*prgBankSize:(bank+1)*prgBankSize]
+            offset = prgAddr - bank * prgBankSize
+            patchedData = bankData[:offset] + bytes((repl,)) \
+            + bankData[offset+1:]
+            print_bank_header(bank, prgBankSize, origin)
+            print("; original:")
+            print_around(bankData, origin, cpuAddr, args.lines)
+            print("; with Game Genie code:")
+            print_around(patchedData, origin, cpuAddr, args.lines)
+        return
+
+    for bank in banks:
+        bankData = prgData[bank*prgBankSize:(bank+1)*prgBankSize]
+        if args.around is not None:
+            origin = args.around & ~(prgBankSize - 1)
+        elif args.origin is not None:
+            origin = args.origin
+        else:
+            origin = qneslib.prg_bank_origin(
+                bank * prgBankSize, prgBankSize, fileInfo["prgSize"]
+            )
+
+        print_bank_header(bank, prgBankSize, origin)
+        if args.around is not None:
+            print_around(bankData, origin, args.around, args.lines)
+        else:
+            print("\n".join(format_lines(
+                qneslib.disassemble(bankData, origin), bankData, origin
+            )))
+
+main()
@@ -0,0 +1,338 @@
+import argparse, concurrent.futures, hashlib, itertools, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+try:
+    from PIL import Image
+except ImportError:
+    sys.exit("Pillow module required. See https://python-pillow.org")
+
+TILE_WIDTH     = 8   # in pixels
+TILE_HEIGHT    = 8   # in pixels
+SCREEN_COLUMNS = 32  # screen width in tiles
+SCREEN_ROWS    = 30  # screen height in tiles
+
+BYTES_PER_TILE = TILE_WIDTH * TILE_HEIGHT * 2 // 8  # 2 bits/pixel
+TILE_COUNT = 256  # tiles in a pattern table
+PATTERN_TABLE_SIZE = TILE_COUNT * BYTES_PER_TILE
+NAME_TABLE_SIZE = SCREEN_COLUMNS * SCREEN_ROWS  # without attribute table
+ATTRIBUTE_TABLE_SIZE = 64
+
+# the default palette: the same four grays for each subpalette
+DEFAULT_PALETTE = "0f0010300f0010300f0010300f001030"
+
+# --batch: file in the output directory that records what each PNG file was
+# rendered from
+STATE_FILE = ".nes_nt_render-state.json"
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Render an NES name table (e.g. a 1-KiB .nam file dumped "
+        "from an emulator) as a "
+        f"{SCREEN_COLUMNS*TILE_WIDTH}*{SCREEN_ROWS*TILE_HEIGHT}-pixel PNG "
+        "image, using the attribute table, a pattern table from CHR data and "
+        "a palette."
+    )
+    parser.add_argument(
+        "-b", "--bank", type=int, default=0,
+        help="Which 4-KiB pattern table of CHR data to use (0 or greater, "
+        "default=0)."
+    )
+    parser.add_argument(
+        "-a", "--attributes", metavar="FILE",
+        help=f"Read the attribute table ({ATTRIBUTE_TABLE_SIZE} bytes) from "
+        "this file instead of from the end of the name table file. Required "
+        f"if the name table file is only {NAME_TABLE_SIZE} bytes."
+    )
+    parser.add_argument(
+        "-p", "--palette", default=DEFAULT_PALETTE,
+        help="The background palette: 16 NES colors as 32 hexadecimal "
+        "digits, or a file with a dump of palette RAM (16 or 32 bytes; the "
+        "first 16 are used). As on the NES, color 0 of subpalettes 1-3 is "
+        f"replaced with color 0 of subpalette 0. Default={DEFAULT_PALETTE}."
+    )
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Render many name tables: input_file is a directory of .nam "
+        "files and output_file is an existing directory to write one PNG "
+        "file per .nam file to. Name tables that haven't changed since they "
+        "were rendered with the same pattern table, palette and attributes "
+        f"are skipped (this is recorded in {STATE_FILE} in the output "
+        "directory)."
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="With --batch: render all name tables, even the unchanged ones."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="With --batch: number of name tables to render in parallel (1 "
+        "or greater, default=the number of CPUs)."
+    )
+    parser.add_argument(
+        "chr_file",
+        help="iNES ROM file (.nes) or raw CHR data file to read the pattern "
+        "table from."
+    )
+    parser.add_argument(
+        "input_file",
+        help=f"Name table file to read: {NAME_TABLE_SIZE} bytes of tile "
+        f"indexes, usually followed by {ATTRIBUTE_TABLE_SIZE} bytes of "
+        "attributes."
+    )
+    parser.add_argument("output_file", help="PNG file to write.")
+    args = parser.parse_args()
+
+    if args.bank < 0:
+        sys.exit("--bank must be 0 or greater.")
+    if args.jobs < 1:
+        sys.exit("--jobs must be 1 or greater.")
+    if not os.path.isfile(args.chr_file):
+        sys.exit("CHR data file not found.")
+    if args.attributes is not None and not os.path.isfile(args.attributes):
+        sys.exit("Attribute table file not found.")
+
+    if args.batch:
+        if not os.path.isdir(args.input_file):
+            sys.exit("Input directory not found.")
+        if not os.path.isdir(args.output_file):
+            sys.exit("Output directory not found.")
+    else:
+        if not os.path.isfile(args.input_file):
+            sys.exit("Input file not found.")
+        if os.path.exists(args.output_file):
+            sys.exit("Output file already exists.")
+
+    return args
+
+def read_file(path, description):
+    try:
+        with open(path, "rb") as handle:
+            handle.seek(0)
+            return handle.read()
+    except OSError:
+        sys.exit(f"Error reading {description}.")
+
+def decode_palette(paletteStr):
+    # return: 16 NES colors
+
+    if os.path.isfile(paletteStr):
+        palette = read_file(paletteStr, "palette file")
+        if len(palette) not in (16, 32):
+            sys.exit("Palette file must be 16 or 32 bytes.")
+        palette = palette[:16]
+    else:
+        try:
+            palette = bytes.fromhex(paletteStr)
+        except ValueError:
+            sys.exit("Invalid palette.")
+        if len(palette) != 16:
+            sys.exit("Invalid palette.")
+    # ignore the unused bits like the PPU does
+    return bytes(c & 0x3f for c in palette)
+
+def read_pattern_table(path, bank):
+    # read one 4-KiB pattern table (only that part of the file)
+    try:
+        with open(path, "rb") as handle:
+            chrInfo = qneslib.chr_info(handle)
+            if chrInfo is None:
+                sys.exit("Unrecognized CHR data file format.")
+            if chrInfo[1] == 0:
+                sys.exit("iNES ROM file has no CHR ROM.")
+            (chrAddr, chrSize) = chrInfo
+            if chrSize < PATTERN_TABLE_SIZE:
+                sys.exit("CHR data is smaller than a pattern table.")
+            if (bank + 1) * PATTERN_TABLE_SIZE > chrSize:
+                sys.exit(
+                    f"--bank must be less than {chrSize//PATTERN_TABLE_SIZE}."
+                )
+            handle.seek(chrAddr + bank * PATTERN_TABLE_SIZE)
+            return handle.read(PATTERN_TABLE_SIZE)
+    except OSError:
+        sys.exit("Error reading CHR data file.")
+
+def get_row_table(patternTable):
+    # decode each tile once with each subpalette;
+    # return: a list with one pixel row of a tile (palette indexes 0-15) per
+    # (subpalette * TILE_COUNT + tile) * TILE_HEIGHT + row_within_tile
+
+    # all tiles in one column (one tile per row of the image)
+    pixels = bytes(qneslib.chr_decode(patternTable, 1))
+    rows = [
+        pixels[pos:pos+TILE_WIDTH] for pos in range(0, len(pixels), TILE_WIDTH)
+    ]
+    tables = [bytes(range(s * 4, s * 4 + 4)) + bytes(252) for s in range(4)]
+    return [r.translate(t) for t in tables for r in rows]
+
+def get_subpalettes(attributeTable):
+    # return: the subpalette (0-3) of each tile on the screen
+    return bytes(
+        (
+            attributeTable[y // 4 * (SCREEN_COLUMNS // 4) + x // 4]
+            >> ((y & 2) << 1 | (x & 2))
+        ) & 3
+        for y in range(SCREEN_ROWS) for x in range(SCREEN_COLUMNS)
+    )
+
+def render(nameTable, attributeTable, rowTable, palette):
+    # return: PIL image
+
+    # the first row of each tile in the row table (one gather for the whole
+    # screen), then each pixel row of the screen is joined from TILE_HEIGHT
+    # slices with a constant offset
+    tileRows = [
+        (s * TILE_COUNT + t) * TILE_HEIGHT
+        for (s, t) in zip(get_subpalettes(attributeTable), nameTable)
+    ]
+    pixels = b"".join(
+        b"".join(rowTable[i + y] for i in tileRows[pos:pos+SCREEN_COLUMNS])
+        for pos in range(0, len(tileRows), SCREEN_COLUMNS)
+        for y in range(TILE_HEIGHT)
+    )
+
+    image = Image.frombytes(
+        "P",
+        (SCREEN_COLUMNS * TILE_WIDTH, SCREEN_ROWS * TILE_HEIGHT),
+        pixels
+    )
+    # color 0 of each subpalette is the backdrop color
+    image.putpalette(itertools.chain.from_iterable(
+        qneslib.PALETTE[palette[0 if i % 4 == 0 else i]] for i in range(16)
+    ))
+    return image
+
+def read_name_table(path, attributes):
+    # return: (name_table, attribute_table)
+    data = read_file(path, "name table file")
+    if attributes is not None and len(data) in (
+        NAME_TABLE_SIZE, NAME_TABLE_SIZE + ATTRIBUTE_TABLE_SIZE
+    ):
+        return (data[:NAME_TABLE_SIZE], attributes)
+    if len(data) != NAME_TABLE_SIZE + ATTRIBUTE_TABLE_SIZE:
+        sys.exit(
+            f"Name table file must be {NAME_TABLE_SIZE+ATTRIBUTE_TABLE_SIZE} "
+            f"bytes (or {NAME_TABLE_SIZE} bytes with --attributes)."
+        )
+    return (data[:NAME_TABLE_SIZE], data[NAME_TABLE_SIZE:])
+
+def save_image(image, path):
+    try:
+        with open(path, "wb") as handle:
+            handle.seek(0)
+            image.save(handle, "png")
+    except OSError:
+        sys.exit("Error writing output file.")
+
+def render_file(inputFile, outputFile, attributes, rowTable, palette):
+    # render one name table in batch mode (run in a worker process);
+    # return: status
+    try:
+        (nameTable, attributeTable) = read_name_table(inputFile, attributes)
+        save_image(
+            render(nameTable, attributeTable, rowTable, palette), outputFile
+        )
+        return "written"
+    except SystemExit as error:
+        return str(error)
+    except OSError:
+        return "error reading or writing"
+
+# the data shared by all name tables in a worker process in batch mode
+workerData = None
+
+def init_worker(*data):
+    global workerData
+    workerData = data
+
+def render_worker_file(inputFile, outputFile):
+    return render_file(inputFile, outputFile, *workerData)
+
+def render_batch(args, patternTable, attributes, rowTable, palette):
+    # render all .nam files in a directory in parallel; the pattern table is
+    # decoded only once and sent to each worker process once
+
+    inputFiles = sorted(
+        f for f in os.listdir(args.input_file)
+        if f.lower().endswith(".nam")
+        and os.path.isfile(os.path.join(args.input_file, f))
+    )
+    outputFiles = [os.path.splitext(f)[0] + ".png" for f in inputFiles]
+    statusCounts = {}
+
+    # a PNG file is up to date if it exists and was rendered from the same
+    # name table file (size and modification time), pattern table, palette
+    # and attributes
+    settings = hashlib.sha256(
+        patternTable + palette + (b"" if attributes is None else attributes)
+    ).hexdigest()
+    statePath = os.path.join(args.output_file, STATE_FILE)
+    state = qneslib.state_read(statePath)
+    signatures = [
+        qneslib.file_signature(os.path.join(args.input_file, f), settings)
+        for f in inputFiles
+    ]
+    toRender = [
+        i for (i, (o, s)) in enumerate(zip(outputFiles, signatures))
+        if args.force or s is None or state.get(o) != s
+        or not os.path.isfile(os.path.join(args.output_file, o))
+    ]
+    statusCounts["up to date"] = len(inputFiles) - len(toRender)
+
+    with concurrent.futures.ProcessPoolExecutor(
+        args.jobs, initializer=init_worker,
+        initargs=(attributes, rowTable, palette)
+    ) as executor:
+        results = executor.map(
+            render_worker_file,
+            (os.path.join(args.input_file, inputFiles[i]) for i in toRender),
+            (os.path.join(args.output_file, outputFiles[i]) for i in toRender),
+            chunksize=max(1, len(toRender) // (args.jobs * 4))
+        )
+        for (i, status) in zip(toRender, results):
+            # (there may be thousands of files; only print the failures)
+            if status == "written":
+                state[outputFiles[i]] = signatures[i]
+            else:
+                print(f"{inputFiles[i]}: {status}")
+                state.pop(outputFiles[i], None)
+                status = "failed"
+            statusCounts[status] = statusCounts.get(status, 0) + 1
+
+    print(", ".join(
+        f"{c} {s}" for (s, c) in sorted(statusCounts.items()) if c
+    ))
+
+    if not qneslib.state_write(statePath, state):
+        sys.exit("Error writing state file.")
+
+def main():
+    args = parse_arguments()
+
+    palette = decode_palette(args.palette)
+    patternTable = read_pattern_table(args.chr_file, args.bank)
+    rowTable = get_row_table(patternTable)
+    if args.attributes is not None:
+        attributes = read_file(args.attributes, "attribute table file")
+        if len(attributes) != ATTRIBUTE_TABLE_SIZE:
+            sys.exit(
+                f"Attribute table file must be {ATTRIBUTE_TABLE_SIZE} bytes."
+            )
+    else:
+        attributes = None
+
+    if args.batch:
+        render_batch(args, patternTable, attributes, rowTable, palette)
+    else:
+        (nameTable, attributeTable) \
+        = read_name_table(args.input_file, attributes)
+        save_image(
+            render(nameTable, attributeTable, rowTable, palette),
+            args.output_file
+        )
+
+# the --batch worker processes import this file to find init_worker() and
+# render_worker_file() when they are spawned (Windows, macOS); only the
+# main process may parse the arguments and render
+if __name__ == "__main__":
+    main()
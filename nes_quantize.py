@@ -0,0 +1,263 @@
+import argparse, collections, functools, itertools, math, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+try:
+    from PIL import Image
+except ImportError:
+    sys.exit("Pillow module required. See https://python-pillow.org")
+
+# output palette (the default input palette of nes_chr_encode.py)
+OUTPUT_PALETTE = (
+    (0x00, 0x00, 0x00), (0x55, 0x55, 0x55), (0xaa, 0xaa, 0xaa),
+    (0xff, 0xff, 0xff),
+)
+
+# NES colors to use: of identical colors, the first one in this order (e.g.
+# black = 0x0f); 0x0d ("blacker than black") confuses some TVs
+NES_COLORS = tuple(sorted(
+    (i for i in qneslib.PALETTE if i != 0x0d), key=lambda i: i != 0x0f
+))
+
+# only this many of the most common colors of an area are considered for its
+# subpalette (the others still count in the error); all combinations of them
+# are tried
+MAX_CANDIDATES = 8
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Convert a truecolor image into NES colors: map each "
+        "pixel to the perceptually nearest color of the NES master palette "
+        "and choose the best 4-color subpalette for each attribute area (or "
+        "tile). The output image has CHR colors 0-3 as "
+        + ",".join(bytes(c).hex() for c in OUTPUT_PALETTE)
+        + " (e.g. for nes_chr_encode.py --name-table) and the subpalettes are "
+        "printed as hexadecimal NES colors, one line per row of areas."
+    )
+    parser.add_argument(
+        "-a", "--area-size", type=int, choices=(8, 16), default=16,
+        help="Width and height of the area that shares a subpalette, in "
+        "pixels: 16 (an attribute area; the default) or 8 (a tile)."
+    )
+    parser.add_argument(
+        "-b", "--background",
+        help="Use this NES color (hexadecimal 00-3f) as color 0 of every "
+        "subpalette, as the NES does for backgrounds."
+    )
+    parser.add_argument(
+        "-p", "--preview", metavar="FILE",
+        help="Also save the result in NES colors as a PNG image."
+    )
+    parser.add_argument(
+        "input_file",
+        help="Image file to read (e.g. PNG). Width and height must be "
+        "multiples of --area-size."
+    )
+    parser.add_argument("output_file", help="PNG image file to write.")
+    args = parser.parse_args()
+
+    if args.background is not None:
+        try:
+            args.background = int(args.background, 16)
+            if args.background not in NES_COLORS:
+                raise ValueError
+        except ValueError:
+            sys.exit("Invalid --background.")
+
+    if not os.path.isfile(args.input_file):
+        sys.exit("Input file not found.")
+    for path in (args.output_file, args.preview):
+        if path is not None and os.path.exists(path):
+            sys.exit(f"Output file already exists: {path}")
+
+    return args
+
+def rgb_to_lab(color):
+    # convert an sRGB color (red, green, blue) into CIELAB (L*, a*, b*)
+    # (D65 white point) in which distances approximate perceived differences
+
+    def linearize(value):
+        value /= 255
+        return value / 12.92 if value <= 0.04045 \
+        else ((value + 0.055) / 1.055) ** 2.4
+
+    def f(t):
+        return t ** (1 / 3) if t > (6 / 29) ** 3 \
+        else t / (3 * (6 / 29) ** 2) + 4 / 29
+
+    (red, green, blue) = (linearize(c) for c in color)
+    (x, y, z) = (
+        f((0.4124 * red + 0.3576 * green + 0.1805 * blue) / 0.95047),
+        f(0.2126 * red + 0.7152 * green + 0.0722 * blue),
+        f((0.0193 * red + 0.1192 * green + 0.9505 * blue) / 1.08883),
+    )
+    return (116 * y - 16, 500 * (x - y), 200 * (y - z))
+
+# CIELAB of each NES color
+NES_LAB = dict((i, rgb_to_lab(qneslib.PALETTE[i])) for i in NES_COLORS)
+# squared distance between each pair of NES colors
+NES_DISTANCES = dict(
+    ((i, j), math.dist(NES_LAB[i], NES_LAB[j]) ** 2)
+    for i in NES_COLORS for j in NES_COLORS
+)
+
+@functools.lru_cache(maxsize=None)
+def nearest_nes_color(color):
+    # the nearest NES color to an RGB color; memoized, so this is a lookup
+    # table filled with only the colors that are used
+    lab = rgb_to_lab(color)
+    return min(NES_COLORS, key=lambda i: math.dist(lab, NES_LAB[i]))
+
+def get_errors(counts, nesColor):
+    # how much each color of an area changes if replaced with a NES color;
+    # counts: {nes_color: pixel_count, ...}; return: list in the same order
+    return [
+        count * NES_DISTANCES[(color, nesColor)]
+        for (color, count) in counts.items()
+    ]
+
+def best_combination(candidates, rows, errors, slots):
+    # find the combination of candidates with the smallest total error;
+    # rows: {candidate: errors_from_get_errors, ...}; errors: the smallest
+    # error of each color with the colors chosen so far; the minima are
+    # updated one color at a time instead of recomputing each combination;
+    # return: (total_error, tuple_of_candidates); the first one on a tie
+
+    if slots == 1:
+        return min(
+            ((sum(map(min, errors, rows[c])), (c,)) for c in candidates),
+            key=lambda r: r[0]
+        )
+    best = None
+    for (i, color) in enumerate(candidates[:len(candidates)-slots+1]):
+        (error, colors) = best_combination(
+            candidates[i+1:], rows, list(map(min, errors, rows[color])),
+            slots - 1
+        )
+        if best is None or error < best[0]:
+            best = (error, (color,) + colors)
+    return best
+
+def choose_subpalette(counts, background):
+    # choose up to 4 NES colors that best represent an area;
+    # counts: {nes_color: pixel_count, ...};
+    # return: tuple of NES colors (background first, then darkest first)
+
+    fixed = () if background is None else (background,)
+    candidates = [c for c in counts if c not in fixed]
+    if len(candidates) > MAX_CANDIDATES:
+        common = set(sorted(candidates, key=lambda c: -counts[c])[
+            :MAX_CANDIDATES
+        ])
+        candidates = [c for c in candidates if c in common]
+    slots = 4 - len(fixed)
+
+    if len(candidates) <= slots:
+        chosen = fixed + tuple(candidates)
+    else:
+        rows = dict((c, get_errors(counts, c)) for c in candidates)
+        errors = [math.inf] * len(counts) if background is None \
+        else get_errors(counts, background)
+        chosen = fixed + best_combination(candidates, rows, errors, slots)[1]
+
+    return fixed + tuple(sorted(
+        (c for c in chosen if c not in fixed), key=lambda c: NES_LAB[c][0]
+    ))
+
+def quantize_image(image, args):
+    # return: (CHR_colors_per_pixel, NES_colors_per_pixel, subpalettes);
+    # subpalettes: one list per row of areas
+
+    # convert into indexed color; reduce the colors first if there are more
+    # than 256 (still many more than the NES has)
+    image = image.convert("RGB")
+    if image.getcolors(256) is None:
+        image = image.quantize(
+            256, Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE
+        )
+    else:
+        image = image.convert("P", palette=Image.Palette.ADAPTIVE)
+    (width, height) = image.size
+
+    # map to NES colors (the lookup is done once per palette entry)
+    palette = image.getpalette()
+    colorTable = bytes(
+        nearest_nes_color(tuple(palette[i:i+3]))
+        for i in range(0, len(palette), 3)
+    )
+    nesPixels = bytearray(
+        image.tobytes().translate(colorTable + bytes(256 - len(colorTable)))
+    )
+    chrPixels = bytearray(len(nesPixels))
+
+    size = args.area_size
+    subpalettes = []
+    for areaY in range(0, height, size):
+        subpalettes.append([])
+        for areaX in range(0, width, size):
+            rows = range(
+                areaY * width + areaX, (areaY + size) * width + areaX, width
+            )
+            counts = collections.Counter(itertools.chain.from_iterable(
+                nesPixels[pos:pos+size] for pos in rows
+            ))
+            subpalette = choose_subpalette(counts, args.background)
+            subpalettes[-1].append(subpalette)
+
+            # remap each row of the area with two translation tables
+            chrTable = bytearray(256)
+            nesTable = bytearray(256)
+            for color in counts:
+                chrTable[color] = min(
+                    range(len(subpalette)),
+                    key=lambda i: NES_DISTANCES[(color, subpalette[i])]
+                )
+                nesTable[color] = subpalette[chrTable[color]]
+            for pos in rows:
+                chrPixels[pos:pos+size] \
+                = nesPixels[pos:pos+size].translate(chrTable)
+                nesPixels[pos:pos+size] \
+                = nesPixels[pos:pos+size].translate(nesTable)
+
+    return (chrPixels, nesPixels, subpalettes)
+
+def save_image(path, size, pixels, palette):
+    image = Image.frombytes("P", size, bytes(pixels))
+    image.putpalette(itertools.chain.from_iterable(palette))
+    try:
+        with open(path, "wb") as handle:
+            handle.seek(0)
+            image.save(handle, "png")
+    except OSError:
+        sys.exit(f"Error writing {path}")
+
+def main():
+    args = parse_arguments()
+
+    try:
+        with open(args.input_file, "rb") as handle:
+            handle.seek(0)
+            image = Image.open(handle)
+            image.load()
+    except OSError:
+        sys.exit("Error reading input file.")
+
+    if image.width == 0 or image.width % args.area_size:
+        sys.exit(f"Image width must be a multiple of {args.area_size}.")
+    if image.height == 0 or image.height % args.area_size:
+        sys.exit(f"Image height must be a multiple of {args.area_size}.")
+
+    (chrPixels, nesPixels, subpalettes) = quantize_image(image, args)
+
+    save_image(args.output_file, image.size, chrPixels, OUTPUT_PALETTE)
+    if args.preview is not None:
+        save_image(
+            args.preview, image.size, nesPixels,
+            (qneslib.PALETTE[i] for i in range(64))
+        )
+
+    # pad each subpalette to 4 colors with its first color
+    for row in subpalettes:
+        print(" ".join(bytes(s + (4 - len(s)) * s[:1]).hex() for s in row))
+
+main()
@@ -0,0 +1,183 @@
+import argparse, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+
+# how many differing bytes to print per code set in batch mode
+MAX_BATCH_DIFFS = 8
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Evaluate the effect of Game Genie codes by running a "
+        "routine of an iNES ROM file (.nes) in a 6502 emulator with and "
+        "without the codes and printing the RAM bytes (0000-07ff, 6000-7fff) "
+        "that end up different. Only the CPU is emulated: PRG ROM banks stay "
+        "as at power-on, PPU/APU registers are stubs and there is no "
+        "controller input."
+    )
+    parser.add_argument(
+        "-s", "--start", default="reset",
+        help="Where to start: 'reset', 'nmi' or 'irq' (the interrupt vector) "
+        "or the CPU address of a subroutine in hexadecimal (8000-ffff). "
+        "Default: reset."
+    )
+    parser.add_argument(
+        "-c", "--cycles", type=int, default=100_000,
+        help="Maximum number of CPU cycles to run the routine for (and each "
+        "NMI routine for, see --frames). 1 or greater, default=100000 (one "
+        "frame is about 29780)."
+    )
+    parser.add_argument(
+        "-f", "--frames", type=int, default=0,
+        help="After the routine, run the NMI routine this many times. 0 or "
+        "greater, default=0."
+    )
+    parser.add_argument(
+        "-b", "--batch", metavar="FILE",
+        help="Read sets of codes from this text file instead of the command "
+        "line: one set per line, codes separated by spaces; empty lines and "
+        "lines starting with '#' are ignored. One line of output per set."
+    )
+    parser.add_argument("input_file", help="iNES ROM file (.nes) to read.")
+    parser.add_argument(
+        "code", nargs="*",
+        help="Game Genie code(s) to evaluate together (6 or 8 letters)."
+    )
+    args = parser.parse_args()
+
+    if args.start not in ("reset", "nmi", "irq"):
+        try:
+            args.start = int(args.start, 16)
+            if not 0x8000 <= args.start <= 0xffff:
+                raise ValueError
+        except ValueError:
+            sys.exit("Invalid --start.")
+    if args.cycles < 1:
+        sys.exit("--cycles must be 1 or greater.")
+    if args.frames < 0:
+        sys.exit("--frames must be 0 or greater.")
+    if args.batch is None and not args.code:
+        sys.exit("Specify Game Genie codes or --batch.")
+    if args.batch is not None and args.code:
+        sys.exit("Game Genie codes and --batch can't be used together.")
+    if args.batch is not None and not os.path.isfile(args.batch):
+        sys.exit("Batch file not found.")
+    args.code = decode_codes(args.code)
+    if args.code is None:
+        sys.exit("Invalid Game Genie code.")
+
+    if not os.path.isfile(args.input_file):
+        sys.exit("Input file not found.")
+
+    return args
+
+def decode_codes(codes):
+    # decode Game Genie codes; return list of (addr, repl, comp) or None
+    decoded = [qneslib.game_genie_decode(code) for code in codes]
+    return None if None in decoded else decoded
+
+def read_batch_file(path):
+    # generate: (line, decoded_codes) for each set of codes
+    try:
+        with open(path, "rt", encoding="ascii") as handle:
+            for line in handle:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    codes = decode_codes(line.split())
+                    if codes is None:
+                        sys.exit(f"Invalid Game Genie code(s): {line}")
+                    yield (line, codes)
+    except OSError:
+        sys.exit("Error reading the batch file.")
+    except UnicodeDecodeError:
+        sys.exit("Batch file is not ASCII.")
+
+def run_program(prgData, prgBankSize, codes, args):
+    # run the routine and the NMI routines with some codes applied;
+    # return: (memory, status_of_each_run)
+    memory = qneslib.cpu_memory(prgData, prgBankSize, codes)
+    statuses = [qneslib.cpu_run(memory, args.start, args.cycles)[1]]
+    for frame in range(args.frames):
+        statuses.append(qneslib.cpu_run(memory, "nmi", args.cycles)[1])
+    return (memory, statuses)
+
+def get_differences(memory1, memory2):
+    # generate: (address, byte1, byte2) for each RAM byte that differs
+    for (start, end) in ((0x0000, 0x0800), (0x6000, 0x8000)):
+        if memory1[start:end] != memory2[start:end]:
+            for addr in range(start, end):
+                if memory1[addr] != memory2[addr]:
+                    yield (addr, memory1[addr], memory2[addr])
+
+def format_status(statuses):
+    # e.g. "ran out of cycles + 2 NMI(s) returned"
+    descriptions = {
+        "return": "returned", "cycles": "ran out of cycles",
+        "jam": "jammed (undocumented opcode)",
+    }
+    text = descriptions[statuses[0]]
+    for status in sorted(set(statuses[1:])):
+        count = statuses[1:].count(status)
+        text += f" + {count} NMI(s) {descriptions[status]}"
+    return text
+
+def main():
+    args = parse_arguments()
+
+    try:
+        with open(args.input_file, "rb") as handle:
+            fileInfo = qneslib.ines_header_decode(handle)
+            if fileInfo is None:
+                sys.exit("Invalid iNES ROM file.")
+            handle.seek(fileInfo["prgStart"])
+            prgData = handle.read(fileInfo["prgSize"])
+    except OSError:
+        sys.exit("Error reading the file.")
+
+    if not qneslib.is_mapper_known(fileInfo["mapper"]):
+        print(
+            f"Warning: unknown mapper {fileInfo['mapper']}; assuming 8-KiB "
+            "PRG ROM banks.", file=sys.stderr
+        )
+    if qneslib.is_prg_bankswitched(fileInfo["prgSize"], fileInfo["mapper"]):
+        print(
+            "Warning: the game may use PRG ROM bankswitching, which is not "
+            "emulated.", file=sys.stderr
+        )
+
+    prgBankSize = qneslib.min_prg_bank_size(
+        fileInfo["prgSize"], fileInfo["mapper"]
+    )
+
+    (origMemory, origStatuses) = run_program(prgData, prgBankSize, (), args)
+
+    if args.batch is None:
+        (memory, statuses) = run_program(
+            prgData, prgBankSize, args.code, args
+        )
+        print("Without codes: " + format_status(origStatuses))
+        print("With codes:    " + format_status(statuses))
+        differences = list(get_differences(origMemory, memory))
+        for (addr, origByte, byte) in differences:
+            print(f"${addr:04x}: {origByte:02x} -> {byte:02x}")
+        print(f"{len(differences)} byte(s) of RAM differ.")
+        return
+
+    # the original run is only done once for all sets of codes
+    for (line, codes) in read_batch_file(args.batch):
+        (memory, statuses) = run_program(prgData, prgBankSize, codes, args)
+        differences = list(get_differences(origMemory, memory))
+        print(
+            f"{line}: {len(differences)} byte(s) differ"
+            + "".join(
+                f", ${addr:04x}: {origByte:02x}->{byte:02x}"
+                for (addr, origByte, byte) in differences[:MAX_BATCH_DIFFS]
+            )
+            + (", ..." if len(differences) > MAX_BATCH_DIFFS else "")
+            + (
+                f" ({format_status(statuses)})"
+                if statuses != origStatuses else ""
+            )
+        )
+
+main()
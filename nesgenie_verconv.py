@@ -1,6 +1,13 @@
-import argparse, os, sys
+import argparse, bisect, itertools, os, sys
 import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
 
+MAX_SLICE_LENGTH = 20
+
+# with --ignore-addresses: replaces bytes that are parts of 16-bit address
+# operands; how many bytes before a slice to start decoding 6502 code from
+ADDRESS_OPERAND = 0x100
+DECODE_LEAD = 16
+
 def parse_arguments():
     # parse command line arguments using argparse
 
@@ -27,6 +34,35 @@ def parse_arguments():
         "Minimum=0, default=1, maximum=twice --slice-length, minus one. "
         "Increase to get more results."
     )
+    parser.add_argument(
+        "-e", "--max-edits", type=int,
+        help="Use edit distance instead of --max-different-bytes: maximum "
+        "number of inserted, deleted or substituted bytes allowed in each "
+        "pair of PRG ROM slices to compare. (The relevant byte must always "
+        "match.) Finds code that has moved because of added or removed "
+        "instructions. Minimum=0, maximum=twice --slice-length, minus one. "
+        "Default: don't use edit distance."
+    )
+    parser.add_argument(
+        "-i", "--ignore-addresses", action="store_true",
+        help="Decode PRG ROM data as 6502 machine code and consider two bytes "
+        "equal if both are parts of 16-bit address operands (e.g. JSR $1234) "
+        "even if their values differ. Finds code that refers to relocated "
+        "subroutines or variables. Can't be used with --max-edits."
+    )
+    parser.add_argument(
+        "-a", "--auto", action="store_true",
+        help="Ignore --slice-length and --max-different-bytes; instead, try "
+        "them from the strictest to the loosest and use the first "
+        "combination that gives 1 to --max-results PRG ROM addresses in "
+        "file2 (or, if there is none, the first one that gives any results). "
+        "Prints the values used."
+    )
+    parser.add_argument(
+        "-k", "--max-results", type=int, default=1,
+        help="With --auto: maximum number of PRG ROM addresses in file2 to "
+        "accept. 1 or greater, default=1."
+    )
     parser.add_argument(
         "-v", "--verbose", action="store_true",
         help="Print more information. Note: all printed numbers are "
@@ -49,10 +85,19 @@ def parse_arguments():
     )
     args = parser.parse_args()
 
-    if not 1 <= args.slice_length <= 20:
+    if not 1 <= args.slice_length <= MAX_SLICE_LENGTH:
         sys.exit("Invalid --slice-length.")
     if not 0 <= args.max_different_bytes < 2 * args.slice_length:
         sys.exit("Invalid --max-different-bytes.")
+    if args.max_edits is not None \
+    and not 0 <= args.max_edits < 2 * args.slice_length:
+        sys.exit("Invalid --max-edits.")
+    if args.auto and args.max_edits is not None:
+        sys.exit("--auto and --max-edits can't be used together.")
+    if args.ignore_addresses and args.max_edits is not None:
+        sys.exit("--ignore-addresses and --max-edits can't be used together.")
+    if args.max_results < 1:
+        sys.exit("Invalid --max-results.")
     if qneslib.game_genie_decode(args.code) is None:
         sys.exit("Invalid code.")
     if not os.path.isfile(args.file1):
@@ -102,17 +147,34 @@ def get_prg_addresses(fileInfo, args, handle):
                 prgAddresses.add(prgAddr)
     return prgAddresses
 
+def mask_address_operands(data):
+    # decode data as 6502 machine code; return a list of ints where bytes that
+    # are parts of 16-bit address operands are replaced with ADDRESS_OPERAND
+    return [
+        ADDRESS_OPERAND if isOperand else byte for (byte, isOperand)
+        in zip(data, qneslib.address_operand_mask(data))
+    ]
+
 def get_prg_slices(prgAddresses, fileInfo, args, handle):
     # generate slices surrounding each PRG ROM address in file1:
-    # (bytes_before, bytes_after)
+    # (bytes_before, bytes_after); with --ignore-addresses, the slices are
+    # tuples from mask_address_operands() instead of bytes
 
     for prgAddr in prgAddresses:
         # get actual length of slice before/after relevant byte
         lenBefore = min(args.slice_length, prgAddr)
         lenAfter = min(args.slice_length, fileInfo["prgSize"] - prgAddr - 1)
 
-        handle.seek(fileInfo["prgStart"] + prgAddr - lenBefore)
-        slice_ = handle.read(lenBefore + 1 + lenAfter)
+        if args.ignore_addresses:
+            # start decoding earlier to get in sync with instruction boundaries
+            lead = min(DECODE_LEAD, prgAddr - lenBefore)
+            handle.seek(fileInfo["prgStart"] + prgAddr - lenBefore - lead)
+            slice_ = tuple(mask_address_operands(
+                handle.read(lead + lenBefore + 1 + lenAfter)
+            )[lead:])
+        else:
+            handle.seek(fileInfo["prgStart"] + prgAddr - lenBefore)
+            slice_ = handle.read(lenBefore + 1 + lenAfter)
 
         # don't use [-lenAfter:] as lenAfter may be zero
         yield (slice_[:lenBefore], slice_[lenBefore+1:])
@@ -125,12 +187,18 @@ def get_fake_compare_value(handle, args):
     handle.seek(fileInfo["prgStart"] + prgAddr)
     return handle.read(1)[0]
 
+def format_slice(slice_):
+    # format bytes or a tuple from mask_address_operands() as hexadecimal
+    return "".join(
+        "xx" if byte == ADDRESS_OPERAND else f"{byte:02x}" for byte in slice_
+    )
+
 def print_slices(slices, compareValue):
     # print slices found in file1
     print(
         "Bytestrings around those addresses in file1 (relevant byte in "
-        "<brackets>):", ", ".join(
-            f"{s[0].hex()}<{compareValue:02x}>{s[1].hex()}"
+        "<brackets>, xx = ignored address operand):", ", ".join(
+            f"{format_slice(s[0])}<{compareValue:02x}>{format_slice(s[1])}"
             for s in sorted(slices)
         )
     )
@@ -139,29 +207,224 @@ def find_slices_in_prg(handle, slices, comp, args):
     # generate PRG addresses of each slice (used with file2; comp = compare
     # value)
 
-    # read all PRG data
+    # read all PRG data; the relevant byte is compared against prgData, other
+    # bytes against prgTokens
     fileInfo = qneslib.ines_header_decode(handle)
     handle.seek(fileInfo["prgStart"])
     prgData = handle.read(fileInfo["prgSize"])
+    if args.ignore_addresses:
+        prgTokens = mask_address_operands(prgData)
+    else:
+        prgTokens = prgData
 
     for (sliceBefore, sliceAfter) in slices:
-        slice_ = sliceBefore + bytes((comp,)) + sliceAfter
         # PRG addresses of possible relevant bytes
         for prgAddr in range(len(sliceBefore), len(prgData) - len(sliceAfter)):
             # the relevant byte must always match
             if prgData[prgAddr] == comp:
                 # if not too many different bytes around, yield PRG address
                 # of relevant byte
-                prgSlice = prgData[
-                    prgAddr-len(sliceBefore):prgAddr+len(sliceAfter)+1
+                prgSliceBefore = prgTokens[prgAddr-len(sliceBefore):prgAddr]
+                prgSliceAfter = prgTokens[
+                    prgAddr+1:prgAddr+len(sliceAfter)+1
                 ]
                 differentByteCnt = sum(
-                    1 for (byte1, byte2) in zip(slice_, prgSlice)
+                    1 for (byte1, byte2) in itertools.chain(
+                        zip(sliceBefore, prgSliceBefore),
+                        zip(sliceAfter, prgSliceAfter)
+                    )
                     if byte1 != byte2
                 )
                 if differentByteCnt <= args.max_different_bytes:
                     yield prgAddr
 
+def find_slices_in_prg_auto(handle, slices, comp, args):
+    # find the strictest slice length and maximum number of different bytes
+    # that give 1 to args.max_results PRG addresses in file2 (comp = compare
+    # value); slices must have been read using MAX_SLICE_LENGTH;
+    # return: (slice_length, max_different_bytes, set_of_PRG_addresses) or
+    # None if no combination gives any results
+
+    # read all PRG data (see find_slices_in_prg())
+    fileInfo = qneslib.ines_header_decode(handle)
+    handle.seek(fileInfo["prgStart"])
+    prgData = handle.read(fileInfo["prgSize"])
+    if args.ignore_addresses:
+        prgTokens = mask_address_operands(prgData)
+    else:
+        prgTokens = prgData
+
+    # PRG addresses of possible relevant bytes
+    candidates = []
+    prgAddr = prgData.find(comp)
+    while prgAddr != -1:
+        candidates.append(prgAddr)
+        prgAddr = prgData.find(comp, prgAddr + 1)
+
+    # build an index that is searched with each combination:
+    # minDiffs[sliceLen-1][prgAddr] = smallest number of different bytes
+    # between any slice and file2 at that slice length (addresses too close to
+    # start/end of PRG ROM for all slices are missing)
+    minDiffs = [{} for i in range(MAX_SLICE_LENGTH)]
+    for (sliceBefore, sliceAfter) in slices:
+        for prgAddr in candidates:
+            # number of different bytes within each distance from the
+            # relevant byte (index = distance)
+            diffsBefore = [0]
+            for i in range(1, min(len(sliceBefore), prgAddr) + 1):
+                diffsBefore.append(
+                    diffsBefore[-1]
+                    + (sliceBefore[-i] != prgTokens[prgAddr-i])
+                )
+            diffsAfter = [0]
+            for i in range(
+                1, min(len(sliceAfter), len(prgData) - prgAddr - 1) + 1
+            ):
+                diffsAfter.append(
+                    diffsAfter[-1]
+                    + (sliceAfter[i-1] != prgTokens[prgAddr+i])
+                )
+
+            for sliceLen in range(1, MAX_SLICE_LENGTH + 1):
+                lenBefore = min(sliceLen, len(sliceBefore))
+                lenAfter = min(sliceLen, len(sliceAfter))
+                if lenBefore >= len(diffsBefore) \
+                or lenAfter >= len(diffsAfter):
+                    break  # too close to start/end of PRG ROM
+                diffCnt = diffsBefore[lenBefore] + diffsAfter[lenAfter]
+                if diffCnt < minDiffs[sliceLen-1].get(prgAddr, diffCnt + 1):
+                    minDiffs[sliceLen-1][prgAddr] = diffCnt
+
+    # all valid combinations of slice length and max. different bytes; the
+    # more bytes that must match, the stricter; if equally many, the fewer
+    # different bytes allowed, the stricter
+    combinations = sorted(
+        (
+            (sliceLen, maxDiffs)
+            for sliceLen in range(1, MAX_SLICE_LENGTH + 1)
+            for maxDiffs in range(2 * sliceLen)
+        ),
+        key=lambda c: (c[1] - 2 * c[0], c[1])
+    )
+
+    # find the first combination with an acceptable number of results
+    sortedDiffs = [sorted(m.values()) for m in minDiffs]
+    firstWithResults = None
+    for (sliceLen, maxDiffs) in combinations:
+        resultCnt = bisect.bisect_right(sortedDiffs[sliceLen-1], maxDiffs)
+        if resultCnt and firstWithResults is None:
+            firstWithResults = (sliceLen, maxDiffs)
+        if 1 <= resultCnt <= args.max_results:
+            break
+    else:
+        if firstWithResults is None:
+            return None
+        (sliceLen, maxDiffs) = firstWithResults
+
+    return (sliceLen, maxDiffs, set(
+        prgAddr for (prgAddr, diffCnt) in minDiffs[sliceLen-1].items()
+        if diffCnt <= maxDiffs
+    ))
+
+def generate_edit_distances(pattern, text):
+    # generate the smallest edit distance (insertions, deletions and
+    # substitutions) between pattern and any substring of text ending at each
+    # position of text; uses Myers' bit-parallel algorithm (see "A fast
+    # bit-vector algorithm for approximate string matching based on dynamic
+    # programming", 1999); bit n of a vector = row n of the DP matrix
+
+    mask = (1 << len(pattern)) - 1
+    highBit = 1 << (len(pattern) - 1) if pattern else 0
+    # which positions in pattern contain each byte
+    peq = [0] * 0x100
+    for (i, byte) in enumerate(pattern):
+        peq[byte] |= 1 << i
+
+    pv = mask  # vertical positive deltas
+    mv = 0     # vertical negative deltas
+    score = len(pattern)
+    for byte in text:
+        eq = peq[byte]
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & highBit:
+            score += 1
+        elif mh & highBit:
+            score -= 1
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        yield score
+
+def get_edit_distance(pattern, text):
+    # smallest edit distance between pattern and a substring of text that ends
+    # at the end of text
+    score = len(pattern)
+    for score in generate_edit_distances(pattern, text):
+        pass
+    return score
+
+def find_slices_in_prg_with_edits(handle, slices, comp, args):
+    # generate PRG addresses of each slice using edit distance (used with
+    # file2; comp = compare value); the part before and the part after the
+    # relevant byte are matched separately so that the relevant byte is never
+    # considered inserted or deleted
+
+    # read all PRG data
+    fileInfo = qneslib.ines_header_decode(handle)
+    handle.seek(fileInfo["prgStart"])
+    prgData = handle.read(fileInfo["prgSize"])
+    reversedPrgData = prgData[::-1]
+
+    # PRG addresses of possible relevant bytes
+    candidates = []
+    prgAddr = prgData.find(comp)
+    while prgAddr != -1:
+        candidates.append(prgAddr)
+        prgAddr = prgData.find(comp, prgAddr + 1)
+
+    for (sliceBefore, sliceAfter) in slices:
+        # a match with max_edits edits can't span more bytes than this
+        lenBefore = len(sliceBefore) + args.max_edits
+        lenAfter = len(sliceAfter) + args.max_edits
+        reversedAfter = sliceAfter[::-1]
+
+        if len(candidates) * (lenBefore + lenAfter) < 2 * len(prgData):
+            # few candidates; only examine the bytes around each of them
+            for prgAddr in candidates:
+                start = max(prgAddr - lenBefore, 0)
+                distance = get_edit_distance(
+                    sliceBefore, prgData[start:prgAddr]
+                )
+                if distance > args.max_edits:
+                    continue
+                end = min(prgAddr + 1 + lenAfter, len(prgData))
+                distance += get_edit_distance(
+                    reversedAfter, prgData[prgAddr+1:end][::-1]
+                )
+                if distance <= args.max_edits:
+                    yield prgAddr
+        else:
+            # many candidates; scan all PRG data once in both directions;
+            # distancesBefore[i] = distance for a part ending at i - 1,
+            # distancesAfter[i] = distance for a part starting at i
+            distancesBefore = [len(sliceBefore)]
+            distancesBefore.extend(
+                generate_edit_distances(sliceBefore, prgData)
+            )
+            distancesAfter = list(
+                generate_edit_distances(reversedAfter, reversedPrgData)
+            )
+            distancesAfter.reverse()
+            distancesAfter.append(len(sliceAfter))
+            for prgAddr in candidates:
+                if distancesBefore[prgAddr] + distancesAfter[prgAddr+1] \
+                <= args.max_edits:
+                    yield prgAddr
+
 def print_results(cpuAddresses, compareValue, args):
     # print codes with new addresses (sort by difference from original address)
     (origCpuAddr, replaceValue) = qneslib.game_genie_decode(args.code)[:2]
@@ -175,6 +438,10 @@ def print_results(cpuAddresses, compareValue, args):
 def main():
     args = parse_arguments()
 
+    if args.auto:
+        # get the longest slices; shorter ones will be tried in file2
+        args.slice_length = MAX_SLICE_LENGTH
+
     if args.verbose:
         print_decoded_code(args)
 
@@ -213,9 +480,25 @@ def main():
             fileInfo = qneslib.ines_header_decode(handle)
             if fileInfo is None:
                 sys.exit("file2 is not a valid iNES ROM file.")
-            prgAddresses = set(find_slices_in_prg(
-                handle, slices, compareValue, args
-            ))
+            if args.auto:
+                autoResult = find_slices_in_prg_auto(
+                    handle, slices, compareValue, args
+                )
+                if autoResult is None:
+                    prgAddresses = set()
+                else:
+                    (
+                        args.slice_length, args.max_different_bytes,
+                        prgAddresses
+                    ) = autoResult
+            elif args.max_edits is None:
+                prgAddresses = set(find_slices_in_prg(
+                    handle, slices, compareValue, args
+                ))
+            else:
+                prgAddresses = set(find_slices_in_prg_with_edits(
+                    handle, slices, compareValue, args
+                ))
     except OSError:
         sys.exit("Error reading file2.")
     if not prgAddresses:
@@ -223,6 +506,12 @@ def main():
             "file2 contains nothing similar to what your code affects in "
             "file1."
         )
+    if args.auto:
+        print(
+            f"Using --slice-length {args.slice_length} "
+            f"--max-different-bytes {args.max_different_bytes} "
+            f"({len(prgAddresses)} PRG address(es) in file2)."
+        )
     if args.verbose:
         print(
             "PRG address matches in file2:",
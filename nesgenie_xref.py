@@ -0,0 +1,204 @@
+import argparse, os, sys
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+
+# instructions that write to memory
+WRITE_MNEMONICS = frozenset(
+    ("sta", "stx", "sty", "inc", "dec", "asl", "lsr", "rol", "ror")
+)
+# undocumented NOPs that skip one/two operand bytes (by instruction length);
+# unlike e.g. BIT, they don't change any registers or flags, but the 3-byte
+# one (NOP abs) still reads its operand address
+NOP_OPCODES = {2: 0x80, 3: 0x0c}
+# for each store instruction, instructions with an immediate operand that
+# may set the stored value
+IMMEDIATE_SOURCES = {
+    "sta": ("lda", "adc", "sbc"),
+    "stx": ("ldx",),
+    "sty": ("ldy",),
+}
+# for each store instruction, instructions that may change the stored register
+REGISTER_SETTERS = {
+    "sta": (
+        "lda", "adc", "sbc", "and", "ora", "eor", "asl", "lsr", "rol", "ror",
+        "txa", "tya", "pla",
+    ),
+    "stx": ("ldx", "tax", "tsx", "inx", "dex"),
+    "sty": ("ldy", "tay", "iny", "dey"),
+}
+# how many instructions before a store to look for an immediate operand
+MAX_LOOKBACK = 4
+# instructions that end the lookback
+FLOW_MNEMONICS = frozenset(("jmp", "jsr", "rts", "rti", "brk"))
+
+def parse_arguments():
+    # parse command line arguments using argparse
+
+    parser = argparse.ArgumentParser(
+        description="Find the instructions that read or write a memory "
+        "address (e.g. the number of lives in RAM) in an iNES ROM file (.nes) "
+        "and suggest Game Genie codes for them: a NOP instead of each write "
+        "(except to $2000-$5fff, because the NOP would still read from it) "
+        "and a new value instead of each immediate operand that is stored "
+        "there. Note: only instructions that refer to the address directly "
+        "(e.g. not LDA $0700,x for $075a) are found."
+    )
+    parser.add_argument(
+        "-v", "--value", default="09",
+        help="New value for immediate operands of LDA/LDX/LDY in "
+        "hexadecimal (00-ff, default=09). (Those of ADC/SBC are always set "
+        "to 00.)"
+    )
+    parser.add_argument("input_file", help="iNES ROM file (.nes) to read.")
+    parser.add_argument(
+        "address", nargs="+",
+        help="Memory address to look for, in hexadecimal (0000-ffff). May be "
+        "specified more than once."
+    )
+    args = parser.parse_args()
+
+    try:
+        args.value = int(args.value, 16)
+        if not 0x00 <= args.value <= 0xff:
+            raise ValueError
+    except ValueError:
+        sys.exit("Invalid --value.")
+    try:
+        args.address = [int(a, 16) for a in args.address]
+        if not all(0x0000 <= a <= 0xffff for a in args.address):
+            raise ValueError
+    except ValueError:
+        sys.exit("Invalid address.")
+
+    if not os.path.isfile(args.input_file):
+        sys.exit("Input file not found.")
+
+    return args
+
+def encode_codes(prgAddr, repl, prgData, prgBankSize, bankswitched):
+    # get Game Genie codes that replace a PRG ROM byte; if the game uses
+    # bankswitching, use the original byte as the compare value and try all
+    # CPU addresses the bank may be mapped to
+    comp = prgData[prgAddr] if bankswitched else None
+    return [
+        qneslib.game_genie_encode(cpuAddr, repl, comp)
+        for cpuAddr in qneslib.address_prg_to_cpu(prgAddr, prgBankSize)
+    ]
+
+def find_immediate_source(prgAddr, instruction, prgData, prgBankSize):
+    # find an instruction with an immediate operand that may set the value
+    # stored by a store instruction;
+    # return: (prg_address, instruction) or None
+
+    mnemonic = qneslib.instruction_mnemonic(instruction)[0]
+    if mnemonic not in IMMEDIATE_SOURCES:
+        return None
+
+    # get the disassembly of the bank (memoized by qneslib)
+    bankStart = prgAddr & ~(prgBankSize - 1)
+    origin = qneslib.prg_bank_origin(prgAddr, prgBankSize, len(prgData))
+    instructions = qneslib.disassemble(
+        prgData[bankStart:bankStart+prgBankSize], origin
+    )
+    index = instructions.index(instruction)
+
+    for prevInstr in instructions[max(index-MAX_LOOKBACK, 0):index][::-1]:
+        prevMnemonic = qneslib.instruction_mnemonic(prevInstr)
+        if prevMnemonic is None or prevMnemonic[0] in FLOW_MNEMONICS \
+        or prevMnemonic[1] == "rel":
+            break
+        if prevMnemonic[0] in IMMEDIATE_SOURCES[mnemonic] \
+        and prevMnemonic[1] == "imm":
+            return (bankStart + prevInstr[0] - origin, prevInstr)
+        if prevMnemonic[0] in REGISTER_SETTERS[mnemonic]:
+            break  # the register was set some other way
+    return None
+
+def format_instruction(prgAddr, instruction):
+    return (
+        f"PRG 0x{prgAddr:05x} (${instruction[0]:04x}): "
+        f"{qneslib.instruction_to_bytes(instruction).hex(' '):8}  "
+        + qneslib.format_instruction(instruction)
+    )
+
+def print_references(address, prgData, prgBankSize, bankswitched, args):
+    # print the instructions that refer to an address and the codes for them
+
+    # an index lookup; the index is built on the first call
+    references = qneslib.cross_reference_index(prgData, prgBankSize).get(
+        address, ()
+    )
+    print(f"${address:04x}: {len(references)} reference(s)")
+
+    for (prgAddr, instruction) in references:
+        mnemonic = qneslib.instruction_mnemonic(instruction)[0]
+        isWrite = mnemonic in WRITE_MNEMONICS
+        print(
+            "  " + format_instruction(prgAddr, instruction)
+            + ("  (write)" if isWrite else "  (read)")
+        )
+        if not isWrite:
+            continue
+
+        # replace the opcode with an undocumented NOP of the same length;
+        # NOP abs reads from the operand address, which is only harmless for
+        # RAM and cartridge space (e.g. reading PPUSTATUS or PPUDATA changes
+        # the state of the PPU)
+        length = len(qneslib.instruction_to_bytes(instruction))
+        if length == 3 and 0x2000 <= instruction[2] <= 0x5fff:
+            print(
+                f"    Warning: no NOP suggested; NOP ${instruction[2]:04x} "
+                "would still read from an I/O register."
+            )
+        else:
+            codes = encode_codes(
+                prgAddr, NOP_OPCODES[length], prgData, prgBankSize,
+                bankswitched
+            )
+            print(f"    NOP instead: {', '.join(codes)}")
+
+        # change the immediate operand that is stored
+        source = find_immediate_source(
+            prgAddr, instruction, prgData, prgBankSize
+        )
+        if source is not None:
+            (srcPrgAddr, srcInstr) = source
+            srcMnemonic = qneslib.instruction_mnemonic(srcInstr)[0]
+            value = 0x00 if srcMnemonic in ("adc", "sbc") else args.value
+            codes = encode_codes(
+                srcPrgAddr + 1, value, prgData, prgBankSize, bankswitched
+            )
+            print(
+                "    " + format_instruction(srcPrgAddr, srcInstr)
+                + f" -> #${value:02x}: {', '.join(codes)}"
+            )
+
+def main():
+    args = parse_arguments()
+
+    try:
+        with open(args.input_file, "rb") as handle:
+            fileInfo = qneslib.ines_header_decode(handle)
+            if fileInfo is None:
+                sys.exit("Invalid iNES ROM file.")
+            handle.seek(fileInfo["prgStart"])
+            prgData = handle.read(fileInfo["prgSize"])
+    except OSError:
+        sys.exit("Error reading the file.")
+
+    if not qneslib.is_mapper_known(fileInfo["mapper"]):
+        print(
+            f"Warning: unknown mapper {fileInfo['mapper']}; assuming 8-KiB "
+            "PRG ROM banks.", file=sys.stderr
+        )
+
+    prgBankSize = qneslib.min_prg_bank_size(
+        fileInfo["prgSize"], fileInfo["mapper"]
+    )
+    bankswitched = qneslib.is_prg_bankswitched(
+        fileInfo["prgSize"], fileInfo["mapper"]
+    )
+
+    for address in args.address:
+        print_references(address, prgData, prgBankSize, bankswitched, args)
+
+main()
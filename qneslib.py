@@ -1,6 +1,6 @@
 """qalle's NES library (Nintendo Entertainment System stuff)."""
 
-import struct
+import functools, os, struct
 
 # --- "Constants" -------------------------------------------------------------
 
@@ -146,6 +146,209 @@ _INES_ID = b"NES\x1a"
 GAME_GENIE_LETTERS = "APZLGITYEOXUKSVN"
 _GAME_GENIE_DECODE_KEY = (3, 5, 2, 4, 1, 0, 7, 6)  # at 0x0eb6 in GG PRG ROM
 
+# 6502 addressing modes and their operand sizes in bytes:
+#   imp = implied, acc = accumulator, imm = immediate, zp = zero page,
+#   zpx/zpy = zero page indexed, izx = (zp,x), izy = (zp),y, abs = absolute,
+#   abx/aby = absolute indexed, ind = (abs) (JMP only), rel = relative
+# see https://www.nesdev.org/obelisk-6502-guide/addressing.html
+_OPERAND_SIZES = {
+    "imp": 0, "acc": 0,
+    "imm": 1, "zp":  1, "zpx": 1, "zpy": 1, "izx": 1, "izy": 1, "rel": 1,
+    "abs": 2, "abx": 2, "aby": 2, "ind": 2,
+}
+
+# documented 6502 opcodes
+# key = opcode, value = (mnemonic, addressing mode)
+# see https://www.nesdev.org/obelisk-6502-guide/reference.html
+_OPCODES = {
+    0x00: ("brk", "imp"),
+    0x01: ("ora", "izx"),
+    0x05: ("ora", "zp"),
+    0x06: ("asl", "zp"),
+    0x08: ("php", "imp"),
+    0x09: ("ora", "imm"),
+    0x0a: ("asl", "acc"),
+    0x0d: ("ora", "abs"),
+    0x0e: ("asl", "abs"),
+    0x10: ("bpl", "rel"),
+    0x11: ("ora", "izy"),
+    0x15: ("ora", "zpx"),
+    0x16: ("asl", "zpx"),
+    0x18: ("clc", "imp"),
+    0x19: ("ora", "aby"),
+    0x1d: ("ora", "abx"),
+    0x1e: ("asl", "abx"),
+    0x20: ("jsr", "abs"),
+    0x21: ("and", "izx"),
+    0x24: ("bit", "zp"),
+    0x25: ("and", "zp"),
+    0x26: ("rol", "zp"),
+    0x28: ("plp", "imp"),
+    0x29: ("and", "imm"),
+    0x2a: ("rol", "acc"),
+    0x2c: ("bit", "abs"),
+    0x2d: ("and", "abs"),
+    0x2e: ("rol", "abs"),
+    0x30: ("bmi", "rel"),
+    0x31: ("and", "izy"),
+    0x35: ("and", "zpx"),
+    0x36: ("rol", "zpx"),
+    0x38: ("sec", "imp"),
+    0x39: ("and", "aby"),
+    0x3d: ("and", "abx"),
+    0x3e: ("rol", "abx"),
+    0x40: ("rti", "imp"),
+    0x41: ("eor", "izx"),
+    0x45: ("eor", "zp"),
+    0x46: ("lsr", "zp"),
+    0x48: ("pha", "imp"),
+    0x49: ("eor", "imm"),
+    0x4a: ("lsr", "acc"),
+    0x4c: ("jmp", "abs"),
+    0x4d: ("eor", "abs"),
+    0x4e: ("lsr", "abs"),
+    0x50: ("bvc", "rel"),
+    0x51: ("eor", "izy"),
+    0x55: ("eor", "zpx"),
+    0x56: ("lsr", "zpx"),
+    0x58: ("cli", "imp"),
+    0x59: ("eor", "aby"),
+    0x5d: ("eor", "abx"),
+    0x5e: ("lsr", "abx"),
+    0x60: ("rts", "imp"),
+    0x61: ("adc", "izx"),
+    0x65: ("adc", "zp"),
+    0x66: ("ror", "zp"),
+    0x68: ("pla", "imp"),
+    0x69: ("adc", "imm"),
+    0x6a: ("ror", "acc"),
+    0x6c: ("jmp", "ind"),
+    0x6d: ("adc", "abs"),
+    0x6e: ("ror", "abs"),
+    0x70: ("bvs", "rel"),
+    0x71: ("adc", "izy"),
+    0x75: ("adc", "zpx"),
+    0x76: ("ror", "zpx"),
+    0x78: ("sei", "imp"),
+    0x79: ("adc", "aby"),
+    0x7d: ("adc", "abx"),
+    0x7e: ("ror", "abx"),
+    0x81: ("sta", "izx"),
+    0x84: ("sty", "zp"),
+    0x85: ("sta", "zp"),
+    0x86: ("stx", "zp"),
+    0x88: ("dey", "imp"),
+    0x8a: ("txa", "imp"),
+    0x8c: ("sty", "abs"),
+    0x8d: ("sta", "abs"),
+    0x8e: ("stx", "abs"),
+    0x90: ("bcc", "rel"),
+    0x91: ("sta", "izy"),
+    0x94: ("sty", "zpx"),
+    0x95: ("sta", "zpx"),
+    0x96: ("stx", "zpy"),
+    0x98: ("tya", "imp"),
+    0x99: ("sta", "aby"),
+    0x9a: ("txs", "imp"),
+    0x9d: ("sta", "abx"),
+    0xa0: ("ldy", "imm"),
+    0xa1: ("lda", "izx"),
+    0xa2: ("ldx", "imm"),
+    0xa4: ("ldy", "zp"),
+    0xa5: ("lda", "zp"),
+    0xa6: ("ldx", "zp"),
+    0xa8: ("tay", "imp"),
+    0xa9: ("lda", "imm"),
+    0xaa: ("tax", "imp"),
+    0xac: ("ldy", "abs"),
+    0xad: ("lda", "abs"),
+    0xae: ("ldx", "abs"),
+    0xb0: ("bcs", "rel"),
+    0xb1: ("lda", "izy"),
+    0xb4: ("ldy", "zpx"),
+    0xb5: ("lda", "zpx"),
+    0xb6: ("ldx", "zpy"),
+    0xb8: ("clv", "imp"),
+    0xb9: ("lda", "aby"),
+    0xba: ("tsx", "imp"),
+    0xbc: ("ldy", "abx"),
+    0xbd: ("lda", "abx"),
+    0xbe: ("ldx", "aby"),
+    0xc0: ("cpy", "imm"),
+    0xc1: ("cmp", "izx"),
+    0xc4: ("cpy", "zp"),
+    0xc5: ("cmp", "zp"),
+    0xc6: ("dec", "zp"),
+    0xc8: ("iny", "imp"),
+    0xc9: ("cmp", "imm"),
+    0xca: ("dex", "imp"),
+    0xcc: ("cpy", "abs"),
+    0xcd: ("cmp", "abs"),
+    0xce: ("dec", "abs"),
+    0xd0: ("bne", "rel"),
+    0xd1: ("cmp", "izy"),
+    0xd5: ("cmp", "zpx"),
+    0xd6: ("dec", "zpx"),
+    0xd8: ("cld", "imp"),
+    0xd9: ("cmp", "aby"),
+    0xdd: ("cmp", "abx"),
+    0xde: ("dec", "abx"),
+    0xe0: ("cpx", "imm"),
+    0xe1: ("sbc", "izx"),
+    0xe4: ("cpx", "zp"),
+    0xe5: ("sbc", "zp"),
+    0xe6: ("inc", "zp"),
+    0xe8: ("inx", "imp"),
+    0xe9: ("sbc", "imm"),
+    0xea: ("nop", "imp"),
+    0xec: ("cpx", "abs"),
+    0xed: ("sbc", "abs"),
+    0xee: ("inc", "abs"),
+    0xf0: ("beq", "rel"),
+    0xf1: ("sbc", "izy"),
+    0xf5: ("sbc", "zpx"),
+    0xf6: ("inc", "zpx"),
+    0xf8: ("sed", "imp"),
+    0xf9: ("sbc", "aby"),
+    0xfd: ("sbc", "abx"),
+    0xfe: ("inc", "abx"),
+}
+
+# instruction length in bytes for each opcode (undocumented opcodes: 1)
+_INSTRUCTION_LENGTHS = tuple(
+    1 + _OPERAND_SIZES[_OPCODES[o][1]] if o in _OPCODES else 1
+    for o in range(0x100)
+)
+
+# how to format the operand of each addressing mode ("{}" = operand)
+_OPERAND_FORMATS = {
+    "imp": "",            "acc": " a",
+    "imm": " #${:02x}",   "zp":  " ${:02x}",     "zpx": " ${:02x},x",
+    "zpy": " ${:02x},y",  "izx": " (${:02x},x)", "izy": " (${:02x}),y",
+    "rel": " ${:04x}",    "abs": " ${:04x}",     "abx": " ${:04x},x",
+    "aby": " ${:04x},y",  "ind": " (${:04x})",
+}
+
+# how to format each opcode as assembly language (undocumented ones as data)
+_INSTRUCTION_FORMATS = tuple(
+    _OPCODES[o][0] + _OPERAND_FORMATS[_OPCODES[o][1]] if o in _OPCODES
+    else f"hex {o:02x}"
+    for o in range(0x100)
+)
+
+# does each opcode have a memory address (zero page or 16-bit) as its operand?
+_HAS_MEMORY_OPERAND = tuple(
+    o in _OPCODES
+    and _OPCODES[o][1] not in ("imp", "acc", "imm", "rel")
+    for o in range(0x100)
+)
+
+# does each opcode have a 16-bit address as its operand?
+_HAS_ADDRESS_OPERAND = tuple(
+    o in _OPCODES and _OPERAND_SIZES[_OPCODES[o][1]] == 2
+    for o in range(0x100)
+)
+
 # --- Misc functions ----------------------------------------------------------
 
 def min_prg_bank_size_for_mapper(mapper):
@@ -232,6 +435,558 @@ def tile_slice_encode(pixels):
         hiByte = (hiByte << 1) | (pixel >> 1)
     return (loByte, hiByte)
 
+# --- CHR data functions ------------------------------------------------------
+
+# CHR data format:
+#     - tile = 16 bytes = 2 bitplanes (first low, then high)
+#     - bitplane = 8 bytes (first = topmost)
+#     - byte = 8*1 pixels of 1 bitplane (MSB = leftmost pixel)
+# The functions below process all tiles at once with slice assignments,
+# bytes.translate() and big integers instead of looping over tiles in Python.
+
+# for each pixel in a half of a bitplane byte (0 = leftmost): a byte with 4
+# bits of the low bitplane in the high nibble and 4 bits of the high bitplane
+# in the low nibble -> color of the pixel
+_CHR_NIBBLE_TABLES = tuple(
+    bytes(
+        ((b >> (7 - x)) & 1) | (((b >> (3 - x)) & 1) << 1)
+        for b in range(0x100)
+    ) for x in range(4)
+)
+# the inverse of _CHR_NIBBLE_TABLES: for each pixel (0 = leftmost) in 4 pixels:
+# color -> bits of the pixel in a byte of the same format
+_CHR_NIBBLE_ENCODE_TABLES = tuple(
+    bytes(
+        ((c & 1) << (7 - x)) | (((c >> 1) & 1) << (3 - x))
+        for c in range(0x100)
+    ) for x in range(4)
+)
+
+def _chr_tile_order_to_rows(chrData, tilesPerRow, plane):
+    # get one bitplane of CHR data in image order (one byte = 8*1 pixels,
+    # tilesPerRow bytes per pixel row); copy every 8th pixel row of every
+    # column of tiles with one slice assignment
+
+    rows = bytearray(len(chrData) // 2)
+    for y in range(8):
+        for x in range(tilesPerRow):
+            rows[y*tilesPerRow+x::8*tilesPerRow] \
+            = chrData[x*16+plane*8+y::16*tilesPerRow]
+    return rows
+
+def chr_decode(chrData, tilesPerRow=16):
+    """Decode NES CHR data (any number of tiles) into an image.
+    chrData:     CHR data (16 bytes per tile); the last row of tiles is padded
+                 with color 0 if needed
+    tilesPerRow: image width in tiles
+    return:      bytearray; one color index (0-3) per pixel, row by row;
+                 width = tilesPerRow * 8 pixels"""
+
+    tileRows = -(-len(chrData) // (16 * tilesPerRow))
+    chrData = bytes(chrData) \
+    + bytes(tileRows * tilesPerRow * 16 - len(chrData))
+
+    # combine the bitplanes: one byte per 4 pixels (see _CHR_NIBBLE_TABLES)
+    loPlane = int.from_bytes(
+        _chr_tile_order_to_rows(chrData, tilesPerRow, 0), "big"
+    )
+    hiPlane = int.from_bytes(
+        _chr_tile_order_to_rows(chrData, tilesPerRow, 1), "big"
+    )
+    planeSize = len(chrData) // 2
+    mask = int.from_bytes(planeSize * b"\xf0", "big")
+    leftHalves = (
+        (loPlane & mask) | ((hiPlane >> 4) & (mask >> 4))
+    ).to_bytes(planeSize, "big")
+    rightHalves = (
+        ((loPlane << 4) & mask) | (hiPlane & (mask >> 4))
+    ).to_bytes(planeSize, "big")
+
+    pixels = bytearray(planeSize * 8)
+    for x in range(4):
+        pixels[x::8] = leftHalves.translate(_CHR_NIBBLE_TABLES[x])
+        pixels[x+4::8] = rightHalves.translate(_CHR_NIBBLE_TABLES[x])
+    return pixels
+
+assert chr_decode(bytes.fromhex("80" + 7 * "00" + "01" + 7 * "00"), 1) \
+== bytes((1, 0, 0, 0, 0, 0, 0, 2)) + 56 * b"\x00"
+assert chr_decode(
+    bytes.fromhex(15 * "00" + "ff" + 15 * "00" + "c0"), 2
+)[-16:] == bytes(10 * (2,) + 6 * (0,))
+assert chr_decode(b"", 16) == b""
+
+def chr_encode(pixels, tilesPerRow=16):
+    """Encode an image into NES CHR data.
+    pixels:      one color index (0-3) per pixel, row by row; width =
+                 tilesPerRow * 8 pixels; height = a multiple of 8 pixels
+    tilesPerRow: image width in tiles
+    return:      bytearray (16 bytes per tile; tiles row by row)"""
+
+    planeSize = len(pixels) // 8
+
+    # one byte per 4 pixels (see _CHR_NIBBLE_TABLES)
+    halves = []
+    for start in (0, 4):
+        half = 0
+        for x in range(4):
+            half |= int.from_bytes(
+                pixels[start+x::8].translate(_CHR_NIBBLE_ENCODE_TABLES[x]),
+                "big"
+            )
+        halves.append(half)
+    (leftHalves, rightHalves) = halves
+
+    # split the bitplanes
+    mask = int.from_bytes(planeSize * b"\xf0", "big")
+    planes = (
+        (
+            (leftHalves & mask) | ((rightHalves >> 4) & (mask >> 4))
+        ).to_bytes(planeSize, "big"),
+        (
+            ((leftHalves << 4) & mask) | (rightHalves & (mask >> 4))
+        ).to_bytes(planeSize, "big"),
+    )
+
+    # the inverse of _chr_tile_order_to_rows()
+    chrData = bytearray(planeSize * 2)
+    for (plane, rows) in enumerate(planes):
+        for y in range(8):
+            for x in range(tilesPerRow):
+                chrData[x*16+plane*8+y::16*tilesPerRow] \
+                = rows[y*tilesPerRow+x::8*tilesPerRow]
+    return chrData
+
+assert chr_encode(bytes((1, 0, 0, 0, 0, 0, 0, 2)) + 56 * b"\x00", 1) \
+== bytes.fromhex("80" + 7 * "00" + "01" + 7 * "00")
+assert chr_encode(chr_decode(bytes(range(64)), 2), 2) == bytes(range(64))
+
+# --- 6502 functions ----------------------------------------------------------
+
+def address_operand_mask(data):
+    """Decode data as 6502 machine code from the start and find the bytes that
+    are 16-bit address operands (e.g. JSR $1234, LDA $1234,x). Undocumented
+    opcodes are treated as one-byte instructions.
+    data:   bytes
+    return: bytearray of the same length (1 = address operand, 0 = other)"""
+
+    mask = bytearray(len(data))
+    pos = 0
+    while pos < len(data):
+        opcode = data[pos]
+        if _HAS_ADDRESS_OPERAND[opcode]:
+            mask[pos+1:pos+3] = b"\x01\x01"
+        pos += _INSTRUCTION_LENGTHS[opcode]
+    del mask[len(data):]  # in case the last instruction was cut off
+    return mask
+
+assert address_operand_mask(bytes.fromhex("a9 01 8d 34 12 60")) \
+== bytes.fromhex("00 00 00 01 01 00")
+assert address_operand_mask(bytes.fromhex("ea 20 34")) \
+== bytes.fromhex("00 00 01")
+
+def prg_bank_origin(prgAddr, prgBankSize, prgSize):
+    """Guess the CPU address where the PRG ROM bank containing an address is
+    normally mapped: the last bank at the end of the CPU ROM address space
+    (where the interrupt vectors are), other banks at the start. (The
+    alternatives are given by address_prg_to_cpu().)
+    prgAddr:     PRG ROM address
+    prgBankSize: PRG ROM bank size (8_192/16_384/32_768)
+    prgSize:     PRG ROM size
+    return:      0x8000/0xa000/0xc000/0xe000"""
+
+    bankStart = prgAddr & ~(prgBankSize - 1)
+    origins = list(address_prg_to_cpu(bankStart, prgBankSize))
+    return origins[-1] if bankStart + prgBankSize >= prgSize else origins[0]
+
+@functools.lru_cache(maxsize=32)
+def disassemble(data, origin):
+    """Disassemble 6502 machine code (e.g. one PRG ROM bank). The most recent
+    results are memoized. Undocumented opcodes and instructions cut off by the
+    end of data are treated as data bytes.
+    data:   bytes
+    origin: CPU address of the first byte
+    return: tuple of instructions: (cpu_address, opcode, operand):
+        opcode:  0x00-0xff, or None for a data byte
+        operand: None, 0x00-0xff or 0x0000-0xffff (for a data byte: the
+                 byte)"""
+
+    instructions = []
+    pos = 0
+    while pos < len(data):
+        opcode = data[pos]
+        length = _INSTRUCTION_LENGTHS[opcode]
+        if opcode not in _OPCODES or pos + length > len(data):
+            instructions.append((origin + pos, None, opcode))
+            pos += 1
+        else:
+            if length == 1:
+                operand = None
+            elif length == 2:
+                operand = data[pos+1]
+            else:
+                operand = data[pos+1] | (data[pos+2] << 8)
+            instructions.append((origin + pos, opcode, operand))
+            pos += length
+    return tuple(instructions)
+
+@functools.lru_cache(maxsize=1)
+def cross_reference_index(prgData, prgBankSize):
+    """Find the instructions that refer to each memory address (operands of
+    all addressing modes except implied, accumulator, immediate and relative)
+    in all PRG ROM banks. Each bank is disassembled at the origin given by
+    prg_bank_origin(). The result for the most recent PRG ROM is memoized, so
+    looking up many addresses in one PRG ROM builds the index only once.
+    prgData:     PRG ROM data
+    prgBankSize: PRG ROM bank size (8_192/16_384/32_768)
+    return:      dict: key = address (0x0000-0xffff), value = tuple of
+                 (prg_address, instruction); instruction is from
+                 disassemble()"""
+
+    index = {}
+    for bankStart in range(0, len(prgData), prgBankSize):
+        origin = prg_bank_origin(bankStart, prgBankSize, len(prgData))
+        for instruction in disassemble(
+            prgData[bankStart:bankStart+prgBankSize], origin
+        ):
+            if instruction[1] is not None \
+            and _HAS_MEMORY_OPERAND[instruction[1]]:
+                index.setdefault(instruction[2], []).append(
+                    (bankStart + instruction[0] - origin, instruction)
+                )
+    return {addr: tuple(refs) for (addr, refs) in index.items()}
+
+def instruction_mnemonic(instruction):
+    """Get the mnemonic and addressing mode of an instruction from
+    disassemble().
+    instruction: (cpu_address, opcode, operand)
+    return:      (mnemonic, addressing_mode) (see _OPERAND_SIZES), or None
+                 for a data byte"""
+
+    return None if instruction[1] is None else _OPCODES[instruction[1]]
+
+def instruction_to_bytes(instruction):
+    """Encode an instruction from disassemble().
+    instruction: (cpu_address, opcode, operand)
+    return:      1-3 bytes"""
+
+    (addr, opcode, operand) = instruction
+    if opcode is None:
+        return bytes((operand,))
+    length = _INSTRUCTION_LENGTHS[opcode]
+    return bytes((opcode,)) + (
+        operand.to_bytes(length - 1, "little") if length > 1 else b""
+    )
+
+def format_instruction(instruction):
+    """Format an instruction from disassemble() in assembly language.
+    instruction: (cpu_address, opcode, operand)
+    return:      string, e.g. "lda $1234,x", "bne $8012", "hex 02" """
+
+    (addr, opcode, operand) = instruction
+    if opcode is None:
+        return _INSTRUCTION_FORMATS[operand]
+    if _OPCODES[opcode][1] == "rel":
+        # branch target
+        operand = (addr + 2 + operand - (operand & 0x80) * 2) & 0xffff
+    return _INSTRUCTION_FORMATS[opcode].format(operand)
+
+assert disassemble(bytes.fromhex("a9 01 d0 fc 02 20"), 0x8000) == (
+    (0x8000, 0xa9, 0x01), (0x8002, 0xd0, 0xfc), (0x8004, None, 0x02),
+    (0x8005, None, 0x20)
+)
+assert format_instruction((0x8002, 0xd0, 0xfc)) == "bne $8000"
+assert format_instruction((0x8000, 0xbd, 0x1234)) == "lda $1234,x"
+assert format_instruction((0x8000, 0x0a, None)) == "asl a"
+assert instruction_to_bytes((0x8000, 0xbd, 0x1234)) == b"\xbd\x34\x12"
+
+# --- 6502 emulator functions -------------------------------------------------
+
+# Python source for the emulator; _cpu_factory() fills in one specialized
+# handler function per documented opcode, so each instruction is executed by
+# one table lookup and one call. Registers live in closure variables (faster
+# than attributes). Flags: c/i/d = 0 or 1, v = nonzero if set, nz = the last
+# result: N = bit 7 or 8 set, Z = bits 0-7 clear (BIT and PLP set bit 8).
+# Memory: see cpu_memory(). Reading $2002 (PPUSTATUS) toggles bits 7 and 6
+# so that loops waiting for VBlank or sprite 0 hit end; other I/O registers
+# read as 0 and writes to them and to ROM are ignored.
+_CPU_SOURCE = """
+class Jam(Exception):
+    pass
+
+def make_cpu(mem):
+    a = x = y = c = v = d = ppuStatus = pc = 0
+    s = 0xfd
+    i = nz = 1
+
+    def read_io(addr):
+        nonlocal ppuStatus
+        if addr < 0x4000 and addr & 7 == 2:
+            ppuStatus ^= 0xc0
+            return ppuStatus
+        return 0
+
+    def jam():
+        raise Jam
+{handlers}
+    ops = [{table}]
+
+    def push(value):
+        nonlocal s
+        mem[0x100 | s] = value
+        s = s - 1 & 0xff
+
+    def get_p():
+        return {pack}
+
+    def run(start, maxCycles, stop):
+        nonlocal pc
+        pc = start
+        cycles = 0
+        try:
+            while cycles < maxCycles and pc != stop:
+                cycles += ops[mem[pc]]()
+        except Jam:
+            return (cycles, "jam")
+        return (cycles, "return" if pc == stop else "cycles")
+
+    return (run, push, get_p)
+"""
+
+# status register from flags; flags from status register (in t)
+_CPU_PACK = "((0x80 if nz & 0x180 else 0) | (0x40 if v else 0) | 0x20 " \
+"| d << 3 | i << 2 | (0 if nz & 0xff else 2) | c)"
+_CPU_UNPACK = "c = t & 1\nnz = (t & 0x80) << 1 | (0 if t & 2 else 1)\n" \
+"i = t >> 2 & 1\nd = t >> 3 & 1\nv = t & 0x40"
+
+# effective address (ea) for each addressing mode; lo > 0xff = page crossed
+_CPU_ADDRESSING = {
+    "zp":  "ea = mem[pc+1]\npc += 2",
+    "zpx": "ea = mem[pc+1] + x & 0xff\npc += 2",
+    "zpy": "ea = mem[pc+1] + y & 0xff\npc += 2",
+    "abs": "ea = mem[pc+1] | mem[pc+2] << 8\npc += 3",
+    "abx": "lo = mem[pc+1] + x\nea = lo + (mem[pc+2] << 8) & 0xffff\npc += 3",
+    "aby": "lo = mem[pc+1] + y\nea = lo + (mem[pc+2] << 8) & 0xffff\npc += 3",
+    "izx": "t = mem[pc+1] + x & 0xff\nea = mem[t] | mem[t + 1 & 0xff] << 8\n"
+           "pc += 2",
+    "izy": "t = mem[pc+1]\nlo = mem[t] + y\n"
+           "ea = lo + (mem[t + 1 & 0xff] << 8) & 0xffff\npc += 2",
+}
+_CPU_READ = "m = mem[ea & 0x7ff] if ea < 0x2000 " \
+"else mem[ea] if ea >= 0x6000 else read_io(ea)"
+_CPU_WRITE = "if ea < 0x2000:\n    mem[ea & 0x7ff] = m\n" \
+"elif 0x6000 <= ea < 0x8000:\n    mem[ea] = m"
+
+# instructions that read an operand (m); cycles by addressing mode (+1 if
+# abx/aby/izy crosses a page)
+_CPU_READ_OPS = {
+    "lda": "a = nz = m",
+    "ldx": "x = nz = m",
+    "ldy": "y = nz = m",
+    "and": "a = nz = a & m",
+    "ora": "a = nz = a | m",
+    "eor": "a = nz = a ^ m",
+    "adc": "t = a + m + c\nv = (a ^ t) & (m ^ t) & 0x80\nc = t >> 8\n"
+           "a = nz = t & 0xff",
+    "sbc": "m ^= 0xff\nt = a + m + c\nv = (a ^ t) & (m ^ t) & 0x80\n"
+           "c = t >> 8\na = nz = t & 0xff",
+    "cmp": "c = 1 if a >= m else 0\nnz = a - m & 0xff",
+    "cpx": "c = 1 if x >= m else 0\nnz = x - m & 0xff",
+    "cpy": "c = 1 if y >= m else 0\nnz = y - m & 0xff",
+    "bit": "v = m & 0x40\nnz = (m & 0x80) << 1 | a & m",
+}
+_CPU_READ_CYCLES = {
+    "imm": 2, "zp": 3, "zpx": 4, "zpy": 4, "abs": 4, "abx": 4, "aby": 4,
+    "izx": 6, "izy": 5,
+}
+# read-modify-write instructions (m -> m)
+_CPU_RMW_OPS = {
+    "asl": "c = m >> 7\nm = nz = m << 1 & 0xff",
+    "lsr": "c = m & 1\nm = nz = m >> 1",
+    "rol": "t = m << 1 | c\nc = t >> 8\nm = nz = t & 0xff",
+    "ror": "t = m | c << 8\nc = m & 1\nm = nz = t >> 1",
+    "inc": "m = nz = m + 1 & 0xff",
+    "dec": "m = nz = m - 1 & 0xff",
+}
+_CPU_RMW_CYCLES = {"acc": 2, "zp": 5, "zpx": 6, "abs": 6, "abx": 7}
+# store instructions
+_CPU_STORE_OPS = {"sta": "m = a", "stx": "m = x", "sty": "m = y"}
+_CPU_STORE_CYCLES = {
+    "zp": 3, "zpx": 4, "zpy": 4, "abs": 4, "abx": 5, "aby": 5, "izx": 6,
+    "izy": 6,
+}
+# branch conditions
+_CPU_BRANCHES = {
+    "bpl": "not nz & 0x180", "bmi": "nz & 0x180",
+    "bvc": "not v",          "bvs": "v",
+    "bcc": "not c",          "bcs": "c",
+    "bne": "nz & 0xff",      "beq": "not nz & 0xff",
+}
+# other instructions: (code, cycles); code must update pc
+_CPU_PUSH = "mem[0x100 | s] = {}\ns = s - 1 & 0xff\n"
+_CPU_PULL = "s = s + 1 & 0xff\n{} = mem[0x100 | s]\n"
+_CPU_OTHER_OPS = {
+    (0x00, "brk"): (
+        "t = pc + 2\n" + _CPU_PUSH.format("t >> 8")
+        + _CPU_PUSH.format("t & 0xff")
+        + _CPU_PUSH.format(_CPU_PACK + " | 0x30")
+        + "i = 1\npc = mem[0xfffe] | mem[0xffff] << 8", 7
+    ),
+    (0x20, "jsr"): (
+        "t = pc + 2\n" + _CPU_PUSH.format("t >> 8")
+        + _CPU_PUSH.format("t & 0xff") + "pc = mem[pc+1] | mem[pc+2] << 8", 6
+    ),
+    (0x40, "rti"): (
+        _CPU_PULL.format("t") + _CPU_UNPACK + "\n" + _CPU_PULL.format("t")
+        + _CPU_PULL.format("pc") + "pc = pc << 8 | t", 6
+    ),
+    (0x60, "rts"): (
+        _CPU_PULL.format("t") + _CPU_PULL.format("pc")
+        + "pc = (pc << 8 | t) + 1 & 0xffff", 6
+    ),
+    (0x4c, "jmp"): ("pc = mem[pc+1] | mem[pc+2] << 8", 3),
+    (0x6c, "jmp"): (
+        # the high byte of the pointer is not incremented (a 6502 bug)
+        "t = mem[pc+1] | mem[pc+2] << 8\n"
+        "pc = mem[t] | mem[t & 0xff00 | t + 1 & 0xff] << 8", 5
+    ),
+    (0x08, "php"): (_CPU_PUSH.format(_CPU_PACK + " | 0x30") + "pc += 1", 3),
+    (0x28, "plp"): (_CPU_PULL.format("t") + _CPU_UNPACK + "\npc += 1", 4),
+    (0x48, "pha"): (_CPU_PUSH.format("a") + "pc += 1", 3),
+    (0x68, "pla"): (_CPU_PULL.format("a") + "nz = a\npc += 1", 4),
+    (0x18, "clc"): ("c = 0\npc += 1", 2),
+    (0x38, "sec"): ("c = 1\npc += 1", 2),
+    (0x58, "cli"): ("i = 0\npc += 1", 2),
+    (0x78, "sei"): ("i = 1\npc += 1", 2),
+    (0xb8, "clv"): ("v = 0\npc += 1", 2),
+    (0xd8, "cld"): ("d = 0\npc += 1", 2),
+    (0xf8, "sed"): ("d = 1\npc += 1", 2),
+    (0xaa, "tax"): ("x = nz = a\npc += 1", 2),
+    (0xa8, "tay"): ("y = nz = a\npc += 1", 2),
+    (0x8a, "txa"): ("a = nz = x\npc += 1", 2),
+    (0x98, "tya"): ("a = nz = y\npc += 1", 2),
+    (0xba, "tsx"): ("x = nz = s\npc += 1", 2),
+    (0x9a, "txs"): ("s = x\npc += 1", 2),
+    (0xe8, "inx"): ("x = nz = x + 1 & 0xff\npc += 1", 2),
+    (0xca, "dex"): ("x = nz = x - 1 & 0xff\npc += 1", 2),
+    (0xc8, "iny"): ("y = nz = y + 1 & 0xff\npc += 1", 2),
+    (0x88, "dey"): ("y = nz = y - 1 & 0xff\npc += 1", 2),
+    (0xea, "nop"): ("pc += 1", 2),
+}
+
+def _cpu_handler_source(opcode):
+    # get the Python source of the function that executes an opcode
+    (mnemonic, mode) = _OPCODES[opcode]
+    zeroPage = mode in ("zp", "zpx", "zpy")
+
+    if (opcode, mnemonic) in _CPU_OTHER_OPS:
+        (code, cycles) = _CPU_OTHER_OPS[(opcode, mnemonic)]
+        code += f"\nreturn {cycles}"
+    elif mnemonic in _CPU_BRANCHES:
+        code = (
+            f"pc += 2\nif {_CPU_BRANCHES[mnemonic]}:\n"
+            "    t = mem[pc-1]\n"
+            "    t = pc + t - (t & 0x80) * 2 & 0xffff\n"
+            "    cycles = 4 if (t ^ pc) & 0xff00 else 3\n"
+            "    pc = t\n"
+            "    return cycles\n"
+            "return 2"
+        )
+    elif mnemonic in _CPU_READ_OPS:
+        if mode == "imm":
+            code = "m = mem[pc+1]\npc += 2"
+        else:
+            code = _CPU_ADDRESSING[mode] + "\n" \
+            + ("m = mem[ea]" if zeroPage else _CPU_READ)
+        code += "\n" + _CPU_READ_OPS[mnemonic] + "\n" \
+        + f"return {_CPU_READ_CYCLES[mode]}" \
+        + (" + (lo >> 8)" if mode in ("abx", "aby", "izy") else "")
+    elif mnemonic in _CPU_RMW_OPS:
+        if mode == "acc":
+            code = "m = a\n" + _CPU_RMW_OPS[mnemonic] + "\na = m\npc += 1"
+        else:
+            code = _CPU_ADDRESSING[mode] + "\n" \
+            + ("m = mem[ea]" if zeroPage else _CPU_READ) + "\n" \
+            + _CPU_RMW_OPS[mnemonic] + "\n" \
+            + ("mem[ea] = m" if zeroPage else _CPU_WRITE)
+        code += f"\nreturn {_CPU_RMW_CYCLES[mode]}"
+    else:
+        code = _CPU_ADDRESSING[mode] + "\n" + _CPU_STORE_OPS[mnemonic] + "\n" \
+        + ("mem[ea] = m" if zeroPage else _CPU_WRITE) \
+        + f"\nreturn {_CPU_STORE_CYCLES[mode]}"
+
+    return f"\n    def op_{opcode:02x}():\n" \
+    + "        nonlocal a, x, y, s, pc, c, v, nz, i, d\n" \
+    + "".join("        " + line + "\n" for line in code.split("\n"))
+
+@functools.lru_cache(maxsize=None)
+def _cpu_factory():
+    # compile the emulator (once); return the function that creates a CPU
+    source = _CPU_SOURCE.format(
+        handlers="".join(_cpu_handler_source(o) for o in sorted(_OPCODES)),
+        table=", ".join(
+            f"op_{o:02x}" if o in _OPCODES else "jam" for o in range(0x100)
+        ),
+        pack=_CPU_PACK,
+    )
+    namespace = {}
+    exec(compile(source, "<qneslib 6502 emulator>", "exec"), namespace)
+    return namespace["make_cpu"]
+
+def cpu_memory(prgData, prgBankSize, codes=()):
+    """Create a flat memory map for cpu_run(). PRG ROM banks are mapped as at
+    power-on (probably): the first banks (from address_cpu_to_prg()) to the
+    first half of the CPU ROM address space, the last banks to the second
+    half. Mapper registers are not emulated.
+    prgData:     PRG ROM data
+    prgBankSize: PRG ROM bank size (8_192/16_384/32_768)
+    codes:       Game Genie codes to apply, as from game_genie_decode(); a code
+                 with a compare value only applies if it matches
+    return:      bytearray: 0x0000-0x07ff = RAM (zero-filled; 0x0800-0x1fff
+                 are mirrors of it), 0x6000-0x7fff = cartridge RAM,
+                 0x8000-0xffff = PRG ROM (+ 2 bytes of padding)"""
+
+    memory = bytearray(0x10002)
+    windowCount = 0x8000 // prgBankSize
+    for (window, origin) in enumerate(range(0x8000, 0x10000, prgBankSize)):
+        prgAddrs = list(address_cpu_to_prg(origin, prgBankSize, len(prgData)))
+        if window < windowCount // 2:
+            prgAddr = prgAddrs[min(window, len(prgAddrs) - 1)]
+        else:
+            prgAddr = prgAddrs[max(len(prgAddrs) - windowCount + window, 0)]
+        memory[origin:origin+prgBankSize] \
+        = prgData[prgAddr:prgAddr+prgBankSize]
+
+    for (addr, repl, comp) in codes:
+        if comp is None or memory[addr] == comp:
+            memory[addr] = repl
+    return memory
+
+def cpu_run(memory, start, maxCycles):
+    """Run a 6502 routine (documented opcodes only; no decimal mode, like the
+    NES CPU) until it returns or runs out of cycles. Registers start from
+    their power-on state (A=X=Y=0, S=$fd, I flag set) on each call.
+    memory:    from cpu_memory(); RAM is modified in place
+    start:     "reset", "nmi" or "irq" to start from an interrupt vector (the
+               routine returns with RTI; reset never returns), or the CPU
+               address of a subroutine (returns with RTS)
+    maxCycles: stop after this many CPU cycles (1 frame = 29_780 cycles)
+    return:    (cycles, status); status: "return", "cycles" (out of cycles)
+               or "jam" (an undocumented opcode was encountered)"""
+
+    (run, push, get_p) = _cpu_factory()(memory)
+    stop = 0x0000  # pushed as the return address
+    if isinstance(start, str):
+        if start != "reset":
+            push(stop >> 8)
+            push(stop & 0xff)
+            push(get_p())
+        vector = {"nmi": 0xfffa, "reset": 0xfffc, "irq": 0xfffe}[start]
+        start = memory[vector] | (memory[vector+1] << 8)
+    else:
+        push((stop - 1 & 0xffff) >> 8)
+        push(stop - 1 & 0xff)
+    return run(start, maxCycles, stop)
+
 # --- iNES header functions ---------------------------------------------------
 
 def ines_header_decode(handle):
@@ -291,6 +1046,22 @@ def ines_header_decode(handle):
         "extraRam":     bool(flags6 & 0b00000010),
     }
 
+def chr_info(handle):
+    """Detect the type of a file that contains CHR data and find the data.
+    handle: iNES ROM file or raw CHR data file (size a multiple of 256 bytes,
+            i.e. 16 tiles)
+    return: (address, size) of CHR data (size 0 if an iNES ROM file has no
+            CHR ROM), or None if the file is neither"""
+
+    fileInfo = ines_header_decode(handle)
+    if fileInfo is not None:
+        return (fileInfo["chrStart"], fileInfo["chrSize"])
+
+    fileSize = handle.seek(0, 2)
+    if fileSize == 0 or fileSize % 256:
+        return None
+    return (0, fileSize)
+
 def ines_header_encode(
     prgSize, chrSize, mapper=0, mirroring="h", extraRam=False
 ):
@@ -429,3 +1200,63 @@ assert game_genie_encode(0x8807, 0x00, 0x00) == "AAEANAAA"
 assert game_genie_encode(0x8700, 0x00, 0x08) == "AAEAANAA"
 assert game_genie_encode(0x8000, 0x00, 0x87) == "AAEAAANA"
 assert game_genie_encode(0x8000, 0x08, 0x70) == "AAEAAAAN"
+
+# --- Batch state functions ---------------------------------------------------
+
+# Batch modes of the programs remember in a JSON file which output files are
+# up to date. These functions import json and hashlib themselves because
+# importing them up front would make importing this library several times
+# slower.
+
+def state_read(path):
+    """Read a state file written by state_write().
+    path:   state file
+    return: dict; empty if the file doesn't exist, can't be read or doesn't
+            contain a JSON object (so everything is considered out of date)"""
+
+    import json
+    try:
+        with open(path, "rt", encoding="utf-8") as handle:
+            handle.seek(0)
+            state = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+def state_write(path, state):
+    """Write a state file. It's written under a temporary name first and then
+    renamed, so an interrupted run leaves the old file intact.
+    path:   state file
+    state:  dict that can be encoded as JSON
+    return: True on success, False on error"""
+
+    import json
+    tempPath = path + ".part"
+    try:
+        with open(tempPath, "wt", encoding="utf-8") as handle:
+            handle.seek(0)
+            handle.write(json.dumps(state, indent=1, sort_keys=True) + "\n")
+        os.replace(tempPath, path)
+    except OSError:
+        try:
+            os.remove(tempPath)
+        except OSError:
+            pass
+        return False
+    return True
+
+def file_signature(path, *settings):
+    """Identify the contents of a file by its size and modification time,
+    together with the settings it's processed with.
+    path:     file
+    settings: values that can be encoded as JSON
+    return:   hexadecimal SHA-256 hash, or None if the file can't be read"""
+
+    import hashlib, json
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return hashlib.sha256(json.dumps(
+        [stat.st_size, stat.st_mtime_ns, *settings]
+    ).encode("ascii")).hexdigest()
@@ -1,5 +1,6 @@
 clear
 rm -f ../test-out/*.nes
+rm -rf ../test-out/combine ../test-out/combine.json*
 
 echo "=== Creating iNES files ==="
 python3 ../ines_combine.py \
@@ -15,13 +16,36 @@ python3 ../ines_combine.py \
     ../test-out/zelda1.nes
 echo
 
+echo "=== Manifest (the second run should skip all files) ==="
+cat > ../test-out/combine.json << EOF
+{
+ "defaults": {"prg_rom": "../test-in/smb1.prg", "chr_rom": "../test-in/smb1.chr"},
+ "outputs": [
+  {"output": "combine/smb1.nes", "mirroring": "v"},
+  {"output": "combine/smb1-h.nes"},
+  {"output": "combine/smb1-mmc1.nes", "mapper": 1, "extra_ram": true}
+ ]
+}
+EOF
+python3 ../ines_combine.py -f ../test-out/combine.json
+python3 ../ines_combine.py -f ../test-out/combine.json | tail -n 1
+cmp ../test-out/combine/smb1.nes ../test-out/smb1.nes
+echo
+
+echo "=== Without the state file, existing files should be skipped ==="
+mv ../test-out/combine.json.state ../test-out/combine.json.state.old
+python3 ../ines_combine.py -f ../test-out/combine.json | tail -n 1
+mv ../test-out/combine.json.state.old ../test-out/combine.json.state
+echo
+
 echo "=== Validating iNES files ==="
 md5sum -c --quiet ines_combine.md5
 echo
 
-echo "=== These should cause two errors ==="
+echo "=== These should cause three errors ==="
 python3 ../ines_combine.py \
     -p ../test-in/smb1.nes ../test-out/invalid1.nes
 python3 ../ines_combine.py \
     -p ../test-in/smb1.prg -c ../test-in/smb1.nes ../test-out/invalid2.nes
+python3 ../ines_combine.py -f ../test-in/smb1.nes
 echo
@@ -1,4 +1,5 @@
 clear
+rm -f ../test-out/info-cache.json
 
 echo "=== SMB 1 ==="
 python3 ../ines_info.py ../test-in/smb1.nes
@@ -12,8 +13,19 @@ echo "=== Zelda 1 ==="
 python3 ../ines_info.py ../test-in/zelda1.nes
 echo
 
-echo "=== These should cause three errors ==="
+echo "=== All files as CSV ==="
+python3 ../ines_info.py -f csv ../test-in/
+echo
+
+echo "=== All files as JSON Lines with a cache (the second run reads no files) ==="
+python3 ../ines_info.py -c ../test-out/info-cache.json ../test-in/ | wc -l
+python3 ../ines_info.py -c ../test-out/info-cache.json ../test-in/ | wc -l
+echo
+
+echo "=== These should cause five errors ==="
 python3 ../ines_info.py nonexistent
 python3 ../ines_info.py ../test-in/invalid-id.nes
 python3 ../ines_info.py ../test-in/yoshi.nes
+python3 ../ines_info.py -f text ../test-in/
+python3 ../ines_info.py -c ../test-out/info-cache.json ../test-in/smb1.nes
 echo
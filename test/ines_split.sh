@@ -1,6 +1,7 @@
 clear
 rm -f ../test-out/*.prg
 rm -f ../test-out/*.chr
+rm -rf ../test-out/split
 
 echo "=== Splitting ==="
 python3 ../ines_split.py \
@@ -11,13 +12,29 @@ python3 ../ines_split.py \
     -c ../test-out/blastermaster.chr ../test-in/blastermaster.nes
 echo
 
+echo "=== Batch mode (the second run should skip all files) ==="
+mkdir ../test-out/split
+python3 ../ines_split.py -o ../test-out/split -p "prg/{name}.prg" -c "chr/{name}.chr" ../test-in/ | tail -n 1
+python3 ../ines_split.py -o ../test-out/split -p "prg/{name}.prg" -c "chr/{name}.chr" ../test-in/ | tail -n 1
+cmp ../test-out/split/prg/smb1.prg ../test-out/smb1.prg
+cmp ../test-out/split/chr/smb1.chr ../test-out/smb1.chr
+echo
+
+echo "=== Batch mode after deleting one output file (only it should be written) ==="
+rm ../test-out/split/chr/smb1.chr
+python3 ../ines_split.py -o ../test-out/split -p "prg/{name}.prg" -c "chr/{name}.chr" ../test-in/ | tail -n 1
+cmp ../test-out/split/chr/smb1.chr ../test-out/smb1.chr
+echo
+
 echo "=== Validating ==="
 md5sum -c --quiet ines_split.md5
 echo
 
-echo "=== These should cause four errors ==="
+echo "=== These should cause six errors ==="
 python3 ../ines_split.py -p ../test-out/invalid1.prg ../test-in/invalid-id.nes
 python3 ../ines_split.py -p ../test-in/smb1.nes      ../test-in/smb1.nes
 python3 ../ines_split.py -c ../test-in/smb1.nes      ../test-in/smb1.nes
 python3 ../ines_split.py                             ../test-in/smb1.nes
+python3 ../ines_split.py -o ../test-out/split -p "{nam}.prg" ../test-in/
+python3 ../ines_split.py -o ../test-out/nonexistent -p "{name}.prg" ../test-in/
 echo
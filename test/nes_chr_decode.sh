@@ -13,11 +13,27 @@ python3 ../nes_chr_decode.py ../test-in/blastermaster.chr ../test-out/blastermas
 python3 ../nes_chr_decode.py ../test-in/chr-2color.chr    ../test-out/chr-2color.png
 echo
 
+echo "=== Decoding parts of CHR data ==="
+python3 ../nes_chr_decode.py -b 4:1 ../test-in/smb1.nes ../test-out/smb1-chr-bg.png
+python3 ../nes_chr_decode.py -f 16 -c 40 ../test-in/smb1.nes ../test-out/smb1-chr-tiles.png
+python3 ../nes_chr_decode.py -b 8:all ../test-in/smb3.nes ../test-out/smb3-chr.png
+ls ../test-out/smb3-chr-*.png | wc -l
+echo
+
+echo "=== Batch mode (the second run should skip all files) ==="
+rm -rf ../test-out/batch
+mkdir ../test-out/batch
+python3 ../nes_chr_decode.py --batch -s ../test-out/batch-sheet.png ../test-in/ ../test-out/batch/
+python3 ../nes_chr_decode.py --batch ../test-in/ ../test-out/batch/ | tail -n 1
+echo "(different palette; all files should be converted again)"
+python3 ../nes_chr_decode.py --batch ../test-in/ ../test-out/batch/ 000000,ff0000,00ff00,0000ff | tail -n 1
+echo
+
 echo "=== Verifying (different PNG encoding may give false positives) ==="
 md5sum -c --quiet nes_chr_decode.md5
 echo
 
-echo "=== These should cause seven errors ==="
+echo "=== These should cause fifteen errors ==="
 python3 ../nes_chr_decode.py ../test-in/smb1.chr        ../test-out/test1.png 000000,111111,222222
 python3 ../nes_chr_decode.py ../test-in/smb1.chr        ../test-out/test2.png 000000,111111,222222,x
 python3 ../nes_chr_decode.py ../test-in/smb1.chr        ../test-out/test3.png 000000,111111,222222,1234567
@@ -25,4 +41,12 @@ python3 ../nes_chr_decode.py ../test-in/invalid-id.nes  ../test-out/test4.png
 python3 ../nes_chr_decode.py ../test-in/empty.chr       ../test-out/test5.png
 python3 ../nes_chr_decode.py ../test-in/videomation.nes ../test-out/test6.png
 python3 ../nes_chr_decode.py ../test-in/smb1.chr        ../test-out/nonexistent/
+python3 ../nes_chr_decode.py -b 3:0 ../test-in/smb1.nes ../test-out/test7.png
+python3 ../nes_chr_decode.py -b 8:1 ../test-in/smb1.nes ../test-out/test8.png
+python3 ../nes_chr_decode.py -f 512 ../test-in/smb1.nes ../test-out/test9.png
+python3 ../nes_chr_decode.py -c 0 ../test-in/smb1.nes ../test-out/test10.png
+python3 ../nes_chr_decode.py -b 8:all ../test-in/smb3.nes ../test-out/smb3-chr.png
+python3 ../nes_chr_decode.py -s ../test-out/test11.png ../test-in/smb1.nes ../test-out/test12.png
+python3 ../nes_chr_decode.py --batch -b 8:all ../test-in/ ../test-out/batch/
+python3 ../nes_chr_decode.py --batch ../test-in/ ../test-out/nonexistent/
 echo
@@ -0,0 +1,17 @@
+clear
+rm -f ../test-out/chr_diff*
+
+echo "=== SMB3: US vs. Japanese version (image and JSON saved to test-out/) ==="
+python3 ../nes_chr_diff.py -i ../test-out/chr_diff.png -j ../test-out/chr_diff.json ../test-in/smb3.nes ../test-in/smb3-j.nes | tail -5
+echo
+
+echo "=== SMB: iNES ROM vs. CHR data encoded from its image (no differences) ==="
+python3 ../nes_chr_diff.py ../test-in/smb1.nes ../test-out/smb1a.chr
+echo
+
+echo "=== These should cause four errors ==="
+python3 ../nes_chr_diff.py ../test-in/nonexistent ../test-in/smb1.nes
+python3 ../nes_chr_diff.py ../test-in/smb1.nes ../test-in/megaman1.nes
+python3 ../nes_chr_diff.py ../test-in/smb1.nes ../test-in/invalid-id.nes
+python3 ../nes_chr_diff.py -j ../test-out/chr_diff.json ../test-in/smb1.nes ../test-in/smb1.nes
+echo
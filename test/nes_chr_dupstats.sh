@@ -0,0 +1,16 @@
+clear
+rm -f ../test-out/chr_dupstats.sqlite
+
+echo "=== All test ROMs (first run reads all of them) ==="
+python3 ../nes_chr_dupstats.py -t 5 ../test-out/chr_dupstats.sqlite ../test-in/
+echo
+
+echo "=== Again (no ROMs should be read) ==="
+python3 ../nes_chr_dupstats.py -t 0 ../test-out/chr_dupstats.sqlite ../test-in/
+echo
+
+echo "=== These should cause three errors ==="
+python3 ../nes_chr_dupstats.py -j 0 ../test-out/chr_dupstats.sqlite
+python3 ../nes_chr_dupstats.py -t -1 ../test-out/chr_dupstats.sqlite
+python3 ../nes_chr_dupstats.py ../test-out/chr_dupstats.sqlite nonexistent
+echo
@@ -17,6 +17,18 @@ echo "=== Verifying ==="
 md5sum -c --quiet nes_chr_encode.md5
 echo
 
+echo "=== Writing into an iNES ROM (should be identical to the original) ==="
+rm -f ../test-out/smb1-chr-into.nes
+python3 ../nes_color_swap.py -c 0 0 0 0 ../test-in/smb1.nes ../test-out/smb1-chr-into.nes
+python3 ../nes_chr_encode.py -r ../test-in/smb1-chr.png ../test-out/smb1-chr-into.nes
+cmp ../test-in/smb1.nes ../test-out/smb1-chr-into.nes
+echo
+
+echo "=== Deduplicating tiles (prints the number of unique tiles) ==="
+rm -f ../test-out/chr-2color-dedupe.*
+python3 ../nes_chr_encode.py -n ../test-out/chr-2color-dedupe.nt --flip-flags ../test-out/chr-2color-dedupe.flip ../test-in/chr-2color.png ../test-out/chr-2color-dedupe.chr
+echo
+
 echo "=== These should cause four distinct color argument (not file) errors ==="
 python3 ../nes_chr_encode.py ../test-in/smb1-chr.png ../test-out/test1.chr 000000,111111,222222
 python3 ../nes_chr_encode.py ../test-in/smb1-chr.png ../test-out/test2.chr 000000,111111,222222,1234567
@@ -24,9 +36,14 @@ python3 ../nes_chr_encode.py ../test-in/smb1-chr.png ../test-out/test3.chr 00000
 python3 ../nes_chr_encode.py ../test-in/smb1-chr.png ../test-out/test4.chr 000000,111111,222222,000000
 echo
 
-echo "=== These should cause four distinct other errors ==="
+echo "=== These should cause nine distinct other errors ==="
 python3 ../nes_chr_encode.py ../test-in/nonexistent  ../test-out/test5.chr
 python3 ../nes_chr_encode.py ../test-in/5colors.png  ../test-out/test6.chr
 python3 ../nes_chr_encode.py ../test-in/smb1-chr.png ../test-out/test7.chr 000000,696969,420420,ffffff
 python3 ../nes_chr_encode.py ../test-in/smb1-chr.png ../test-out/nonexistent/
+python3 ../nes_chr_encode.py -f 1 ../test-in/smb1-chr.png ../test-out/test8.chr
+python3 ../nes_chr_encode.py -r -f 1 ../test-in/smb1-chr.png ../test-out/smb1-chr-into.nes
+python3 ../nes_chr_encode.py -r ../test-in/smb1-chr.png ../test-out/nonexistent.nes
+python3 ../nes_chr_encode.py --flip-flags ../test-out/test9.flip ../test-in/smb1-chr.png ../test-out/test9.chr
+python3 ../nes_chr_encode.py -n ../test-in/smb1-chr.png ../test-in/smb1-chr.png ../test-out/test10.chr
 echo
@@ -0,0 +1,18 @@
+clear
+rm -f ../test-out/prg-*.png
+
+echo "=== CHR RAM games (graphics saved to test-out/) ==="
+python3 ../nes_chr_locate.py -d ../test-out ../test-in/megaman1.nes
+python3 ../nes_chr_locate.py ../test-in/zelda1.nes
+echo
+
+echo "=== A CHR ROM game (should find little or nothing) ==="
+python3 ../nes_chr_locate.py ../test-in/smb1.nes
+echo
+
+echo "=== These should cause four errors ==="
+python3 ../nes_chr_locate.py -m 0 ../test-in/smb1.nes
+python3 ../nes_chr_locate.py ../test-in/nonexistent
+python3 ../nes_chr_locate.py ../test-in/invalid-id.nes
+python3 ../nes_chr_locate.py -d ../test-out/nonexistent ../test-in/smb1.nes
+echo
@@ -0,0 +1,17 @@
+clear
+
+echo "=== SMB: find the CHR data decoded by nes_chr_decode.py ==="
+python3 ../nes_chr_search.py -m 5 ../test-in/smb1.nes ../test-in/smb1-chr.png
+echo
+
+echo "=== SMB: find the same data as CHR (all 512 tiles) ==="
+python3 ../nes_chr_search.py -c ../test-in/smb1.nes ../test-out/smb1a.chr
+echo
+
+echo "=== These should cause five errors ==="
+python3 ../nes_chr_search.py -m 0 ../test-in/smb1.nes ../test-in/smb1-chr.png
+python3 ../nes_chr_search.py ../test-in/nonexistent ../test-in/smb1-chr.png
+python3 ../nes_chr_search.py ../test-in/smb1.nes ../test-in/nonexistent
+python3 ../nes_chr_search.py ../test-in/invalid-id.nes ../test-in/smb1-chr.png
+python3 ../nes_chr_search.py ../test-in/smb1.nes ../test-in/5colors.png
+echo
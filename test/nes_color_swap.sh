@@ -29,10 +29,28 @@ echo "=== Validating ==="
 md5sum -c --quiet nes_color_swap.md5
 echo
 
+echo "=== Rules file (same as -c 0 2 3 1 -n 492, then -c 1 2 3 0 -f 511) ==="
+printf "# test\n0 492 1 2 3 2\n\n0 492 0 2 3 1\n511 0 1 2 3 0\n" \
+    > ../test-out/rules.txt
+python3 ../nes_color_swap.py \
+    -r ../test-out/rules.txt ../test-in/smb1.nes ../test-out/smb1-rules.nes
+python3 ../nes_color_swap.py -c 1 2 3 0 -f 511 \
+    ../test-out/smb1-colors0231.nes ../test-out/smb1-rules-check.nes
+cmp ../test-out/smb1-rules.nes ../test-out/smb1-rules-check.nes
+echo
+
+echo "=== In-place (should be identical to colors0231) ==="
+cp ../test-in/smb1.nes ../test-out/smb1-in_place.nes
+python3 ../nes_color_swap.py -c 0 2 3 1 -n 492 -i ../test-out/smb1-in_place.nes
+cmp ../test-out/smb1-in_place.nes ../test-out/smb1-colors0231.nes
+echo
+
 rm -f ../test-out/error*.nes
 echo "" > ../test-out/already-exists.nes
 
-echo "=== These should cause seven errors ==="
+printf "0 1 2 3\n" > ../test-out/rules-invalid.txt
+
+echo "=== These should cause twelve errors ==="
 python3 ../nes_color_swap.py ../test-in/smb1.nes        ../test-out/error1.nes -f 512
 python3 ../nes_color_swap.py ../test-in/smb1.nes        ../test-out/error2.nes -n 513
 python3 ../nes_color_swap.py ../test-in/smb1.nes        ../test-out/error3.nes -f 511 -n 2
@@ -40,4 +58,9 @@ python3 ../nes_color_swap.py nonexistent                ../test-out/error4.nes
 python3 ../nes_color_swap.py ../test-in/smb1.nes        ../test-out/already-exists.nes
 python3 ../nes_color_swap.py ../test-in/invalid-id.nes  ../test-out/error5.nes
 python3 ../nes_color_swap.py ../test-in/videomation.nes ../test-out/error6.nes
+python3 ../nes_color_swap.py ../test-in/smb1.nes        ../test-out/error7.nes -r ../test-out/rules-invalid.txt
+python3 ../nes_color_swap.py ../test-in/smb1.nes        ../test-out/error8.nes -r ../test-out/rules.txt -f 1
+python3 ../nes_color_swap.py ../test-in/smb1.nes        ../test-out/error9.nes -r nonexistent
+python3 ../nes_color_swap.py ../test-in/smb1.nes        ../test-out/error10.nes -i
+python3 ../nes_color_swap.py ../test-in/smb1.nes
 echo
@@ -0,0 +1,26 @@
+clear
+
+echo "=== SMB: bank 0, first lines ==="
+python3 ../nes_disasm.py ../test-in/smb1.nes | head -n 20
+echo
+
+echo "=== SMB: around 9238, 3 lines ==="
+python3 ../nes_disasm.py -a 9238 -n 3 ../test-in/smb1.nes
+echo
+
+echo "=== SMB 3: bank 31 at e000, last lines ==="
+python3 ../nes_disasm.py -b 31 ../test-in/smb3.nes | tail -n 10
+echo
+
+echo "=== SMB 3: Game Genie code SLXPLOVS ==="
+python3 ../nes_disasm.py -g slxplovs -n 4 ../test-in/smb3.nes
+echo
+
+echo "=== These should cause six errors ==="
+python3 ../nes_disasm.py nonexistent
+python3 ../nes_disasm.py ../test-in/invalid-id.nes
+python3 ../nes_disasm.py -b 32 ../test-in/smb3.nes
+python3 ../nes_disasm.py -o 8000 ../test-in/smb3.nes
+python3 ../nes_disasm.py -b 0 -o 9000 ../test-in/smb3.nes
+python3 ../nes_disasm.py -g xxxxxx ../test-in/smb3.nes
+echo
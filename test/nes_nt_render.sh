@@ -0,0 +1,28 @@
+clear
+rm -rf ../test-out/nt*
+
+echo "=== Rendering (arbitrary bytes from ROM files as name tables) ==="
+head -c 1024 ../test-in/smb1.chr > ../test-out/nt1.nam
+python3 ../nes_nt_render.py -b 1 -p 22291a0f22361727220f1727220f2717 ../test-in/smb1.nes ../test-out/nt1.nam ../test-out/nt1.png
+head -c 960 ../test-in/smb1.chr > ../test-out/nt2.nam
+tail -c 64 ../test-in/smb1.chr > ../test-out/nt2.atr
+python3 ../nes_nt_render.py -a ../test-out/nt2.atr ../test-in/smb1.nes ../test-out/nt2.nam ../test-out/nt2.png
+echo
+
+echo "=== Batch mode (the second run should skip all files) ==="
+mkdir ../test-out/nt-in ../test-out/nt-out
+for i in 1 2 3 4 5 6 7 8; do head -c $((i*1024)) ../test-in/smb1.chr | tail -c 1024 > ../test-out/nt-in/$i.nam; done
+python3 ../nes_nt_render.py --batch ../test-in/smb1.nes ../test-out/nt-in/ ../test-out/nt-out/
+python3 ../nes_nt_render.py --batch ../test-in/smb1.nes ../test-out/nt-in/ ../test-out/nt-out/
+echo "(another pattern table; all files should be rendered again)"
+python3 ../nes_nt_render.py --batch -b 1 ../test-in/smb1.nes ../test-out/nt-in/ ../test-out/nt-out/
+echo
+
+echo "=== These should cause six errors ==="
+python3 ../nes_nt_render.py -b 2 ../test-in/smb1.nes ../test-out/nt1.nam ../test-out/test1.png
+python3 ../nes_nt_render.py -p 0f ../test-in/smb1.nes ../test-out/nt1.nam ../test-out/test2.png
+python3 ../nes_nt_render.py ../test-in/smb1.nes ../test-out/nt2.nam ../test-out/test3.png
+python3 ../nes_nt_render.py ../test-in/videomation.nes ../test-out/nt1.nam ../test-out/test4.png
+python3 ../nes_nt_render.py ../test-in/smb1.nes ../test-out/nt1.nam ../test-out/nt1.png
+python3 ../nes_nt_render.py --batch ../test-in/smb1.nes ../test-out/nt-in/ ../test-out/nonexistent/
+echo
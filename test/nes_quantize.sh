@@ -0,0 +1,17 @@
+clear
+rm -f ../test-out/quantize*
+
+echo "=== SMB CHR (RGB) per attribute area, then into CHR data with a name table ==="
+python3 ../nes_quantize.py -p ../test-out/quantize-preview.png ../test-in/smb1-chr-rgb.png ../test-out/quantize.png
+python3 ../nes_chr_encode.py -n ../test-out/quantize.nt ../test-out/quantize.png ../test-out/quantize.chr
+echo
+
+echo "=== Same per tile, background color 0f ==="
+python3 ../nes_quantize.py -a 8 -b 0f ../test-in/smb1-chr-rgb.png ../test-out/quantize-tile.png | head -4
+echo
+
+echo "=== These should cause three errors ==="
+python3 ../nes_quantize.py -b 0d ../test-in/smb1-chr-rgb.png ../test-out/quantize1.png
+python3 ../nes_quantize.py ../test-in/nonexistent ../test-out/quantize2.png
+python3 ../nes_quantize.py ../test-in/smb1-chr-rgb.png ../test-out/quantize.png
+echo
@@ -0,0 +1,28 @@
+clear
+
+echo "=== Self-tests of the 6502 emulator in qneslib (should print OK) ==="
+python3 qneslib_cpu_test.py
+echo
+
+echo "=== SMB: reset routine and 10 frames with SXIOPO (infinite lives) ==="
+python3 ../nesgenie_eval.py -f 10 ../test-in/smb1.nes sxiopo
+echo
+
+echo "=== SMB: NMI routine with two codes ==="
+python3 ../nesgenie_eval.py -s nmi ../test-in/smb1.nes sxiopo aeksplgl
+echo
+
+echo "=== SMB: batch mode (three sets of codes) ==="
+printf "# test\nsxiopo\n\nsxiopo aeksplgl\npeuzuglp\n" > ../test-out/nesgenie_eval.txt
+python3 ../nesgenie_eval.py -f 10 -b ../test-out/nesgenie_eval.txt ../test-in/smb1.nes
+echo
+
+echo "=== These should cause seven errors ==="
+python3 ../nesgenie_eval.py nonexistent sxiopo
+python3 ../nesgenie_eval.py ../test-in/invalid-id.nes sxiopo
+python3 ../nesgenie_eval.py ../test-in/smb1.nes
+python3 ../nesgenie_eval.py ../test-in/smb1.nes xxxxxx
+python3 ../nesgenie_eval.py -s 7fff ../test-in/smb1.nes sxiopo
+python3 ../nesgenie_eval.py -c 0 ../test-in/smb1.nes sxiopo
+python3 ../nesgenie_eval.py -b nonexistent ../test-in/smb1.nes
+echo
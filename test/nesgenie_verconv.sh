@@ -23,6 +23,21 @@ python3 ../nesgenie_verconv.py \
     xtusktav -d 6 ../test-in/journey.nes ../test-in/journey-e.nes
 echo
 
+echo "=== Journey to Silius: XTUSKTAV, US->EUR, -e2 (should find XTVSNTAV) ==="
+python3 ../nesgenie_verconv.py \
+    xtusktav -e 2 ../test-in/journey.nes ../test-in/journey-e.nes
+echo
+
+echo "=== Journey to Silius: XTUSKTAV, US->EUR, -a (should find XTVSNTAV) ==="
+python3 ../nesgenie_verconv.py \
+    xtusktav -a ../test-in/journey.nes ../test-in/journey-e.nes
+echo
+
+echo "=== Journey to Silius: XTUSKTAV, US->EUR, -i -v (should find XTVSNTAV) ==="
+python3 ../nesgenie_verconv.py \
+    xtusktav -i -v ../test-in/journey.nes ../test-in/journey-e.nes
+echo
+
 echo "=== Journey to Silius: TEXINTIA, US->EUR (should find TESSXTIA) ==="
 python3 ../nesgenie_verconv.py \
     texintia ../test-in/journey.nes ../test-in/journey-e.nes
@@ -56,7 +71,22 @@ python3 ../nesgenie_verconv.py \
     -v yeuzugaa ../test-in/smb3.nes ../test-in/smb3-j.nes
 echo
 
-echo "=== These should cause six errors ==="
+echo "=== SMB 3: SLXPLOVS, US->JP, -s8 -e3 (should find SLUPGOVS) ==="
+python3 ../nesgenie_verconv.py \
+    -s 8 -e 3 slxplovs ../test-in/smb3.nes ../test-in/smb3-j.nes
+echo
+
+echo "=== SMB 3: SLXPLOVS, US->JP, -a -k 2 (should find SLUPGOVS) ==="
+python3 ../nesgenie_verconv.py \
+    -a -k 2 slxplovs ../test-in/smb3.nes ../test-in/smb3-j.nes
+echo
+
+echo "=== SMB 3: SLXPLOVS, US->JP, -i -a (should find SLUPGOVS) ==="
+python3 ../nesgenie_verconv.py \
+    -i -a slxplovs ../test-in/smb3.nes ../test-in/smb3-j.nes
+echo
+
+echo "=== These should cause ten errors ==="
 python3 ../nesgenie_verconv.py \
     dapapa ../test-in/smb1.nes ../test-in/smb1.nes
 python3 ../nesgenie_verconv.py \
@@ -69,4 +99,12 @@ python3 ../nesgenie_verconv.py \
     paeaaaza ../test-in/smb3.nes ../test-in/smb1.nes
 python3 ../nesgenie_verconv.py \
     yeuzugaa ../test-in/smb3.nes ../test-in/smb1.nes
+python3 ../nesgenie_verconv.py \
+    -s 1 -e 2 sxiopo ../test-in/smb1.nes ../test-in/smb1.nes
+python3 ../nesgenie_verconv.py \
+    -a -e 1 sxiopo ../test-in/smb1.nes ../test-in/smb1.nes
+python3 ../nesgenie_verconv.py \
+    -a -k 0 sxiopo ../test-in/smb1.nes ../test-in/smb1.nes
+python3 ../nesgenie_verconv.py \
+    -i -e 1 sxiopo ../test-in/smb1.nes ../test-in/smb1.nes
 echo
@@ -0,0 +1,16 @@
+clear
+
+echo "=== SMB: number of lives (should find DEC $075A at $91D9) ==="
+python3 ../nesgenie_xref.py ../test-in/smb1.nes 75a
+echo
+
+echo "=== SMB 3: number of lives, new value 63 ==="
+python3 ../nesgenie_xref.py -v 63 ../test-in/smb3.nes 736
+echo
+
+echo "=== These should cause four errors ==="
+python3 ../nesgenie_xref.py nonexistent 75a
+python3 ../nesgenie_xref.py ../test-in/invalid-id.nes 75a
+python3 ../nesgenie_xref.py ../test-in/smb1.nes 10000
+python3 ../nesgenie_xref.py -v 100 ../test-in/smb1.nes 75a
+echo
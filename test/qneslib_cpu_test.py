@@ -0,0 +1,32 @@
+# self-tests of the 6502 emulator in qneslib.py (not run when qneslib is
+# imported because compiling the emulator is slow); prints "OK" on success
+
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import qneslib  # qalle's NES library, https://github.com/qalle2/nes-util
+
+def _cpu_test(code, start="sub"):
+    # run machine code at $8000 (as a subroutine or from the reset vector);
+    # return the first 16 bytes of RAM
+    prgData = bytearray(0x4000)
+    prgData[:len(code)] = code
+    prgData[0x3ffa:] = bytes.fromhex("00 80 00 80 00 80")
+    memory = qneslib.cpu_memory(bytes(prgData), 0x4000)
+    qneslib.cpu_run(memory, 0x8000 if start == "sub" else start, 1000)
+    return bytes(memory[:16])
+
+# LDA/STA, ADC with carry and overflow, loop with DEX/BNE, JSR/RTS, SBC, PHP
+assert _cpu_test(bytes.fromhex("a9 05 85 00 60")) == b"\x05" + 15 * b"\x00"
+assert _cpu_test(bytes.fromhex("a9 7f 69 01 85 00 08 68 85 01 60"))[:2] \
+== b"\x80\xf4"
+assert _cpu_test(bytes.fromhex("a2 05 e6 02 ca d0 fb 60"))[2] == 5
+assert _cpu_test(
+    bytes.fromhex("20 05 80 85 03 a9 09 60")
+)[3] == 9
+assert _cpu_test(bytes.fromhex("38 a9 03 e9 05 85 04 08 68 85 05 60"))[4:6] \
+== b"\xfe\xb4"
+# an NMI routine returning with RTI; a reset routine looping forever
+assert _cpu_test(bytes.fromhex("e6 06 40"), "nmi")[6] == 1
+assert _cpu_test(bytes.fromhex("e6 07 4c 00 80"), "reset")[7] == 125
+
+print("OK")